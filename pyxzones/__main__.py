@@ -1,13 +1,22 @@
+from .startup import STARTUP  # first, starts the startup clock
 import argparse
+import json
 import logging
 import sys
 from json.decoder import JSONDecodeError
 
-from .settings import SETTINGS
+from .roundtrips import ROUND_TRIPS
+from .settings import SETTINGS, InvalidSettings
 from . import config
+from . import control
 from . import process
 
-SETTINGS_FILE = 'pyxzones.json'
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive number, got {value}")
+    return number
 
 
 def main():
@@ -25,6 +34,47 @@ def main():
         help='kill any running instance of pyxzones and exit',
         action="store_true"
     )
+    parser.add_argument(
+        '--metrics',
+        help='print the latency histograms and counters of the running instance of pyxzones and exit',
+        action="store_true"
+    )
+    parser.add_argument(
+        '--count-round-trips',
+        help='count X requests and round trips per handled event and snap, reported with --metrics',
+        action="store_true"
+    )
+    parser.add_argument(
+        '--record-trace',
+        metavar='FILE',
+        help='record the raw RECORD event stream to FILE while running'
+    )
+    parser.add_argument(
+        '--benchmark-trace',
+        metavar='FILE',
+        help='replay a recorded trace without an X server, print event throughput and latency, and exit'
+    )
+    parser.add_argument(
+        '--iterations',
+        type=positive_int,
+        default=10,
+        help=argparse.SUPPRESS
+    )
+
+    # Commands for the running instance of pyxzones, over its control socket
+    subparsers = parser.add_subparsers(dest='command', metavar='COMMAND')
+    subparsers.add_parser('reload-config', help='reload pyxzones.json in the running instance')
+    subparsers.add_parser('recompute-zones', help='query monitors and work areas again and rebuild all zones')
+    subparsers.add_parser('status', help='print the state of the running instance')
+    subparsers.add_parser('metrics', help='print the latency histograms and counters of the running instance')
+    snap_parser = subparsers.add_parser('snap', help='snap a window to a zone of the current desktop')
+    snap_parser.add_argument('zone', type=int, help='index of the zone on the current desktop')
+    snap_parser.add_argument(
+        '--window',
+        type=lambda value: int(value, 0),
+        help='id of the window to snap (default: the active window)'
+    )
+
     parser.add_argument(
         '--log-level',
         choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'FATAL'],
@@ -40,7 +90,21 @@ def main():
         format="%(levelname)-8s %(message)s",
     )
 
-    config_file = config.get_config_file_path(SETTINGS_FILE)
+    if args.command:
+        arguments = { "zone": args.zone, "window": args.window } if args.command == 'snap' else {}
+        try:
+            response = control.send_command(args.command, **arguments)
+        except (control.ControlError, OSError) as exception:
+            print(exception)
+            sys.exit(1)
+
+        if not response.pop("ok", False):
+            print(response.get("error"))
+            sys.exit(1)
+        print(json.dumps(response, indent=4))
+        return
+
+    config_file = config.get_config_file_path(config.SETTINGS_FILE)
     if config_file is not None:
         with config_file.open() as file:
             try:
@@ -48,13 +112,27 @@ def main():
             except JSONDecodeError:
                 logging.fatal(f"Failed to parse user configuration json file located at {config_file}")
                 sys.exit(1)
+            except InvalidSettings as exception:
+                logging.fatal(f"Invalid user configuration in {config_file}: {exception}")
+                sys.exit(1)
+
+    if args.count_round_trips:
+        ROUND_TRIPS.enable()
 
-    if args.daemon:
-        process.launch_daemon()
+    if args.benchmark_trace:
+        from . import trace
+        print(json.dumps(trace.benchmark(args.benchmark_trace, args.iterations), indent=4))
+    elif args.daemon:
+        process.launch_daemon(args.record_trace)
     elif args.kill:
         process.kill_daemon()
+    elif args.metrics:
+        dump = process.dump_daemon_metrics()
+        if dump is None:
+            sys.exit(1)
+        print(dump)
     else:
-        process.start()
+        process.start(trace_file=args.record_trace)
 
 
 if __name__ == "__main__":
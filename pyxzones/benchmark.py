@@ -0,0 +1,219 @@
+import argparse
+import json
+import logging
+import random
+import time
+from Xlib import X, XK
+from Xlib.protocol import event
+
+from . import xq
+from .fakewm import FakeWindowManager
+from .settings import SETTINGS
+from .snap import find_snap_zone, snap_window
+from .trace import CountingSnapExecutor, NullZoneDisplay, get_percentile
+from .zone_profile import ZoneProfile
+
+"""
+
+Scale benchmarks on top of the fake window manager (fakewm.py)
+
+Each dimension is scaled on its own from a baseline, which is enough to see
+which of them the design stops scaling with:
+
+    python -m pyxzones.benchmark [--latency MS] [--repeat N]
+
+"""
+
+BASELINE = { "monitors": 2, "desktops": 4, "windows": 1000, "reparent_depth": 2 }
+
+SCALES = {
+    "monitors":       (1, 2, 4, 8),
+    "desktops":       (1, 4, 16, 64),
+    "windows":        (100, 1000, 10000),
+    "reparent_depth": (1, 2, 4, 8),
+}
+
+DRAG_MOTION_EVENTS = 500
+FIND_ZONE_POINTS = 10000
+
+EVENT_NAMES = { X.KeyPress: "KeyPress", X.ButtonPress: "ButtonPress", X.MotionNotify: "MotionNotify", X.ButtonRelease: "ButtonRelease" }
+
+
+def get_zone_configuration(monitors: int) -> dict:
+    return {
+        "zones": {
+            "displays": [{ "orientation": "landscape", "columns": [ 10, 80, 10 ] }] * monitors
+        }
+    }
+
+
+def get_latency_summary(latencies: list[float]) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "count": len(latencies),
+        "p50_us": get_percentile(latencies, 50) * 1e6,
+        "p99_us": get_percentile(latencies, 99) * 1e6,
+        "max_us": (latencies[-1] if latencies else 0.0) * 1e6,
+    }
+
+
+def get_pointer_event(event_class, root_x, root_y, detail=0):
+    return event_class(
+        time=0, root=0, window=0, same_screen=1, child=0, state=0, detail=detail,
+        root_x=root_x, root_y=root_y, event_x=root_x, event_y=root_y,
+    )
+
+
+def get_drag_events(wm: FakeWindowManager, rng: random.Random) -> list:
+    # Holds the keybindings, drags across every monitor and drops the window
+    width = sum(monitor['virtual_width'] for monitor in wm.monitors)
+    events = [get_pointer_event(event.KeyPress, 0, 0, keycode) for keycode in wm.keysyms]
+    events.append(get_pointer_event(event.ButtonPress, 100, 100, X.Button1))
+    for step in range(DRAG_MOTION_EVENTS):
+        events.append(get_pointer_event(
+            event.MotionNotify, 100 + int((width - 200) * step / DRAG_MOTION_EVENTS), 100 + rng.randrange(0, 800)
+        ))
+    events.append(get_pointer_event(event.ButtonRelease, width // 2, 500, X.Button1))
+    events += [get_pointer_event(event.KeyRelease, 0, 0, keycode) for keycode in wm.keysyms]
+    return events
+
+
+def measure_zones(wm: FakeWindowManager, repeat: int) -> dict:
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        zone_profile = ZoneProfile.get_zones_per_virtual_desktop(wm.monitors, wm.work_areas)
+        elapsed.append(time.perf_counter() - start)
+    return { "zone_profile": zone_profile, "get_zones_per_virtual_desktop": get_latency_summary(elapsed) }
+
+
+def measure_find_zone(zone_profile, wm: FakeWindowManager, rng: random.Random) -> dict:
+    width = sum(monitor['virtual_width'] for monitor in wm.monitors)
+    points = [(rng.randrange(0, width), rng.randrange(0, 1080)) for _ in range(FIND_ZONE_POINTS)]
+    start = time.perf_counter()
+    for x, y in points:
+        zone_profile.find_zone(0, x, y)
+    elapsed = time.perf_counter() - start
+    return { "ns_per_call": elapsed / len(points) * 1e9 }
+
+
+def measure_process_event(zone_profile, wm: FakeWindowManager, rng: random.Random, repeat: int) -> dict:
+    from .service import Service
+
+    latencies = { name: [] for name in EVENT_NAMES.values() }
+    snaps = 0
+    requests = 0
+    for _ in range(repeat):
+        wm.activate(rng.choice(wm.clients))
+        service = Service(
+            ewmh=wm.create_ewmh(),
+            zone_profile=zone_profile,
+            zone_window=NullZoneDisplay(),
+            snap_executor=CountingSnapExecutor(),
+        )
+        xq.parent_chain_cache.clear()
+        wm.requests.clear()
+        for drag_event in get_drag_events(wm, rng):
+            start = time.perf_counter()
+            service.process_event(drag_event)
+            elapsed = time.perf_counter() - start
+            if drag_event.type in EVENT_NAMES:
+                latencies[EVENT_NAMES[drag_event.type]].append(elapsed)
+        snaps += len(service.snap_executor.snaps)
+        requests += sum(wm.requests.values())
+
+    return {
+        "latency": { name: get_latency_summary(values) for name, values in latencies.items() },
+        "snaps_per_drag": snaps / repeat,
+        "requests_per_drag": requests / repeat,
+    }
+
+
+def measure_snap_window(zone_profile, wm: FakeWindowManager, rng: random.Random, repeat: int) -> dict:
+    ewmh = wm.create_ewmh()
+    settings = SETTINGS.snapshot
+    elapsed = []
+    wm.requests.clear()
+    for _ in range(repeat):
+        window = rng.choice(wm.clients)
+        zone = find_snap_zone(zone_profile, 0, rng.randrange(0, 1920), rng.randrange(0, 1000))
+        start = time.perf_counter()
+        snap_window(ewmh, window, zone, settings)
+        elapsed.append(time.perf_counter() - start)
+    return { "latency": get_latency_summary(elapsed), "requests_per_snap": sum(wm.requests.values()) / repeat }
+
+
+def measure_window_coordinates_by_tree(wm: FakeWindowManager, rng: random.Random, repeat: int) -> dict:
+    # The fallback for when TranslateCoords fails, uncached
+    elapsed = []
+    wm.requests.clear()
+    for _ in range(repeat):
+        xq.parent_chain_cache.clear()
+        window = rng.choice(wm.clients)
+        start = time.perf_counter()
+        xq.get_window_coordinates_by_tree(window)
+        elapsed.append(time.perf_counter() - start)
+    return { "latency": get_latency_summary(elapsed), "requests_per_call": sum(wm.requests.values()) / repeat }
+
+
+def run_scale(scale: dict, latency: float, repeat: int) -> dict:
+    rng = random.Random(0)
+    SETTINGS.load(get_zone_configuration(scale['monitors']))
+
+    start = time.perf_counter()
+    wm = FakeWindowManager(latency=latency, **scale)
+    setup = time.perf_counter() - start
+    wm.keysyms = { 10 + index: XK.string_to_keysym(key) for index, key in enumerate(SETTINGS.snapshot.keybindings) }
+
+    zones = measure_zones(wm, repeat)
+    zone_profile = zones.pop("zone_profile")
+    return {
+        "scale": scale,
+        "fake_wm_setup_ms": setup * 1000,
+        **zones,
+        "find_zone": measure_find_zone(zone_profile, wm, rng),
+        "process_event": measure_process_event(zone_profile, wm, rng, repeat),
+        "snap_window": measure_snap_window(zone_profile, wm, rng, repeat),
+        "get_window_coordinates_by_tree": measure_window_coordinates_by_tree(wm, rng, repeat),
+    }
+
+
+def run(latency: float = 0.0, repeat: int = 5) -> list[dict]:
+    user_configuration = SETTINGS.user_configuration
+    results = []
+    try:
+        for dimension, values in SCALES.items():
+            for value in values:
+                scale = BASELINE | { dimension: value }
+                logging.info(f"Benchmarking {scale}")
+                results.append(run_scale(scale, latency, repeat))
+    finally:
+        SETTINGS.load(user_configuration or {})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='pyxzones.benchmark',
+        description='Scale benchmarks against an in-memory fake window manager'
+    )
+    parser.add_argument(
+        '--latency',
+        type=float,
+        default=0.0,
+        help='artificial latency of every X request in milliseconds'
+    )
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=5,
+        help='repetitions of each measurement'
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)-8s %(message)s")
+    print(json.dumps(run(args.latency / 1000, args.repeat), indent=4))
+
+
+if __name__ == "__main__":
+    main()
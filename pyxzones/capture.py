@@ -0,0 +1,75 @@
+import logging
+from Xlib import X
+from Xlib.display import Display
+from Xlib.ext import record
+
+
+# Key and button transitions are enough to notice an activation chord or the
+# start of a drag, so this is all that is recorded while nothing is happening
+IDLE_DEVICE_EVENTS = (X.KeyPress, X.ButtonRelease)
+
+# MotionNotify directly follows ButtonRelease, so the active range only needs
+# to be extended by one to also pick up pointer movement
+ACTIVE_DEVICE_EVENTS = (X.KeyPress, X.MotionNotify)
+
+
+def get_record_range(device_events: tuple[int, int]) -> dict:
+    return {
+        "core_requests": (0, 0),
+        "core_replies": (0, 0),
+        "ext_requests": (0, 0, 0, 0),
+        "ext_replies": (0, 0, 0, 0),
+        "delivered_events": (0, 0),
+        "device_events": device_events,
+        "errors": (0, 0),
+        "client_started": False,
+        "client_died": False,
+    }
+
+
+class RecordCapture:
+    """
+    RECORD context over all clients which only captures pointer motion while
+    it is actually needed
+
+    Every recorded MotionNotify wakes the process up, which is a waste for the
+    vast majority of the day where nobody is dragging a window around
+    """
+
+    def __init__(self):
+        # Not sure why this needs its own Display but display-referencing behavior
+        # becomes somewhat unpredictable without it
+        self.record_display = Display()
+
+        # record_enable_context() blocks the record display for as long as the
+        # context is enabled, so changes to the context go through another one
+        self.control_display = Display()
+
+        self.context = self.record_display.record_create_context(
+            0,
+            [record.AllClients],
+            [get_record_range(IDLE_DEVICE_EVENTS)],
+        )
+        self.capturing_motion = False
+
+    def set_motion_capture(self, enabled: bool):
+        if enabled == self.capturing_motion:
+            return
+
+        # Registering clients which are already part of the context replaces
+        # their recorded ranges, so this is a single request in both directions
+        # and no key or button events fall in between an unregister/register
+        logging.debug(f"RECORD motion capture {'enabled' if enabled else 'disabled'}")
+        self.control_display.record_register_clients(
+            self.context,
+            0,
+            [record.AllClients],
+            [get_record_range(ACTIVE_DEVICE_EVENTS if enabled else IDLE_DEVICE_EVENTS)],
+        )
+        self.control_display.flush()
+        self.capturing_motion = enabled
+
+    def enable(self, callback):
+        # Blocks until the context is disabled
+        self.record_display.record_enable_context(self.context, callback)
+        self.record_display.record_free_context(self.context)
@@ -12,29 +12,24 @@ https://specifications.freedesktop.org/basedir-spec/0.8/
 
 """
 
+SETTINGS_FILE = 'pyxzones.json'
 
-def get_config_file_path(filename: str) -> Path | None:
-    xdg_config_home = xdg.xdg_config_home()
-    file = Path(xdg_config_home, filename)
-    if xdg_config_home.is_dir() and file.exists():
-        logging.debug(f"Found configuration file at {file}")
-        return file
-
-    xdg_config_dirs = xdg.xdg_config_dirs()
-    for config_dir in xdg_config_dirs:
-        file = Path(config_dir, filename)
-        if config_dir.is_dir() and file.exists():
-            logging.debug(f"Found configuration file at {file}")
-            return file
 
-    file = Path(Path.home(), filename)
-    if file.exists():
-        logging.debug(f"Found configuration file at {file}")
-        return file
+def get_config_file_candidates(filename: str) -> list[Path]:
+    # In order of precedence
+    candidates = [Path(xdg.xdg_config_home(), filename)]
+    candidates += [Path(config_dir, filename) for config_dir in xdg.xdg_config_dirs()]
+    candidates.append(Path(Path.home(), filename))
 
     # Looking at the home directory, lastly check for a hidden config
     if filename[0] != '.':
-        file = Path(Path.home(), f".{filename}")
+        candidates.append(Path(Path.home(), f".{filename}"))
+
+    return candidates
+
+
+def get_config_file_path(filename: str) -> Path | None:
+    for file in get_config_file_candidates(filename):
         if file.exists():
             logging.debug(f"Found configuration file at {file}")
             return file
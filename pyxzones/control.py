@@ -0,0 +1,180 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from json.decoder import JSONDecodeError
+from pathlib import Path
+
+from . import config
+from .metrics import METRICS
+from .settings import SETTINGS, InvalidSettings
+
+"""
+
+Control socket of the running daemon, a Unix domain socket in the data
+directory taking one JSON request per connection:
+
+    { "command": "reload-config" }
+    { "command": "recompute-zones" }
+    { "command": "status" }
+    { "command": "metrics" }
+    { "command": "snap", "zone": <index on the current desktop>, "window": <id, default active> }
+
+and answering with a single JSON object, { "ok": true, ... } or
+{ "ok": false, "error": "..." }
+
+"""
+
+SOCKET_FILE = 'pyxzones.sock'
+MAX_REQUEST_SIZE = 65536
+
+
+class ControlError(Exception):
+    pass
+
+
+def get_socket_file_path() -> Path | None:
+    data_directory = config.get_data_directory_path()
+    return Path(data_directory, SOCKET_FILE) if data_directory else None
+
+
+class ControlServer:
+    def __init__(self, service):
+        self.service = service
+        self.started_at = time.time()
+        self.ewmh = None  # own X connection, created on the server thread
+        self.commands = {
+            "reload-config":   self.reload_config,
+            "recompute-zones": self.recompute_zones,
+            "status":          self.status,
+            "metrics":         self.metrics,
+            "snap":            self.snap,
+        }
+
+    def start(self) -> bool:
+        socket_file = get_socket_file_path()
+        if socket_file is None:
+            logging.warning("No data directory for the control socket, running without it")
+            return False
+
+        # A socket left behind by a daemon which didn't exit cleanly
+        socket_file.unlink(missing_ok=True)
+
+        # Created owner only from the start, rather than chmod'ed after bind
+        # (leaving a window in which anyone could connect)
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o177)
+        try:
+            self.socket.bind(str(socket_file))
+            self.socket.listen()
+        except OSError:
+            self.socket.close()
+            raise
+        finally:
+            os.umask(umask)
+        logging.debug(f"Listening for control commands on {socket_file}")
+
+        thread = threading.Thread(target=self.serve)
+        thread.daemon=True
+        thread.start()
+        return True
+
+    def serve(self):
+        while True:
+            connection, _ = self.socket.accept()
+            with connection:
+                try:
+                    response = self.handle(read_message(connection))
+                except (ControlError, InvalidSettings, JSONDecodeError, OSError) as exception:
+                    response = { "ok": False, "error": str(exception) }
+                except Exception as exception:
+                    logging.exception("Control command failed")
+                    response = { "ok": False, "error": f"{type(exception).__name__}: {exception}" }
+
+                try:
+                    connection.sendall(json.dumps(response).encode() + b'\n')
+                except OSError as exception:
+                    logging.debug(f"Failed to answer control command: {exception}")
+
+    def handle(self, request) -> dict:
+        if not isinstance(request, dict) or request.get("command") not in self.commands:
+            raise ControlError(f"Unknown command, expected one of: {', '.join(self.commands)}")
+        logging.debug(f"Control command: {request}")
+        return { "ok": True } | self.commands[request["command"]](request)
+
+    def get_ewmh(self):
+        if self.ewmh is None:
+            from .xewmh import XEWMH
+            self.ewmh = XEWMH()
+        return self.ewmh
+
+    def reload_config(self, request) -> dict:
+        return { "changed": sorted(self.service.reload_settings()) }
+
+    def recompute_zones(self, request) -> dict:
+        self.service.recompute_zones()
+        return { "zones": [table.zone_count for table in self.service.zone_profile.tables] }
+
+    def status(self, request) -> dict:
+        service = self.service
+        zone_state = service.zone_state
+        zone_profile = zone_state.zone_profile
+        return {
+            "pid": os.getpid(),
+            "uptime": time.time() - self.started_at,
+            "config_file": str(config.get_config_file_path(config.SETTINGS_FILE)),
+            "current_desktop": zone_state.current_desktop,
+            "desktops": len(zone_profile.tables),
+            "monitors": zone_profile.monitors,
+            "zones": [table.zone_count for table in zone_profile.tables],
+            "overlay_ready": getattr(service.zone_window, 'zone_window', True) is not None,
+            "capturing_motion": bool(service.capture and service.capture.capturing_motion),
+            "dragging": service.drag_session is not None,
+        }
+
+    def metrics(self, request) -> dict:
+        return METRICS.to_dict()
+
+    def snap(self, request) -> dict:
+        zones = self.service.zone_state.zone_table.zones
+        zone_index = request.get("zone")
+        if not isinstance(zone_index, int) or not 0 <= zone_index < len(zones):
+            raise ControlError(f"Expected a zone index between 0 and {len(zones) - 1}")
+
+        ewmh = self.get_ewmh()
+        window_id = request.get("window")
+        window = ewmh.display.create_resource_object('window', window_id) if window_id else ewmh.getActiveWindow()
+        if window is None:
+            raise ControlError("No window to snap")
+
+        self.service.snap_executor.submit(window, zones[zone_index], SETTINGS.snapshot)
+        return { "window": window.id, "zone": zone_index }
+
+
+def read_message(connection):
+    data = b''
+    while not data.endswith(b'\n'):
+        chunk = connection.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+        if len(data) > MAX_REQUEST_SIZE:
+            raise ControlError("Request too large")
+    return json.loads(data)
+
+
+def send_command(command: str, timeout: float = 10.0, **arguments) -> dict:
+    socket_file = get_socket_file_path()
+    if socket_file is None or not socket_file.exists():
+        raise ControlError("No running process found.")
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        try:
+            connection.connect(str(socket_file))
+        except (ConnectionRefusedError, FileNotFoundError):
+            raise ControlError("No running process found.")
+        connection.sendall(json.dumps({ "command": command } | arguments).encode() + b'\n')
+        return read_message(connection)
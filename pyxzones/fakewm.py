@@ -0,0 +1,249 @@
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+
+from . import xq
+from .roundtrips import ROUND_TRIPS
+from .trace import ReplayProtocolDisplay
+from .types import WorkArea
+
+"""
+
+In-memory stand-in for the X server and window manager, implementing the parts
+of XEWMH (and of the Xlib windows and display behind it) that the service,
+xq and snap_window use
+
+Every request costs an artificial latency and is counted, so the code paths
+can be measured at scales (monitors, desktops, windows, reparenting depth) that
+are impractical to set up on a real display
+
+"""
+
+MONITOR_SIZE = (1920, 1080)
+PANEL_HEIGHT = 30
+FRAME_EXTENTS = (1, 1, 28, 1)  # left, right, top, bottom
+
+
+@dataclass
+class FakeGeometry:
+    x:      int
+    y:      int
+    width:  int
+    height: int
+
+
+@dataclass(frozen=True)
+class FakeTree:
+    parent: 'FakeWindow | None'
+
+
+@dataclass(frozen=True)
+class FakeCoordinates:
+    x: int
+    y: int
+
+
+@dataclass(frozen=True)
+class FakeProperty:
+    value: tuple
+
+
+class FakeWindow:
+    def __init__(self, wm: 'FakeWindowManager', id: int, parent: 'FakeWindow | None', geometry: FakeGeometry):
+        self.wm = wm
+        self.id = id
+        self.parent = parent
+        self.geometry = geometry
+        self.properties = {}
+
+    @property
+    def display(self):
+        return self.wm.display
+
+    def get_geometry(self):
+        self.wm.request('GetGeometry')
+        return FakeGeometry(self.geometry.x, self.geometry.y, self.geometry.width, self.geometry.height)
+
+    def query_tree(self):
+        self.wm.request('QueryTree')
+        return FakeTree(self.parent)
+
+    def translate_coords(self, window, x, y):
+        # Relative to self, which is the root in practice
+        self.wm.request('TranslateCoords')
+        while window is not None and window is not self:
+            x += window.geometry.x
+            y += window.geometry.y
+            window = window.parent
+        return FakeCoordinates(x, y)
+
+    def get_full_property(self, atom, property_type):
+        self.wm.request('GetProperty')
+        value = self.properties.get(atom)
+        return FakeProperty(value) if value is not None else None
+
+
+class FakeDisplay:
+    def __init__(self, wm: 'FakeWindowManager'):
+        self.wm = wm
+        self.display = ReplayProtocolDisplay()
+        self.atoms = {}
+
+    def get_atom(self, name, only_if_exists=False):
+        # Atoms are cached by Xlib, so interning is free after the first time
+        if name not in self.atoms:
+            self.wm.request('InternAtom')
+            self.atoms[name] = len(self.atoms) + 1
+        return self.atoms[name]
+
+    def create_resource_object(self, type, id):
+        return self.wm.windows.get(id)
+
+    def keycode_to_keysym(self, keycode, index):
+        return self.wm.keysyms.get(keycode, 0)
+
+    def flush(self):
+        pass
+
+
+class FakeWindowManager:
+    def __init__(self, monitors=1, desktops=1, windows=100, reparent_depth=1, latency=0.0, seed=0):
+        self.latency = latency
+        self.requests = Counter()
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.keysyms = {}  # keycode -> keysym
+        self.current_desktop = 0
+
+        # Monitors side by side, each with a panel along the bottom
+        width, height = MONITOR_SIZE
+        self.monitors = [
+            {
+                "output": 100 + index,
+                "crtc": 200 + index,
+                "mode": 1,
+                "rotation": 1,
+                "virtual_x": index * width,
+                "virtual_y": 0,
+                "virtual_width": width,
+                "virtual_height": height,
+                "width": width,
+                "height": height,
+                "scale": 1.0,
+            }
+            for index in range(monitors)
+        ]
+        self.work_areas = [
+            [WorkArea(monitor['virtual_x'], 0, width, height - PANEL_HEIGHT) for monitor in self.monitors]
+            for _ in range(desktops)
+        ]
+
+        # Every client window is reparented into reparent_depth frames
+        self.windows = {}
+        self.root = self.create_window(None, FakeGeometry(0, 0, width * monitors, height))
+        self.clients = []
+        for _ in range(windows):
+            parent = self.root
+            x = self.random.randrange(0, width * monitors - 400)
+            y = self.random.randrange(0, height - 300)
+            for depth in range(reparent_depth):
+                parent = self.create_window(parent, FakeGeometry(x, y, 800, 600) if depth == 0 else FakeGeometry(0, 0, 800, 600))
+            client = self.create_window(parent, FakeGeometry(FRAME_EXTENTS[0], FRAME_EXTENTS[2], 798, 571))
+            self.clients.append(client)
+        self.active_window = self.clients[0] if self.clients else None
+
+        self.display = FakeDisplay(self)
+        frame_extents_atom = self.display.atoms.setdefault('_NET_FRAME_EXTENTS', 1)
+        for client in self.clients:
+            client.properties[frame_extents_atom] = FRAME_EXTENTS
+        self.requests.clear()
+
+    def create_window(self, parent, geometry) -> FakeWindow:
+        window = FakeWindow(self, 0x100000 + len(self.windows), parent, geometry)
+        self.windows[window.id] = window
+        return window
+
+    def request(self, name: str, reply: bool = True):
+        # Nothing is pipelined here, every request with a reply is a round trip
+        with self.lock:
+            self.requests[name] += 1
+        ROUND_TRIPS.record_request(name, reply, blocking=reply)
+        if self.latency:
+            time.sleep(self.latency)
+
+    def activate(self, window: FakeWindow):
+        self.active_window = window
+
+    def create_ewmh(self) -> 'FakeEWMH':
+        return FakeEWMH(self)
+
+
+class FakeEWMH:
+    # Same surface as XEWMH, going through the actual xq functions wherever those
+    # operate on windows (which are duck typed)
+    def __init__(self, wm: FakeWindowManager):
+        self.wm = wm
+        self.display = wm.display
+        self.root = wm.root
+
+    def preloadAtoms(self):
+        pass
+
+    def getAtom(self, name):
+        return self.display.get_atom(name)
+
+    def getNumberOfDesktops(self):
+        self.wm.request('GetProperty')
+        return len(self.wm.work_areas)
+
+    def getCurrentDesktop(self):
+        self.wm.request('GetProperty')
+        return self.wm.current_desktop
+
+    def getActiveWindow(self):
+        self.wm.request('GetProperty')
+        return self.wm.active_window
+
+    def getMonitors(self):
+        for _ in range(1 + 2 * len(self.wm.monitors)):
+            self.wm.request('RandR')
+        return [dict(monitor) for monitor in self.wm.monitors]
+
+    def getWorkAreasForVirtualDesktop(self, desktop_index: int):
+        self.wm.request('GetProperty')
+        return list(self.wm.work_areas[desktop_index])
+
+    def getWorkAreasForVirtualDesktops(self, desktops):
+        return [self.getWorkAreasForVirtualDesktop(desktop) for desktop in desktops]
+
+    def getWorkAreasForAllVirtualDesktops(self):
+        return [self.getWorkAreasForVirtualDesktop(desktop) for desktop in range(self.getNumberOfDesktops())]
+
+    def discoverLayout(self):
+        # Pipelined in the real thing, so only three round trips are paid
+        start = time.perf_counter()
+        for _ in range(3):
+            self.wm.request('RandR')
+        monitors = [dict(monitor) for monitor in self.wm.monitors]
+        work_areas = [list(work_areas) for work_areas in self.wm.work_areas]
+        return monitors, work_areas, xq.DiscoveryStats(3, time.perf_counter() - start)
+
+    def getWindowFrameExtents(self, window):
+        return xq.get_window_frame_extents(self.display, window)
+
+    def getWindowCoordinates(self, window):
+        return xq.get_window_coordinates(window, self.root)
+
+    def setMoveResizeWindow(self, win, gravity=0, x=None, y=None, w=None, h=None):
+        # Sent as a client message, the WM moves the frame
+        self.wm.request('SendEvent', reply=False)
+        frame = win
+        while frame.parent is not self.root and frame.parent is not None:
+            frame = frame.parent
+        frame.geometry.x, frame.geometry.y = x, y
+        win.geometry.width, win.geometry.height = w, h
+
+    def setWmState(self, win, action, state, state2=0):
+        self.wm.request('SendEvent', reply=False)
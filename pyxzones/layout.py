@@ -0,0 +1,255 @@
+from dataclasses import dataclass
+
+from .types import MergeZone, WorkArea, Zone
+
+"""
+
+Compiler of nested zone layouts into flat zone tables
+
+A display specification with a "layout" describes its zones as a tree, which
+is compiled once per (monitor, work area) into a flat list of zones, and merge
+zones between every pair of adjacent zones:
+
+    {
+        "gap": 4,                           optional, inset (px) of every zone
+        "layout": NODE
+    }
+
+    NODE is one of
+        number                              a zone, weighted against its siblings
+        { "size": 2, "gap": 8 }             a zone with its own weight and gap
+        { "size": 1, "columns": [NODE, ...] }
+        { "size": 1, "rows": [NODE, ...] }
+        {
+            "size": 1,
+            "grid": { "columns": [1, 1, 1], "rows": [1, 1] },
+            "zones": [ { "column": 0, "row": 0, "column_span": 2, "row_span": 1, "gap": 8 }, ... ]
+        }
+
+"size" defaults to 1, "gap" to the gap of the enclosing node. Zones are listed
+in the order they appear in the tree, and splits round the same way the legacy
+"columns"/"rows" displays always have, so those keep giving identical zones
+
+"""
+
+
+class LayoutError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Cell:
+    # The area a zone is laid out in, zones are inset from it by the gap, while
+    # adjacency is decided on the cells themselves
+    x:      int
+    y:      int
+    width:  int
+    height: int
+    gap:    int
+
+
+@dataclass(frozen=True)
+class CompiledLayout:
+    zones:       tuple[Zone, ...]
+    merge_zones: tuple[MergeZone, ...]
+
+
+def is_layout_spec(zone_spec: dict) -> bool:
+    return 'layout' in zone_spec
+
+
+def is_number(value) -> bool:
+    return not isinstance(value, bool) and isinstance(value, (int, float))
+
+
+def get_weight(node) -> float:
+    return node if is_number(node) else node.get('size', 1)
+
+
+def get_edges(start: int, extent: int, weights: list[float]) -> list[int]:
+    total = sum(weights)
+    edges = [start]
+    consumed = 0
+    for weight in weights:
+        consumed += int(weight / total * extent)
+        edges.append(int(start + consumed))
+    return edges
+
+
+def compile_node(node, x: int, y: int, width: int, height: int, gap: int, cells: list[Cell]):
+    if is_number(node):
+        cells.append(Cell(x, y, width, height, gap))
+        return
+
+    gap = node.get('gap', gap)
+    if 'columns' in node:
+        edges = get_edges(x, width, [get_weight(child) for child in node['columns']])
+        for index, child in enumerate(node['columns']):
+            compile_node(child, edges[index], y, edges[index + 1] - edges[index], height, gap, cells)
+
+    elif 'rows' in node:
+        edges = get_edges(y, height, [get_weight(child) for child in node['rows']])
+        for index, child in enumerate(node['rows']):
+            compile_node(child, x, edges[index], width, edges[index + 1] - edges[index], gap, cells)
+
+    elif 'grid' in node:
+        column_edges = get_edges(x, width, node['grid']['columns'])
+        row_edges = get_edges(y, height, node['grid']['rows'])
+        for zone in node['zones']:
+            column, row = zone['column'], zone['row']
+            column_end = column + zone.get('column_span', 1)
+            row_end = row + zone.get('row_span', 1)
+            cells.append(Cell(
+                column_edges[column], row_edges[row],
+                column_edges[column_end] - column_edges[column], row_edges[row_end] - row_edges[row],
+                zone.get('gap', gap)
+            ))
+
+    else:
+        cells.append(Cell(x, y, width, height, gap))
+
+
+def get_zone(cell: Cell, orientation: str) -> Zone:
+    gap = int(cell.gap)
+    return Zone(
+        x=cell.x + gap,
+        y=cell.y + gap,
+        width=max(0, cell.width - 2 * gap),
+        height=max(0, cell.height - 2 * gap),
+        orientation=orientation
+    )
+
+
+def get_bounding_zone(first: Zone, second: Zone) -> Zone:
+    x = min(first.x, second.x)
+    y = min(first.y, second.y)
+    return Zone(
+        x=x,
+        y=y,
+        width=max(first.x + first.width, second.x + second.width) - x,
+        height=max(first.y + first.height, second.y + second.height) - y,
+        orientation=first.orientation
+    )
+
+
+def get_adjacent_merge_zones(cells: list[Cell], zones: list[Zone], work_area: WorkArea,
+                             merge_zone_size_preference) -> list[MergeZone]:
+    # A merge zone is centered on the edge shared by every pair of adjacent cells,
+    # as wide (or tall) as the legacy merge zones across the work area, and along
+    # the edge for as long as both cells share it. Snapping to it covers the
+    # bounding rectangle of both zones
+    merge_zones = []
+    if not merge_zone_size_preference or not zones:
+        return merge_zones
+
+    merge_zone_size_multiplier = max(2, min(merge_zone_size_preference, 25)) / 100
+
+    for first_index, first in enumerate(cells):
+        for second_index in range(first_index + 1, len(cells)):
+            second = cells[second_index]
+            left, right = (first, second) if first.x <= second.x else (second, first)
+            top, bottom = (first, second) if first.y <= second.y else (second, first)
+            pair = (zones[first_index], zones[second_index])
+
+            if left.x + left.width == right.x:
+                start = max(first.y, second.y)
+                end = min(first.y + first.height, second.y + second.height)
+                if end > start:
+                    merge_zones.append(MergeZone(
+                        x=int(right.x - work_area.width * merge_zone_size_multiplier / 2),
+                        y=start,
+                        width=int(work_area.width * merge_zone_size_multiplier),
+                        height=end - start,
+                        orientation=pair[0].orientation,
+                        zones=pair,
+                        surface=get_bounding_zone(*pair)
+                    ))
+
+            elif top.y + top.height == bottom.y:
+                start = max(first.x, second.x)
+                end = min(first.x + first.width, second.x + second.width)
+                if end > start:
+                    merge_zones.append(MergeZone(
+                        x=start,
+                        y=int(bottom.y - work_area.height * merge_zone_size_multiplier / 2),
+                        width=end - start,
+                        height=int(work_area.height * merge_zone_size_multiplier),
+                        orientation=pair[0].orientation,
+                        zones=pair,
+                        surface=get_bounding_zone(*pair)
+                    ))
+
+    return merge_zones
+
+
+def compile_layout(work_area: WorkArea, zone_spec: dict, orientation: str,
+                   merge_zone_size_preference) -> CompiledLayout:
+    cells = []
+    compile_node(
+        zone_spec['layout'], work_area.x, work_area.y, work_area.width, work_area.height,
+        zone_spec.get('gap', 0), cells
+    )
+    zones = [get_zone(cell, orientation) for cell in cells]
+    merge_zones = get_adjacent_merge_zones(cells, zones, work_area, merge_zone_size_preference)
+    return CompiledLayout(tuple(zones), tuple(merge_zones))
+
+
+def validate_node(node, path: str):
+    if is_number(node):
+        if node <= 0:
+            raise LayoutError(f"{path}: expected a positive size")
+        return
+    if not isinstance(node, dict):
+        raise LayoutError(f"{path}: expected a size or an object")
+
+    if not is_number(node.get('size', 1)) or node.get('size', 1) <= 0:
+        raise LayoutError(f"{path}.size: expected a positive number")
+    if not is_number(node.get('gap', 0)) or node.get('gap', 0) < 0:
+        raise LayoutError(f"{path}.gap: expected a non-negative number")
+
+    splits = [key for key in ('columns', 'rows', 'grid') if key in node]
+    if len(splits) > 1:
+        raise LayoutError(f"{path}: expected only one of {', '.join(splits)}")
+
+    for key in ('columns', 'rows'):
+        if key in node:
+            if not isinstance(node[key], list) or not node[key]:
+                raise LayoutError(f"{path}.{key}: expected a non-empty list")
+            for index, child in enumerate(node[key]):
+                validate_node(child, f"{path}.{key}[{index}]")
+
+    if 'grid' in node:
+        validate_grid(node, path)
+
+
+def validate_grid(node, path: str):
+    grid = node['grid']
+    if not isinstance(grid, dict):
+        raise LayoutError(f"{path}.grid: expected an object with 'columns' and 'rows'")
+    for key in ('columns', 'rows'):
+        sizes = grid.get(key)
+        if not isinstance(sizes, list) or not sizes or not all(is_number(size) and size > 0 for size in sizes):
+            raise LayoutError(f"{path}.grid.{key}: expected a non-empty list of positive sizes")
+
+    zones = node.get('zones')
+    if not isinstance(zones, list) or not zones:
+        raise LayoutError(f"{path}.zones: expected a non-empty list of grid zones")
+    for index, zone in enumerate(zones):
+        zone_path = f"{path}.zones[{index}]"
+        if not isinstance(zone, dict):
+            raise LayoutError(f"{zone_path}: expected an object")
+        for key, count in (('column', len(grid['columns'])), ('row', len(grid['rows']))):
+            start = zone.get(key)
+            span = zone.get(f"{key}_span", 1)
+            if not isinstance(start, int) or isinstance(start, bool) or not 0 <= start < count:
+                raise LayoutError(f"{zone_path}.{key}: expected an index below {count}")
+            if not isinstance(span, int) or isinstance(span, bool) or span < 1 or start + span > count:
+                raise LayoutError(f"{zone_path}.{key}_span: expected a span within the grid")
+        if not is_number(zone.get('gap', 0)) or zone.get('gap', 0) < 0:
+            raise LayoutError(f"{zone_path}.gap: expected a non-negative number")
+
+
+def validate_layout_spec(zone_spec: dict):
+    if not is_number(zone_spec.get('gap', 0)) or zone_spec.get('gap', 0) < 0:
+        raise LayoutError("gap: expected a non-negative number")
+    validate_node(zone_spec['layout'], "layout")
@@ -0,0 +1,161 @@
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+from . import config
+
+"""
+
+In-process metrics, cheap enough to always be recording
+
+Histograms are HDR-style: values (in nanoseconds) land in log-linear buckets
+with 64 sub-buckets per power of two, which keeps every percentile within ~1.5%
+of the recorded value, for a fixed ~2K bucket array that covers up to ~18 minutes
+
+Recording isn't locked, metrics are written from several threads but a lost
+increment under a rare race is an acceptable price for not taking a lock on
+every event
+
+"""
+
+METRICS_FILE = 'pyxzones.metrics.json'
+
+SUB_BUCKET_BITS = 7
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS     # 128, exact below this
+SUB_BUCKET_HALF = SUB_BUCKET_COUNT >> 1     # 64 sub-buckets for every power of two above
+MAX_VALUE_BITS = 40                         # ~18 minutes in nanoseconds
+MAX_VALUE = (1 << MAX_VALUE_BITS) - 1
+BUCKET_COUNT = SUB_BUCKET_COUNT + (MAX_VALUE_BITS - SUB_BUCKET_BITS) * SUB_BUCKET_HALF
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def get_bucket_index(value: int) -> int:
+    if value < SUB_BUCKET_COUNT:
+        return value
+    value = min(value, MAX_VALUE)
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return SUB_BUCKET_COUNT + (shift - 1) * SUB_BUCKET_HALF + (value >> shift) - SUB_BUCKET_HALF
+
+
+def get_bucket_value(index: int) -> int:
+    # Middle of the range of values that land in the bucket
+    if index < SUB_BUCKET_COUNT:
+        return index
+    shift = (index - SUB_BUCKET_COUNT) // SUB_BUCKET_HALF + 1
+    sub_bucket = (index - SUB_BUCKET_COUNT) % SUB_BUCKET_HALF + SUB_BUCKET_HALF
+    return (sub_bucket << shift) + (1 << (shift - 1))
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, seconds: float):
+        value = int(seconds * 1_000_000_000)
+        self.counts[get_bucket_index(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def get_percentile(self, percentile: float) -> int:
+        target = self.count * percentile / 100
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return min(get_bucket_value(index), self.max)
+        return 0
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ns": self.total / self.count if self.count else 0,
+            "max_ns": self.max,
+        } | { f"p{percentile}_ns": self.get_percentile(percentile) for percentile in PERCENTILES }
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+    def increment(self, amount: int = 1):
+        self.value += amount
+
+    def to_dict(self) -> int:
+        return self.value
+
+
+class LabeledCounter:
+    # A counter per label (event type, etc.), created on first increment
+    def __init__(self):
+        self.values = {}
+
+    def increment(self, label, amount: int = 1):
+        self.values[label] = self.values.get(label, 0) + amount
+
+    def to_dict(self) -> dict:
+        return { str(label): value for label, value in self.values.items() }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.started_at = time.time()
+        self.metrics = {}
+
+    def get(self, name: str, metric_class):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics.setdefault(name, metric_class())
+        return metric
+
+    def histogram(self, name: str) -> Histogram:
+        return self.get(name, Histogram)
+
+    def counter(self, name: str) -> Counter:
+        return self.get(name, Counter)
+
+    def labeled_counter(self, name: str) -> LabeledCounter:
+        return self.get(name, LabeledCounter)
+
+    def to_dict(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "uptime": time.time() - self.started_at,
+            "metrics": { name: metric.to_dict() for name, metric in sorted(self.metrics.items()) },
+        }
+
+
+METRICS = MetricsRegistry()
+
+
+def get_metrics_file_path() -> Path | None:
+    data_directory = config.get_data_directory_path()
+    return Path(data_directory, METRICS_FILE) if data_directory else None
+
+
+def dump(path: Path | None = None) -> Path | None:
+    path = path or get_metrics_file_path()
+    if path is None:
+        return None
+
+    # Written aside and renamed into place, readers poll for the new file
+    temporary_file = path.with_suffix('.tmp')
+    try:
+        temporary_file.write_text(json.dumps(METRICS.to_dict(), indent=4))
+        os.replace(temporary_file, path)
+        logging.info(f"Dumped metrics to {path}")
+        return path
+    except OSError as exception:
+        logging.warning(f"Failed to dump metrics to {path}: {exception}")
+        return None
+
+
+def dump_signal_handler(signum, frame):
+    dump()
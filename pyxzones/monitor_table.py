@@ -0,0 +1,130 @@
+import logging
+import threading
+from dataclasses import dataclass
+
+from . import xq
+
+
+class MonitorTable:
+    # Live view of the enabled crtcs (monitors), kept current from the payloads of
+    # RandR CrtcChangeNotify and OutputChangeNotify events rather than querying
+    # every output and crtc again whenever something changes
+    #
+    # Events are applied from the property monitor thread while monitors are read
+    # from the refresh tasks, hence the lock
+    def __init__(self, monitors, mode_map):
+        self.lock = threading.Lock()
+        self.load(monitors, mode_map)
+
+    def load(self, monitors, mode_map):
+        with self.lock:
+            self.mode_map = dict(mode_map)
+            self.crtc_infos = {}    # crtc -> (output, crtc, info)
+            self.output_crtcs = {}  # output -> crtc
+            for monitor in monitors:
+                self.crtc_infos[monitor['crtc']] = (monitor['output'], monitor['crtc'], CrtcInfo.from_monitor(monitor))
+                self.output_crtcs[monitor['output']] = monitor['crtc']
+
+            # Set when an event can't be applied from its payload alone (new
+            # modes, screen size changes), the table then needs a rescan
+            self.stale = False
+
+    def rescan(self, ewmh):
+        logging.debug("Rescanning monitors")
+        self.load(*xq.get_monitors_and_modes(ewmh.display, ewmh.root))
+
+    def apply_crtc_change(self, event) -> bool:
+        with self.lock:
+            previous = self.crtc_infos.get(event.crtc)
+
+            if event.mode == 0 or event.width == 0 or event.height == 0:
+                # crtc disabled
+                self.crtc_infos.pop(event.crtc, None)
+                return previous is not None
+
+            if event.mode not in self.mode_map:
+                self.stale = True
+                return True
+
+            output = previous[0] if previous else next(
+                (output for output, crtc in self.output_crtcs.items() if crtc == event.crtc), None
+            )
+            if output is None:
+                # The OutputChangeNotify assigning this crtc hasn't arrived (yet)
+                self.stale = True
+                return True
+
+            info = CrtcInfo(event.mode, event.rotation, event.x, event.y, event.width, event.height)
+            self.crtc_infos[event.crtc] = (output, event.crtc, info)
+            return previous is None or previous[2] != info
+
+    def apply_output_change(self, event) -> bool:
+        with self.lock:
+            previous_crtc = self.output_crtcs.get(event.output)
+            if event.crtc == 0:
+                self.output_crtcs.pop(event.output, None)
+                self.crtc_infos.pop(previous_crtc, None)
+            else:
+                self.output_crtcs[event.output] = event.crtc
+            return previous_crtc != (event.crtc or None)
+
+    def apply_event(self, event, event_codes: dict) -> bool | None:
+        # Returns whether the monitors changed, or None for anything that isn't
+        # a RandR event (see get_randr_event_codes())
+        kind = get_randr_event_kind(event_codes, event)
+        if kind is None:
+            return None
+        if kind == 'CrtcChangeNotify':
+            return self.apply_crtc_change(event)
+        if kind == 'OutputChangeNotify':
+            return self.apply_output_change(event)
+
+        # Screen size changes may come with new modes
+        with self.lock:
+            self.stale = True
+        return True
+
+    def get_monitors(self):
+        with self.lock:
+            return xq.build_monitors(self.mode_map, list(self.crtc_infos.values()))
+
+
+RANDR_EVENTS = ('ScreenChangeNotify', 'CrtcChangeNotify', 'OutputChangeNotify')
+
+
+def get_randr_event_codes(display) -> dict:
+    # python-xlib registers a clone of each RandR event class with the display
+    # (and only for RandR 1.5+ servers), so events can't be matched against the
+    # classes of Xlib.ext.randr, only against the codes registered for them:
+    # an event code, or (event code, sub code) for the RRNotify sub events
+    #
+    # (code, sub code or None) -> event name, empty without RandR events
+    event_codes = {}
+    for name in RANDR_EVENTS:
+        code = getattr(display.extension_event, name, None)
+        if code is not None:
+            event_codes[code if isinstance(code, tuple) else (code, None)] = name
+    return event_codes
+
+
+def get_randr_event_kind(event_codes: dict, event) -> str | None:
+    return event_codes.get((event.type, None)) or event_codes.get((event.type, getattr(event, 'sub_code', None)))
+
+
+@dataclass(frozen=True)
+class CrtcInfo:
+    # The subset of a GetCrtcInfo reply (or CrtcChangeNotify) that monitors are
+    # built from
+    mode:     int
+    rotation: int
+    x:        int
+    y:        int
+    width:    int
+    height:   int
+
+    @staticmethod
+    def from_monitor(monitor) -> 'CrtcInfo':
+        return CrtcInfo(
+            monitor['mode'], monitor['rotation'],
+            monitor['virtual_x'], monitor['virtual_y'], monitor['virtual_width'], monitor['virtual_height']
+        )
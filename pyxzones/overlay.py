@@ -0,0 +1,146 @@
+import logging
+import threading
+import time
+
+from .metrics import METRICS
+from .xq import get_root_size
+
+
+# From show() on the event path until the overlay is actually shown from the
+# GTK main loop, which includes building the overlay if it wasn't prewarmed
+OVERLAY_SHOW_TIME = METRICS.histogram("overlay_show")
+
+
+class DeferredZoneDisplay:
+    # Stands in for the zone overlay (ZoneDisplayWindow or MonitorZoneDisplay)
+    # until it actually exists
+    #
+    # Importing gi and initializing GTK is by far the most expensive part of
+    # starting up, and the overlay isn't needed until the first activation chord,
+    # so the GTK main loop is only started once RECORD is live (prewarm()) or, if
+    # the chord comes first, when the overlay is first shown. The overlay is then
+    # built from within the main loop, never on the thread asking for it, and
+    # state set in the meantime (zones, monitors, prerendered desktops, a show
+    # not yet followed by a hide) is replayed onto it once it has been built
+    def __init__(self, width, height, zones, monitors=None):
+        self.lock = threading.Lock()
+        self.width = width
+        self.height = height
+        self.zones = zones
+        self.monitors = monitors
+        self.zones_per_desktop = None
+        self.settings = None
+        self.zone_window = None
+        self.idle_add = None
+
+        # Guards the hand over from show() and hide() on the event path, which
+        # mustn't wait for the build to finish as it would under self.lock
+        self.show_lock = threading.Lock()
+        self.main_loop_started = False
+        self.pending_show: float | None = None  # when show() was called
+
+    def start_main_loop(self):
+        with self.show_lock:
+            if self.main_loop_started:
+                return
+            self.main_loop_started = True
+
+        thread = threading.Thread(target=self.run_main_loop)
+        thread.daemon=True
+        thread.start()
+
+    def run_main_loop(self):
+        start = time.perf_counter()
+        from gi.repository import GLib, Gtk
+
+        GLib.idle_add(self.build, start)
+        Gtk.main()
+
+    def build(self, start):
+        # Runs on the GTK main loop
+        with self.lock:
+            from gi.repository import GLib
+            from .zone_display import setup_zone_display
+
+            zone_window = setup_zone_display(self.width, self.height, self.zones, self.monitors)
+            if self.settings:
+                zone_window.set_settings(self.settings)
+            if self.zones_per_desktop:
+                zone_window.prerender(self.zones_per_desktop)
+
+            self.idle_add = GLib.idle_add
+            with self.show_lock:
+                self.zone_window = zone_window
+                requested_at, self.pending_show = self.pending_show, None
+
+        logging.info(f"Zone overlay ready in {(time.perf_counter() - start) * 1000:.1f}ms")
+        if requested_at is not None:
+            self.show_window(zone_window, requested_at)
+        return False
+
+    def prewarm(self):
+        self.start_main_loop()
+
+    def set_settings(self, settings):
+        with self.lock:
+            self.settings = settings
+            if self.zone_window:
+                self.zone_window.set_settings(settings)
+
+    def set_zones(self, zones):
+        with self.lock:
+            self.zones = zones
+            if self.zone_window:
+                self.zone_window.set_zones(zones)
+
+    def set_monitors(self, monitors):
+        with self.lock:
+            self.monitors = monitors
+            if monitors:
+                self.width, self.height = get_root_size(monitors)
+            if self.zone_window:
+                self.zone_window.set_monitors(monitors)
+
+    def prerender(self, zones_per_desktop):
+        with self.lock:
+            self.zones_per_desktop = zones_per_desktop
+            if self.zone_window:
+                self.zone_window.prerender(zones_per_desktop)
+
+    # Everything below is called from the event path, where the overlay is read
+    # without the lock (the reference is only ever assigned once)
+
+    def track_point(self, x, y):
+        if self.zone_window:
+            self.zone_window.track_point(x, y)
+
+    def update_hover_zone(self, zone):
+        if self.zone_window:
+            self.zone_window.update_hover_zone(zone)
+
+    def reset_position(self):
+        if self.zone_window:
+            self.idle_add(self.zone_window.reset_position)
+
+    def show(self):
+        requested_at = time.perf_counter()
+        with self.show_lock:
+            zone_window = self.zone_window
+            if zone_window is None:
+                self.pending_show = requested_at
+        if zone_window is None:
+            self.start_main_loop()
+        else:
+            self.idle_add(self.show_window, zone_window, requested_at)
+
+    def show_window(self, zone_window, requested_at):
+        zone_window.show()
+        OVERLAY_SHOW_TIME.record(time.perf_counter() - requested_at)
+        return False
+
+    def hide(self):
+        with self.show_lock:
+            self.pending_show = None
+            zone_window = self.zone_window
+        if zone_window:
+            self.idle_add(zone_window.hide)
@@ -2,10 +2,13 @@ import logging
 import os
 import signal
 import sys
+import time
 from pathlib import Path
 
-from .service import Service, FatalXQueryFailure
 from . import config
+from . import control
+from . import metrics
+from .watch import ConfigWatcher
 
 PID_FILE = 'pyxzones.pid'
 
@@ -48,10 +51,22 @@ def save_stored_pid(pid: int) -> bool:
         return False
 
 
-def start() -> None:
+def start(ready_callback=None, trace_file=None) -> None:
+    # Imported here so --kill (and the parent of --daemon) never load Xlib
+    from .service import Service, FatalXQueryFailure
+
+    # Metrics are dumped to the data directory on request (see dump_daemon_metrics)
+    signal.signal(signal.SIGUSR1, metrics.dump_signal_handler)
+
     try:
         service = Service()
-        service.listen()
+        try:
+            control.ControlServer(service).start()
+        except OSError as exception:
+            # Zones work the same without it, only the control commands are lost
+            logging.warning(f"Failed to start the control socket, running without it: {exception}")
+        ConfigWatcher(service).start()
+        service.listen(ready_callback, trace_file)
     except FatalXQueryFailure as exception:
         logging.critical(exception)
         sys.exit(1)
@@ -60,25 +75,42 @@ def start() -> None:
         sys.exit(0)
 
 
-def launch_daemon() -> None:
+def launch_daemon(trace_file=None) -> None:
     pid = get_stored_pid()
     if check_pid_running(pid):
         print("Found existing process, terminating...")
         kill_daemon()
 
+    # The child writes to this pipe once RECORD is live, so the launching
+    # process only returns once the daemon is actually handling events, and
+    # fails if the daemon exits before getting there
+    ready_read, ready_write = os.pipe()
+
     try:
         pid = os.fork()
         if pid > 0:
-            sys.exit(0)
+            os.close(ready_write)
+            with os.fdopen(ready_read, 'rb') as ready:
+                if ready.read(1):
+                    logging.debug(f"Daemon {pid} is ready")
+                    sys.exit(0)
+            logging.fatal(f"Daemon {pid} exited before it was ready")
+            sys.exit(1)
     except OSError as exception:
         logging.fatal(f"Process fork failed: {exception.errno} ({exception.strerror})")
         sys.exit(1)
 
+    os.close(ready_read)
+
     pid = os.getpid()
     save_stored_pid(pid)
     logging.debug(f"Started process: {pid}")
 
-    start()
+    def notify_ready():
+        os.write(ready_write, b'1')
+        os.close(ready_write)
+
+    start(notify_ready, trace_file)
 
 
 def kill_daemon() -> None:
@@ -92,3 +124,29 @@ def kill_daemon() -> None:
     os.kill(pid, signal.SIGTERM)
     print(f"Terminated process: {pid}")
     Path(config.get_data_directory_path(), PID_FILE).unlink()
+    Path(config.get_data_directory_path(), control.SOCKET_FILE).unlink(missing_ok=True)
+
+
+def dump_daemon_metrics(timeout: float = 2.0) -> str | None:
+    pid = get_stored_pid()
+    if not check_pid_running(pid):
+        print("No running process found.")
+        return None
+
+    # The daemon has nowhere to dump its metrics either without a data directory
+    metrics_file = metrics.get_metrics_file_path()
+    if metrics_file is None:
+        print("No data directory available for metrics.")
+        return None
+
+    previous_mtime = metrics_file.stat().st_mtime_ns if metrics_file.exists() else None
+    os.kill(pid, signal.SIGUSR1)
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if metrics_file.exists() and metrics_file.stat().st_mtime_ns != previous_mtime:
+            return metrics_file.read_text()
+        time.sleep(0.02)
+
+    print(f"Process {pid} did not dump its metrics.")
+    return None
@@ -0,0 +1,229 @@
+import hashlib
+import json
+import logging
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from dataclasses import astuple
+from pathlib import Path
+
+from . import config
+from .settings import SETTINGS
+from .types import WorkArea
+from .zone_profile import ZoneProfile
+from .zone_table import COLUMNS, ZoneTable
+
+"""
+
+On-disk cache of the last computed ZoneProfile, so the daemon can start serving
+zones before any X query has been answered
+
+The file is a flat little-endian struct layout (no parsing beyond unpacking at
+offsets) of:
+
+    header     magic, version, layout fingerprint, configuration fingerprint
+    monitors   count, then one MONITOR record each
+    desktops   count, then for each desktop:
+                   work area count, WORK_AREA records
+                   index of its zone table
+    tables     count, then for each zone table:
+                   TABLE record (row count, zone count)
+                   every column (see zone_table.COLUMNS) as a packed array
+
+Desktops sharing a zone table in memory share it on disk, and the columns are
+read back with a single copy each
+
+The configuration fingerprint only covers pyxzones.json settings the zones are
+derived from and is checked before the cache is used at all, the layout
+fingerprint also covers the monitors and work areas and can only be checked
+once X has been queried (see Service.validate_cached_zone_profile)
+
+"""
+
+CACHE_FILE = 'pyxzones.profile'
+
+MAGIC = b'PXZP'
+VERSION = 2
+
+HEADER = struct.Struct('<4sH32s32s')
+COUNT = struct.Struct('<I')
+MONITOR = struct.Struct('<IIIHiiIIIId')
+WORK_AREA = struct.Struct('<iiii')
+TABLE = struct.Struct('<II')
+
+
+def get_cache_file_path() -> Path | None:
+    data_directory = config.get_data_directory_path()
+    return Path(data_directory, CACHE_FILE) if data_directory else None
+
+
+def get_configuration_fingerprint() -> bytes:
+    settings = SETTINGS.snapshot
+    return hashlib.sha256(json.dumps(
+        [settings.zones, settings.merge_zone_size_preference], sort_keys=True
+    ).encode()).digest()
+
+
+def get_layout_fingerprint(monitors, work_areas) -> bytes:
+    return hashlib.sha256(json.dumps(
+        [
+            [sorted(monitor.items()) for monitor in monitors],
+            [[astuple(work_area) for work_area in desktop] for desktop in work_areas],
+        ],
+        sort_keys=True,
+    ).encode() + get_configuration_fingerprint()).digest()
+
+
+def get_little_endian(column: array) -> array:
+    # Arrays are in native byte order, which is swapped either way on big-endian
+    if sys.byteorder == 'big':
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column
+
+
+def encode(zone_profile: ZoneProfile) -> bytes:
+    chunks = [HEADER.pack(
+        MAGIC, VERSION,
+        get_layout_fingerprint(zone_profile.monitors, zone_profile.work_areas),
+        get_configuration_fingerprint(),
+    )]
+
+    chunks.append(COUNT.pack(len(zone_profile.monitors)))
+    for monitor in zone_profile.monitors:
+        chunks.append(MONITOR.pack(
+            monitor['output'], monitor['crtc'], monitor['mode'], monitor['rotation'],
+            monitor['virtual_x'], monitor['virtual_y'], monitor['virtual_width'], monitor['virtual_height'],
+            monitor['width'], monitor['height'], monitor['scale'],
+        ))
+
+    table_indexes = {}  # id(table) -> index
+    for table in zone_profile.tables:
+        table_indexes.setdefault(id(table), len(table_indexes))
+
+    chunks.append(COUNT.pack(len(zone_profile.tables)))
+    for desktop, table in enumerate(zone_profile.tables):
+        chunks.append(COUNT.pack(len(zone_profile.work_areas[desktop])))
+        for work_area in zone_profile.work_areas[desktop]:
+            chunks.append(WORK_AREA.pack(*astuple(work_area)))
+        chunks.append(COUNT.pack(table_indexes[id(table)]))
+
+    tables = list({ id(table): table for table in zone_profile.tables }.values())
+    chunks.append(COUNT.pack(len(tables)))
+    for table in tables:
+        chunks.append(TABLE.pack(len(table), table.zone_count))
+        for column in table.get_columns().values():
+            chunks.append(get_little_endian(column).tobytes())
+
+    return b''.join(chunks)
+
+
+def decode(data: bytes) -> tuple[bytes, bytes, ZoneProfile]:
+    data = memoryview(data)
+    magic, version, layout_fingerprint, configuration_fingerprint = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Unsupported zone profile cache ({magic=}, {version=})")
+    offset = HEADER.size
+
+    def read(record):
+        nonlocal offset
+        values = record.unpack_from(data, offset)
+        offset += record.size
+        return values
+
+    def read_count():
+        return read(COUNT)[0]
+
+    monitors = []
+    for _ in range(read_count()):
+        (output, crtc, mode, rotation, virtual_x, virtual_y, virtual_width, virtual_height,
+         width, height, scale) = read(MONITOR)
+        monitors.append({
+            "output": output,
+            "crtc": crtc,
+            "mode": mode,
+            "rotation": rotation,
+            "virtual_x": virtual_x,
+            "virtual_y": virtual_y,
+            "virtual_width": virtual_width,
+            "virtual_height": virtual_height,
+            "width": width,
+            "height": height,
+            "scale": scale,
+        })
+
+    work_areas, table_indexes = [], []
+    for _ in range(read_count()):
+        work_areas.append([WorkArea(*read(WORK_AREA)) for _ in range(read_count())])
+        table_indexes.append(read_count())
+
+    tables = []
+    for _ in range(read_count()):
+        rows, zone_count = read(TABLE)
+        columns = {}
+        for name, typecode in COLUMNS.items():
+            column = array(typecode)
+            size = rows * column.itemsize
+            if offset + size > len(data):
+                raise ValueError("Truncated zone table")
+            column.frombytes(data[offset:offset + size])
+            offset += size
+            columns[name] = get_little_endian(column)
+        table = ZoneTable(columns, zone_count)
+        table.validate()
+        tables.append(table)
+
+    if any(index >= len(tables) for index in table_indexes):
+        raise ValueError("Desktop references a zone table outside of the cache")
+    zone_profile = ZoneProfile([tables[index] for index in table_indexes], monitors, work_areas)
+    return layout_fingerprint, configuration_fingerprint, zone_profile
+
+
+def load() -> tuple[bytes, ZoneProfile] | None:
+    # Returns the layout fingerprint along with the profile, provided the cached
+    # profile was built from the current configuration
+    cache_file = get_cache_file_path()
+    if cache_file is None or not cache_file.exists():
+        return None
+
+    try:
+        layout_fingerprint, configuration_fingerprint, zone_profile = decode(cache_file.read_bytes())
+    except (OSError, ValueError, IndexError, struct.error) as exception:
+        logging.warning(f"Ignoring unreadable zone profile cache at {cache_file}: {exception}")
+        return None
+
+    if configuration_fingerprint != get_configuration_fingerprint():
+        logging.debug("Zone profile cache was built from a different configuration")
+        return None
+
+    logging.debug(f"Loaded zone profile cache from {cache_file}")
+    return layout_fingerprint, zone_profile
+
+
+def save(zone_profile: ZoneProfile) -> bool:
+    cache_file = get_cache_file_path()
+    if cache_file is None:
+        return False
+
+    # Written aside and renamed into place so a concurrent start never reads
+    # a partially written cache, and to a file of its own so concurrent saves
+    # (another daemon, a CLI invocation) never write into each other's
+    temporary_path = None
+    try:
+        with tempfile.NamedTemporaryFile(
+            dir=cache_file.parent, prefix=f".{cache_file.name}.", suffix='.tmp', delete=False
+        ) as temporary_file:
+            temporary_path = temporary_file.name
+            temporary_file.write(encode(zone_profile))
+        os.replace(temporary_path, cache_file)
+        return True
+    except OSError as exception:
+        logging.warning(f"Failed to write zone profile cache to {cache_file}: {exception}")
+        if temporary_path is not None:
+            try:
+                os.unlink(temporary_path)
+            except OSError:
+                pass
+        return False
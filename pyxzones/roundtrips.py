@@ -0,0 +1,177 @@
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+"""
+
+Opt-in accounting of the X requests made while handling each event and snap
+
+Once enabled, every XEWMH display gets its protocol level send_request and
+send_and_recv wrapped, which counts:
+
+    requests     everything sent, by request name (GetGeometry, GetCrtcInfo, ...)
+    replies      requests which have a reply
+    round_trips  times the caller actually blocked waiting on a reply, so a
+                 batch of deferred requests collected together is one
+
+Requests are attributed to the scope open on the thread making them, see
+scope(). The fake window manager (fakewm.py) reports into the same accounting,
+so the bounds below can be asserted without an X server:
+
+    with ROUND_TRIPS.expect(round_trips=0):
+        service.process_event(motion_event)
+
+"""
+
+
+class RoundTripUsage:
+    def __init__(self):
+        self.requests = 0
+        self.replies = 0
+        self.round_trips = 0
+        self.by_request = Counter()
+        self.waiting_serial = None
+
+    def to_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "replies": self.replies,
+            "round_trips": self.round_trips,
+            "by_request": dict(self.by_request),
+        }
+
+
+class RoundTripScopeStats:
+    def __init__(self):
+        self.count = 0
+        self.total = RoundTripUsage()
+        self.max_requests = 0
+        self.max_round_trips = 0
+
+    def add(self, usage: RoundTripUsage):
+        self.count += 1
+        self.total.requests += usage.requests
+        self.total.replies += usage.replies
+        self.total.round_trips += usage.round_trips
+        self.total.by_request.update(usage.by_request)
+        self.max_requests = max(self.max_requests, usage.requests)
+        self.max_round_trips = max(self.max_round_trips, usage.round_trips)
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "max_requests": self.max_requests,
+            "max_round_trips": self.max_round_trips,
+            "total": self.total.to_dict(),
+        }
+
+
+class RoundTripAccounting:
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.scopes: dict[str, RoundTripScopeStats] = {}
+
+    def enable(self):
+        from .metrics import METRICS
+
+        self.enabled = True
+        METRICS.metrics["round_trips"] = self
+
+    def install(self, display):
+        # display is an Xlib.display.Display, the wrappers go on the protocol
+        # level display every request passes through
+        protocol_display = display.display
+        send_request = protocol_display.send_request
+        send_and_recv = protocol_display.send_and_recv
+
+        def counted_send_request(request, wait_for_response):
+            self.record_request(type(request).__name__, wait_for_response)
+            return send_request(request, wait_for_response)
+
+        def counted_send_and_recv(*args, request=None, **kwargs):
+            # ReplyRequest.reply() loops on this until its reply has arrived,
+            # the wait is only counted once
+            if request is not None:
+                self.record_wait(request)
+            return send_and_recv(*args, request=request, **kwargs)
+
+        protocol_display.send_request = counted_send_request
+        protocol_display.send_and_recv = counted_send_and_recv
+
+    def get_usage(self) -> RoundTripUsage | None:
+        return getattr(self.local, 'usage', None)
+
+    def record_request(self, name: str, wait_for_response: bool, blocking: bool = False):
+        usage = self.get_usage()
+        if usage is None:
+            return
+        usage.requests += 1
+        usage.by_request[name] += 1
+        if wait_for_response:
+            usage.replies += 1
+        if blocking:
+            usage.round_trips += 1
+
+    def record_wait(self, serial: int):
+        usage = self.get_usage()
+        if usage is not None and usage.waiting_serial != serial:
+            usage.waiting_serial = serial
+            usage.round_trips += 1
+
+    @contextmanager
+    def scope(self, name: str | None = None):
+        # Collects the requests made on this thread within the block, and adds
+        # them to the stats of the named scope (unnamed ones are only returned)
+        previous = self.get_usage()
+        usage = self.local.usage = RoundTripUsage()
+        try:
+            yield usage
+        finally:
+            self.local.usage = previous
+            if name is not None:
+                with self.lock:
+                    self.scopes.setdefault(name, RoundTripScopeStats()).add(usage)
+
+    @contextmanager
+    def expect(self, round_trips: int | None = None, requests: int | None = None):
+        with self.scope() as usage:
+            yield usage
+        assert_usage(usage, round_trips, requests)
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            return { name: stats.to_dict() for name, stats in sorted(self.scopes.items()) }
+
+
+ROUND_TRIPS = RoundTripAccounting()
+
+
+def assert_usage(usage: RoundTripUsage, round_trips: int | None = None, requests: int | None = None):
+    if round_trips is not None and usage.round_trips > round_trips:
+        raise AssertionError(
+            f"Expected at most {round_trips} round trips, made {usage.round_trips}: {dict(usage.by_request)}"
+        )
+    if requests is not None and usage.requests > requests:
+        raise AssertionError(
+            f"Expected at most {requests} requests, made {usage.requests}: {dict(usage.by_request)}"
+        )
+
+
+def assert_scope(name: str, round_trips: int | None = None, requests: int | None = None,
+                 accounting: RoundTripAccounting = ROUND_TRIPS):
+    # Bounds every single occurrence of a named scope (each handled event of a
+    # type, each snap), not the total
+    with accounting.lock:
+        stats = accounting.scopes.get(name)
+    if stats is None:
+        raise AssertionError(f"No {name} scope was recorded")
+    if round_trips is not None and stats.max_round_trips > round_trips:
+        raise AssertionError(
+            f"Expected at most {round_trips} round trips per {name}, worst was {stats.max_round_trips}"
+        )
+    if requests is not None and stats.max_requests > requests:
+        raise AssertionError(
+            f"Expected at most {requests} requests per {name}, worst was {stats.max_requests}"
+        )
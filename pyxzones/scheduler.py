@@ -0,0 +1,98 @@
+import heapq
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from .metrics import METRICS
+
+
+DEFAULT_MAX_WAIT = 1.0  # seconds
+
+DEBOUNCE_RUNS = METRICS.labeled_counter("debounce_runs")
+DEBOUNCE_COALESCED = METRICS.labeled_counter("debounce_coalesced")
+
+
+def get_label(key) -> str:
+    # ("zones", 3) and ("zones", None) are counted together
+    return str(key[0] if isinstance(key, tuple) else key)
+
+
+@dataclass(frozen=True)
+class DebouncedTask:
+    callback: Callable
+    args:     tuple
+    deadline: float  # the task runs by then, however often it is rescheduled
+    sequence: int    # of the latest heap entry, any older entry for the key is stale
+
+
+class DebounceScheduler:
+    # Runs debounced tasks from a single thread and a heap of due times, rather
+    # than a threading.Timer (and so a thread) per event
+    #
+    # Scheduling a key which is already pending replaces its task and pushes it
+    # back by the delay again, but never past the deadline set when the key was
+    # first scheduled, so a steady stream of events (dragging a panel around)
+    # can't hold an update back indefinitely. Tasks run one at a time, in the
+    # order they come due
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.heap: list[tuple[float, int, object]] = []  # (due, sequence, key)
+        self.pending: dict[object, DebouncedTask] = {}
+        self.sequence = 0
+
+        thread = threading.Thread(target=self.run)
+        thread.daemon=True
+        thread.start()
+
+    def schedule(self, key, delay: float, callback: Callable, *args, max_wait: float = DEFAULT_MAX_WAIT):
+        now = time.monotonic()
+        with self.condition:
+            previous = self.pending.get(key)
+            if previous is not None:
+                DEBOUNCE_COALESCED.increment(get_label(key))
+                deadline = previous.deadline
+            else:
+                deadline = now + max(delay, max_wait)
+
+            self.sequence += 1
+            self.pending[key] = DebouncedTask(callback, args, deadline, self.sequence)
+            heapq.heappush(self.heap, (min(now + delay, deadline), self.sequence, key))
+            self.condition.notify()
+
+    def cancel(self, key) -> bool:
+        with self.condition:
+            # Its heap entries are skipped as stale
+            return self.pending.pop(key, None) is not None
+
+    def is_pending(self, key) -> bool:
+        with self.condition:
+            return key in self.pending
+
+    def is_stale(self, sequence: int, key) -> bool:
+        task = self.pending.get(key)
+        return task is None or task.sequence != sequence
+
+    def run(self):
+        while True:
+            with self.condition:
+                while True:
+                    while self.heap and self.is_stale(self.heap[0][1], self.heap[0][2]):
+                        heapq.heappop(self.heap)
+                    if not self.heap:
+                        self.condition.wait()
+                        continue
+                    delay = self.heap[0][0] - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self.condition.wait(delay)
+
+                _, _, key = heapq.heappop(self.heap)
+                task = self.pending.pop(key)
+
+            DEBOUNCE_RUNS.increment(get_label(key))
+            try:
+                task.callback(*task.args)
+            except Exception:
+                logging.exception(f"Debounced task {key} failed")
@@ -1,24 +1,55 @@
+import json
 import logging
 import threading
+import time
 from dataclasses import dataclass
-from gi.repository import GLib
 from Xlib import X, XK
-from Xlib.display import Display
-from Xlib.ext import record
+from Xlib.ext import randr, record
 from Xlib.protocol import rq
 from Xlib.xobject.drawable import Window
 
-from .settings import SETTINGS
-from .snap import snap_window
+from . import config
+from . import profile_cache
+from .capture import RecordCapture
+from .metrics import METRICS
+from .monitor_table import MonitorTable, get_randr_event_codes
+from .overlay import DeferredZoneDisplay
+from .roundtrips import ROUND_TRIPS
+from .scheduler import DebounceScheduler
+from .settings import RENDER_FIELDS, SETTINGS, ZONE_FIELDS, SettingsSnapshot
+from .snap import SnapExecutor, find_snap_zone
+from .startup import STARTUP
+from .types import MergeZone, Zone
+from . import xq
 from .xewmh import XEWMH
-from .zone_display import setup_zone_display
 from .zone_profile import ZoneProfile
+from .zone_table import EMPTY_ZONE_TABLE, ZoneTable
 
 
 class FatalXQueryFailure(Exception):
     pass
 
 
+EVENT_DECODE_TIME = METRICS.histogram("event_decode")
+PROCESS_EVENT_TIME = METRICS.histogram("process_event")
+SNAP_LATENCY = METRICS.histogram("snap_latency")  # ButtonRelease to setMoveResizeWindow sent
+SNAP_QUEUE_DELAY = METRICS.histogram("snap_queue_delay")
+ZONE_REFRESH_TIME = METRICS.histogram("zone_refresh")
+EVENTS = METRICS.labeled_counter("events")
+COALESCED_EVENTS = METRICS.counter("coalesced_events")
+SNAPS = METRICS.labeled_counter("snaps")
+
+REFRESH_DELAY = 0.2  # seconds, of quiet before the desktop, work areas or monitors are queried
+PROFILE_CACHE_DELAY = 1.0  # seconds, before a published profile is written to the cache
+PROFILE_CACHE_MAX_WAIT = 5.0
+
+
+def record_snap_result(result):
+    SNAP_LATENCY.record(result.latency)
+    SNAP_QUEUE_DELAY.record(result.queue_delay)
+    SNAPS.increment("succeeded" if result.succeeded else "failed")
+
+
 def get_zone_profile(ewmh):
     # In modern X11, a "monitor" (crtc) is not generally a separate unit in the
     # X11 Screen that is being used, so multiple monitors simply take up rectangular
@@ -27,10 +58,8 @@ def get_zone_profile(ewmh):
     # That said, while X11 doesn't care, the zoning of work areas does, so this
     # information will be passed along later to appropriately slice out zones of the
     # big Screen rectangle
-    monitors = ewmh.getMonitors()
+    monitors, work_areas, _ = ewmh.discoverLayout()
     logging.debug(f"{monitors=}")
-
-    work_areas = ewmh.getWorkAreasForAllVirtualDesktops()
     logging.debug(f"for all desktops:\n{work_areas=}")
 
     if not work_areas:
@@ -43,38 +72,233 @@ def get_zone_profile(ewmh):
     return ZoneProfile.get_zones_per_virtual_desktop(monitors, work_areas)
 
 
+def get_current_desktop(ewmh) -> int:
+    # _NET_CURRENT_DESKTOP isn't strictly required, without it everything is
+    # treated as the first desktop
+    try:
+        return ewmh.getCurrentDesktop() or 0
+    except TypeError:
+        return 0
+
+
+def coalesce_motion_events(events: list) -> list:
+    # Only the latest position of a run of MotionNotify events matters, any
+    # button or key transition in between is kept (and kept in order) since
+    # it breaks the run
+    coalesced = []
+    for event in events:
+        if event.type == X.MotionNotify and coalesced and coalesced[-1].type == X.MotionNotify:
+            coalesced[-1] = event
+        else:
+            coalesced.append(event)
+    return coalesced
+
+
 class Service:
-    def __init__(self) -> None:
+    def __init__(self, ewmh=None, zone_profile=None, zone_window=None, snap_executor=None, scheduler=None) -> None:
+        # Everything X facing can be passed in instead, which is how recorded
+        # traces are replayed without an X server (see trace.py), a Service
+        # built that way doesn't watch the root window or touch the profile cache
+        if ewmh is not None:
+            self.ewmh = ewmh
+            self.zone_state_lock = threading.Lock()
+            self.zone_state = Service.ZoneState(zone_profile, get_current_desktop(self.ewmh))
+            self.zone_window = zone_window
+            self.snap_executor = snap_executor
+            self.scheduler = scheduler
+            self.setup_monitor_state()
+            self.setup_event_state()
+            return
+
+        STARTUP.mark("imports")
+
         self.ewmh = XEWMH()
+        self.ewmh.preloadAtoms()
 
         if not self.ewmh.display.has_extension("RANDR"):
             raise FatalXQueryFailure("X server does not have the required RANDR extension")
 
         if not self.ewmh.display.has_extension("RECORD"):
             raise FatalXQueryFailure("X server does not have the required RECORD extension")
-
-        self.zone_profile = get_zone_profile(self.ewmh)
-        self.current_virtual_desktop = self.ewmh.getShowingDesktop()
-
-        logging.debug(f"  setup_zone_display():")
-        logging.debug(f"\t{self.current_virtual_desktop=}")
-        logging.debug(f"\t{self.zone_profile.zones[self.current_virtual_desktop]=}")
-
+        STARTUP.mark("X connect")
+
+        # A cached profile from a previous run (built from the same configuration)
+        # is served right away, and checked against the actual layout once the
+        # daemon is up, see validate_cached_zone_profile()
+        current_virtual_desktop = get_current_desktop(self.ewmh)
+        cached = profile_cache.load()
+        if cached and current_virtual_desktop < len(cached[1].tables):
+            cached_layout_fingerprint, zone_profile = cached
+        else:
+            cached_layout_fingerprint, zone_profile = None, get_zone_profile(self.ewmh)
+            profile_cache.save(zone_profile)
+        self.zone_state_lock = threading.Lock()
+        self.zone_state = Service.ZoneState(zone_profile, current_virtual_desktop)
+        STARTUP.mark("discovery")
+
+        logging.debug(f"  DeferredZoneDisplay():")
+        logging.debug(f"\t{current_virtual_desktop=}")
+        logging.debug(f"\t{self.zone_state.zone_table.zones=}")
+
+        # GTK is only loaded and the overlay only built once RECORD is live, see
+        # on_record_ready()
         geometry = self.ewmh.root.get_geometry()
-        self.zone_window = setup_zone_display(
+        self.zone_window = DeferredZoneDisplay(
             geometry.width, geometry.height,
-            self.zone_profile.zones[self.current_virtual_desktop]
+            self.zone_state.zone_table.zones,
+            zone_profile.monitors
         )
+        self.zone_window.prerender(zone_profile.zones)
+        self.snap_executor = SnapExecutor()
+        self.snap_executor.add_completion_callback(record_snap_result)
+        self.scheduler = DebounceScheduler()
+        self.setup_monitor_state()
+        self.setup_event_state()
+
+        self.setup_property_change_monitor()
+        if cached_layout_fingerprint:
+            self.setup_cached_zone_profile_validation(cached_layout_fingerprint)
+
+
+    @dataclass(frozen=True)
+    class ZoneState:
+        # Everything the event path needs to resolve a zone, published as a whole
+        # so that a single load of Service.zone_state gives a consistent view,
+        # without locking, whatever the property monitor is doing meanwhile
+        zone_profile:    ZoneProfile
+        current_desktop: int
+
+        @property
+        def known_desktop(self) -> bool:
+            # The current desktop can be ahead of the profile (a desktop added
+            # since the last refresh), it has no zones until then
+            return self.current_desktop < len(self.zone_profile.tables)
+
+        @property
+        def zone_table(self) -> ZoneTable:
+            return self.zone_profile.tables[self.current_desktop] if self.known_desktop else EMPTY_ZONE_TABLE
+
+        def find_zone(self, x, y) -> MergeZone | Zone | None:
+            return self.zone_profile.find_zone(self.current_desktop, x, y)
+
+
+    # Read-only views of the current zone state, for anything off the event path
+    @property
+    def zone_profile(self) -> ZoneProfile:
+        return self.zone_state.zone_profile
+
+    @property
+    def current_virtual_desktop(self) -> int:
+        return self.zone_state.current_desktop
+
+
+    def setup_monitor_state(self):
+        # Set up by the property monitor once it watches RandR events, until then
+        # (and without RandR events) refreshes query the whole layout
+        self.monitor_table = None
+        self.monitor_events_supported = False
+
 
+    def setup_event_state(self):
         self.active_window = None
+        self.drag_session = None
         self.mouse_button_down = False
         self.last_active_window_position = None
         self.active_window_has_moved = False
         self.zones_shown = False
-        self.active_keys = { XK.string_to_keysym(key): False for key in SETTINGS.keybindings }
+        self.active_keys = { XK.string_to_keysym(key): False for key in SETTINGS.snapshot.keybindings }
         self.active_keys_down = False # effectively a cache of all(self.active_keys.values())
+        self.capture = None
+        self.ready_callback = None
+        self.trace_writer = None
 
-        self.setup_property_change_monitor()
+
+    def setup_cached_zone_profile_validation(self, cached_layout_fingerprint: bytes):
+        thread = threading.Thread(target=self.validate_cached_zone_profile, args=(cached_layout_fingerprint,))
+        thread.daemon=True
+        thread.start()
+
+    def validate_cached_zone_profile(self, cached_layout_fingerprint: bytes):
+        ewmh = XEWMH()
+        ewmh.preloadAtoms()
+        monitors, work_areas, _ = ewmh.discoverLayout()
+        if profile_cache.get_layout_fingerprint(monitors, work_areas) == cached_layout_fingerprint:
+            logging.debug("Cached zone profile matches the current layout")
+            return
+
+        logging.info("Cached zone profile is out of date, rebuilding zones")
+        self.update_zone_profile(lambda zone_profile: self.get_zone_profile_for_layout(zone_profile, monitors, work_areas))
+
+
+    def reload_settings(self) -> set[str]:
+        # Settings are validated, and new zones built from them, before anything
+        # is swapped, so a broken configuration (including zones which can't be
+        # built for the current monitors) raises and leaves the running one as it was
+        config_file = config.get_config_file_path(config.SETTINGS_FILE)
+        if config_file is None:
+            user_configuration = {}
+        else:
+            with config_file.open() as file:
+                user_configuration = json.load(file)
+        settings = SETTINGS.prepare(user_configuration)
+
+        # Settings and zones are swapped together, and nothing else publishes
+        # zones in between
+        with self.zone_state_lock:
+            previous = SETTINGS.snapshot
+            zone_profile = None
+            if settings.get_changed_fields(previous) & ZONE_FIELDS:
+                # Monitors whose zone specification didn't change keep their zones
+                current = self.zone_state.zone_profile
+                zone_profile = ZoneProfile.get_zones_per_virtual_desktop(
+                    current.monitors, current.work_areas, current.monitor_zones, settings
+                )
+
+            SETTINGS.publish(user_configuration, settings)
+            return self.apply_settings(previous, zone_profile)
+
+    def apply_settings(self, previous: SettingsSnapshot, zone_profile: ZoneProfile | None) -> set[str]:
+        # Only what depends on the settings which actually changed is redone,
+        # the RECORD context and the overlay windows are kept either way
+        #
+        # Called with the zone state lock held, zone_profile is the profile built
+        # from the new settings if any of ZONE_FIELDS changed
+        settings = SETTINGS.snapshot
+        changed = settings.get_changed_fields(previous)
+        logging.info(f"Settings changed: {sorted(changed)}")
+
+        if 'keybindings' in changed:
+            self.active_keys = { XK.string_to_keysym(key): False for key in settings.keybindings }
+            self.active_keys_down = False
+
+        if 'overlay_mode' in changed:
+            logging.warning("Changes to overlay_mode only take effect after a restart")
+
+        if changed & RENDER_FIELDS:
+            self.zone_window.set_settings(settings)
+
+        if zone_profile is not None:
+            self.publish_zone_profile(zone_profile)
+
+        return changed
+
+    def recompute_zones(self):
+        # Everything from scratch, as at startup
+        ewmh = XEWMH()
+        ewmh.preloadAtoms()
+        monitors, work_areas, _ = ewmh.discoverLayout()
+
+        def update(zone_profile):
+            if monitors != zone_profile.monitors:
+                self.zone_window.set_monitors(monitors)
+            return ZoneProfile.get_zones_per_virtual_desktop(monitors, work_areas)
+        self.update_zone_profile(update)
+
+    def get_zone_profile_for_layout(self, zone_profile: ZoneProfile, monitors, work_areas) -> ZoneProfile:
+        # Overlay windows are swapped before the zones of the new layout reach them
+        if monitors != zone_profile.monitors:
+            self.zone_window.set_monitors(monitors)
+        return zone_profile.with_layout(monitors, work_areas)
 
 
     def setup_property_change_monitor(self):
@@ -86,45 +310,51 @@ class Service:
         local = threading.local()
         local.ewmh = XEWMH()
 
-        """
-        This below enables monitoring of xrandr events around display status
-        (added, disconnected, on/off, etc.). It's quite useful, but the updates
-        provided by X.PropertyNotify seem sufficient for now.
-
-        Leaving in as a reference.
-
-        from Xlib.ext import randr
-        randr.select_input(local.ewmh.root,
-            randr.RRScreenChangeNotifyMask | randr.RRCrtcChangeNotifyMask |
-            randr.RROutputChangeNotifyMask | randr.RROutputPropertyNotifyMask
+        # RandR events keep a live table of monitors (added, disconnected, on/off,
+        # moved, etc.), so monitor changes don't need a full query of every output
+        # and crtc, and only monitors which actually changed get new zones
+        local.ewmh.root.xrandr_select_input(
+            randr.RRScreenChangeNotifyMask | randr.RRCrtcChangeNotifyMask | randr.RROutputChangeNotifyMask
         )
-        """
+        self.monitor_table = monitor_table = MonitorTable(*xq.get_monitors_and_modes(local.ewmh.display, local.ewmh.root))
+
+        # python-xlib only registers the RandR events for RandR 1.5+ servers,
+        # without them monitor changes are only noticed through _NET_WORKAREA
+        randr_event_codes = get_randr_event_codes(local.ewmh.display)
+        self.monitor_events_supported = bool(randr_event_codes)
+        if not self.monitor_events_supported:
+            logging.info("RandR events unavailable, monitors are queried on work area changes")
         local.ewmh.root.change_attributes(event_mask=X.PropertyChangeMask)
 
-        update_desktop_timer = None
-        zone_refresh_timer = None
+        # Root PropertyNotify traffic is heavy on a busy desktop, so events are
+        # dispatched on preloaded atoms instead of resolving every atom name
+        local.ewmh.preloadAtoms()
+        current_desktop_atom = local.ewmh.getAtom('_NET_CURRENT_DESKTOP')
+        number_of_desktops_atom = local.ewmh.getAtom('_NET_NUMBER_OF_DESKTOPS')
+
+        # Maps each work area atom to the desktop it belongs to, _NET_WORKAREA
+        # covers all desktops (None)
+        def get_work_area_atoms():
+            work_area_atoms = { local.ewmh.getAtom('_NET_WORKAREA'): None }
+            for name, atom in local.ewmh.atoms.items():
+                for prefix in ('_GTK_WORKAREAS_D', '_NET_WORKAREAS_D'):
+                    if name.startswith(prefix):
+                        work_area_atoms[atom] = int(name[len(prefix):])
+            return work_area_atoms
+        work_area_atoms = get_work_area_atoms()
 
         logging.debug("Beginning X.PropertyChanged event monitor")
 
-        # These operations should be thread-safe atomic assigments, and no other
-        # threads will likely be writing at this same moment
-        #
-        # Given that, hopefully it's unlikely there will be any race conditions
-        # arising from this that will require the addition of locking
-        def virtual_desktop_updater_task():
-            self.current_virtual_desktop = XEWMH().getShowingDesktop()
-            self.zone_window.set_zones(self.zone_profile.zones[self.current_virtual_desktop])
-            GLib.idle_add(self.zone_window.reset_position)
-
-        def zone_refresh_task():
-            self.zone_profile = get_zone_profile(XEWMH())
-            self.zone_window.set_zones(self.zone_profile.zones[self.current_virtual_desktop])
-            GLib.idle_add(self.zone_window.reset_position)
-
-
         while True:
             event = local.ewmh.display.next_event()
 
+            changed = monitor_table.apply_event(event, randr_event_codes)
+            if changed is not None:
+                if changed:
+                    logging.debug(f"Monitors changed, scheduling task to update monitors and zones")
+                    self.scheduler.schedule("monitors", REFRESH_DELAY, self.refresh_monitors)
+                continue
+
             if event.type != X.PropertyNotify:
                 continue
 
@@ -138,22 +368,152 @@ class Service:
                 
                 _NET_WORKAREA triggered after _GTK_WORKAREAS_D#
 
+                _NET_NUMBER_OF_DESKTOPS means there are new _GTK_WORKAREAS_D# atoms to watch
+
             """
-            event_name = local.ewmh.display.get_atom_name(event.atom)
+            if event.atom == number_of_desktops_atom:
+                local.ewmh.preloadAtoms()
+                work_area_atoms = get_work_area_atoms()
 
-            if event_name == '_NET_CURRENT_DESKTOP':
-                if update_desktop_timer and update_desktop_timer.is_alive():
-                    update_desktop_timer.cancel()
+            if event.atom == current_desktop_atom:
                 logging.debug(f"Virtual desktop changed, scheduling task to update state")
-                update_desktop_timer = threading.Timer(0.2, virtual_desktop_updater_task)
-                update_desktop_timer.start()
+                self.scheduler.schedule("desktop", REFRESH_DELAY, self.refresh_current_desktop)
+
+            if event.atom in work_area_atoms:
+                desktop = work_area_atoms[event.atom]
+                logging.debug(f"Work areas changed ({desktop=}), scheduling task to update known work areas and zones")
+                self.schedule_work_area_refresh(desktop, work_area_atoms.values())
+            elif event.atom == number_of_desktops_atom:
+                logging.debug(f"Number of desktops changed, scheduling task to update known work areas and zones")
+                self.schedule_zone_refresh(None)
+
+
+    # The refresh tasks below run one at a time on the scheduler thread, but
+    # other threads (control, cache validation, settings reloads) publish zone
+    # state as well, so every change is derived and published under the zone
+    # state lock, see update_zone_profile()
+    def schedule_zone_refresh(self, desktop: int | None):
+        # Keyed per desktop (None for all desktops), so a burst on one desktop
+        # doesn't hold back the refresh of another, a pending refresh of all
+        # desktops covers any single one
+        if self.scheduler is None:
+            return
+        if desktop is not None and self.scheduler.is_pending(("zones", None)):
+            return
+        self.scheduler.schedule(("zones", desktop), REFRESH_DELAY, self.refresh_zones, desktop)
+
+    def schedule_work_area_refresh(self, desktop: int | None, desktops):
+        # desktops are those of every watched work area atom, None for _NET_WORKAREA,
+        # which WMs set along with each _GTK_WORKAREAS_D# change
+        per_desktop = [d for d in desktops if d is not None]
+        if desktop is not None:
+            self.schedule_zone_refresh(desktop)
+        elif per_desktop and self.monitor_events_supported:
+            # Monitors are kept current by RandR events, so the per-desktop
+            # refreshes already queued for this change cover it
+            logging.debug("_NET_WORKAREA changed, left to the per-desktop refreshes")
+        elif self.scheduler is not None:
+            # Monitors are only noticed by querying the whole layout, which makes
+            # the per-desktop refreshes queued before it redundant
+            for d in per_desktop:
+                self.scheduler.cancel(("zones", d))
+            self.schedule_zone_refresh(None)
+
+    def refresh_current_desktop(self):
+        self.set_current_desktop(get_current_desktop(XEWMH()))
+
+    def refresh_zones(self, desktop: int | None):
+        start = time.perf_counter()
+        ewmh = XEWMH()
+        ewmh.preloadAtoms()
+        if desktop is not None:
+            work_areas = ewmh.getWorkAreasForVirtualDesktop(desktop)
+            update = lambda zone_profile: zone_profile.with_work_areas({ desktop: work_areas })
+        else:
+            if self.monitor_events_supported:
+                # Monitors are already kept current by RandR events, so only the
+                # work areas are queried, and only desktops which changed are rebuilt
+                monitors, work_areas = self.monitor_table.get_monitors(), ewmh.getWorkAreasForAllVirtualDesktops()
+            else:
+                monitors, work_areas, _ = ewmh.discoverLayout()
+            update = lambda zone_profile: self.get_zone_profile_for_layout(zone_profile, monitors, work_areas)
+        self.update_zone_profile(update)
+        ZONE_REFRESH_TIME.record(time.perf_counter() - start)
+
+    def refresh_monitors(self):
+        start = time.perf_counter()
+        ewmh = XEWMH()
+        ewmh.preloadAtoms()
+        if self.monitor_table.stale:
+            self.monitor_table.rescan(ewmh)
+
+        monitors = self.monitor_table.get_monitors()
+        if monitors == self.zone_profile.monitors:
+            logging.debug("Monitor layout unchanged")
+            return
+
+        logging.info(f"Monitor layout changed: {monitors=}")
+        work_areas = ewmh.getWorkAreasForAllVirtualDesktops()
+        self.update_zone_profile(lambda zone_profile: self.get_zone_profile_for_layout(zone_profile, monitors, work_areas))
+        ZONE_REFRESH_TIME.record(time.perf_counter() - start)
+
+    def set_current_desktop(self, desktop: int):
+        # Writers are serialized (see update_zone_profile) so that the overlay is
+        # told about states in the order they were published
+        with self.zone_state_lock:
+            state = self.zone_state = Service.ZoneState(self.zone_state.zone_profile, desktop)
+            self.check_known_desktop(state)
+            self.zone_window.set_zones(state.zone_table.zones)
+            self.zone_window.reset_position()
+
+    def check_known_desktop(self, state: 'Service.ZoneState'):
+        # A desktop the profile has no zones for is published as such (no zones
+        # are found on it) rather than failing every lookup, until a refresh of
+        # every desktop's work areas catches up with it
+        if not state.known_desktop:
+            logging.warning(f"No zones known for desktop {state.current_desktop}, refreshing work areas")
+            self.schedule_zone_refresh(None)
+
+    def update_zone_profile(self, update) -> ZoneProfile | None:
+        # update(current zone profile) returns the profile replacing it (or None to
+        # keep it), and runs with the zone state lock held, so a profile is always
+        # derived from the one it replaces, whichever thread (refresh tasks, control
+        # socket, cache validation) got there first
+        #
+        # X should be queried before, only building zones and telling the overlay
+        # about them belongs in update
+        with self.zone_state_lock:
+            zone_profile = update(self.zone_state.zone_profile)
+            if zone_profile is not None:
+                self.publish_zone_profile(zone_profile)
+        return zone_profile
+
+    def publish_zone_profile(self, zone_profile: ZoneProfile):
+        # Called with the zone state lock held
+        previous = self.zone_state
+        state = self.zone_state = Service.ZoneState(zone_profile, previous.current_desktop)
+        self.check_known_desktop(state)
+
+        # Layers of unchanged desktops are kept by prerender(), and the overlay
+        # is only reset when the zones of the current desktop actually changed
+        self.zone_window.prerender(zone_profile.zones)
+        if previous.zone_table is not state.zone_table:
+            self.zone_window.set_zones(state.zone_table.zones)
+            self.zone_window.reset_position()
+
+        self.schedule_profile_cache_save()
+
+    def schedule_profile_cache_save(self):
+        # Written once a burst of updates has settled, from the scheduler thread
+        # rather than with the zone state lock held
+        if self.scheduler is not None:
+            self.scheduler.schedule(
+                "profile_cache", PROFILE_CACHE_DELAY, self.save_profile_cache, max_wait=PROFILE_CACHE_MAX_WAIT
+            )
 
-            if event_name.startswith('_GTK_WORKAREAS_D') or event_name.startswith('_NET_WORKAREAS_D') or event_name == '_NET_WORKAREA':
-                if zone_refresh_timer and zone_refresh_timer.is_alive():
-                    zone_refresh_timer.cancel()
-                logging.debug(f"Work areas changed, scheduling task to update known work areas and zones")
-                zone_refresh_timer = threading.Timer(0.2, zone_refresh_task)
-                zone_refresh_timer.start()
+    def save_profile_cache(self):
+        # Whatever profile is current by then, so the last one published wins
+        profile_cache.save(self.zone_state.zone_profile)
 
 
     @dataclass(frozen=True)
@@ -164,6 +524,20 @@ class Service:
         extents:     list[int] | None       = None
 
 
+    @dataclass(frozen=True)
+    class DragSession:
+        # Everything known about the dragged window, captured once at ButtonPress
+        # so that nothing during the drag itself has to go back to the X server
+        window_state: 'Service.WindowState'
+        cursor:       tuple[int, int]
+        offset:       tuple[int, int]  # window basis point relative to the cursor
+
+        def get_window_basis_point(self, root_x: int, root_y: int) -> tuple[int, int]:
+            # The WM moves the window along with the cursor, so the window basis
+            # point keeps the same offset from the cursor for the whole drag
+            return (root_x + self.offset[0], root_y + self.offset[1])
+
+
     def get_window_state(self, window: Window) -> WindowState:
         if not window:
             return Service.WindowState()
@@ -181,34 +555,59 @@ class Service:
         return (coordinates[0] + int((el + er + geometry.width) / 2), coordinates[1])
 
 
-    def on_mousebutton_down(self, event_window: Window, basis_point: tuple[int, int]):
+    def start_drag_session(self, root_x: int, root_y: int) -> DragSession:
+        # These are the only X round trips made for the duration of a drag
+        window_state = self.get_window_state(self.ewmh.getActiveWindow())
+
+        offset = (0, 0)
+        if window_state.window:
+            window_x, window_y = self.get_window_basis_point(
+                window_state.geometry, window_state.coordinates, window_state.extents
+            )
+            offset = (window_x - root_x, window_y - root_y)
+
+        return Service.DragSession(window_state=window_state, cursor=(root_x, root_y), offset=offset)
+
+
+    def get_basis_point(self, event, settings: SettingsSnapshot) -> tuple[int, int]:
+        if settings.snap_basis_point == 'window' and self.drag_session and self.drag_session.window_state.window:
+            return self.drag_session.get_window_basis_point(event.root_x, event.root_y)
+        return (event.root_x, event.root_y)
+
+
+    def on_mousebutton_down(self, drag_session: DragSession, basis_point: tuple[int, int]):
         # TODO: Don't need mouse_button_down since active_window acts as such a signal (and more)?
         self.mouse_button_down = True
-        self.active_window = event_window.window
+        self.active_window = drag_session.window_state.window
         self.last_active_window_position = basis_point
+        self.zone_window.track_point(*basis_point)
 
 
-    def on_mouse_move(self, event_window: Window, basis_point: tuple[int, int]):
+    def on_mouse_move(self, basis_point: tuple[int, int], settings: SettingsSnapshot):
         if self.last_active_window_position != basis_point:
             self.last_active_window_position = basis_point
             self.active_window_has_moved = True
+            self.zone_window.track_point(*basis_point)
 
-            if SETTINGS.highlight_hover_zone:
-                hover_zone = self.zone_profile.find_zone(self.current_virtual_desktop, *basis_point)
-                self.zone_window.set_hover_zone(hover_zone)
-                GLib.idle_add(self.zone_window.queue_draw)
+            if settings.highlight_hover_zone:
+                hover_zone = self.zone_state.find_zone(*basis_point)
+                self.zone_window.update_hover_zone(hover_zone)
 
 
-    def on_mousebutton_up(self, event_window: Window, basis_point: tuple[int, int]):
+    def on_mousebutton_up(self, basis_point: tuple[int, int], settings: SettingsSnapshot):
         self.mouse_button_down = False
-        if self.active_keys_down and not (SETTINGS.wait_for_window_movement and not self.active_window_has_moved):
-            snap_window(self, self.active_window, *basis_point)
+        if self.active_keys_down and not (settings.wait_for_window_movement and not self.active_window_has_moved):
+            zone_state = self.zone_state
+            zone = find_snap_zone(zone_state.zone_profile, zone_state.current_desktop, *basis_point)
+            if self.active_window and zone:
+                self.snap_executor.submit(self.active_window, zone, settings)
         self.active_window = None
         self.active_window_has_moved = False
         self.last_active_window_position = None
+        self.drag_session = None
 
-        if SETTINGS.highlight_hover_zone:
-            self.zone_window.set_hover_zone(None)
+        if settings.highlight_hover_zone:
+            self.zone_window.update_hover_zone(None)
 
 
     def on_key_updown(self, event):
@@ -221,76 +620,109 @@ class Service:
     def process_event(self, event):
         # TODO: if Escape is pressed, cancel snapping
 
-        # Getting the window state is not particularly expensive, but is also
-        # not an insigificant operation. A later optimization, if necessary,
-        # may be to change properties to be lazily instantiated and cached
-        # as this state is meant to only last for this single process_event()
-        # and not all fields may be needed
-        event_window = self.get_window_state(
-            self.active_window if self.active_window else self.ewmh.getActiveWindow()
-        )
+        # One snapshot for the whole event, so a configuration swap happening
+        # meanwhile can't be observed halfway through
+        settings = SETTINGS.snapshot
 
-        if SETTINGS.snap_basis_point == 'window' and self.active_window:
-            basis_point = self.get_window_basis_point(event_window.geometry, event_window.coordinates, event_window.extents)
-        else:
-            basis_point = (event.root_x, event.root_y)
+        # Window state is only queried from X when a drag begins, motion events
+        # during the drag are resolved entirely from the event and the session
+        if (event.type, event.detail) == (X.ButtonPress, X.Button1):
+            self.drag_session = self.start_drag_session(event.root_x, event.root_y)
+
+        basis_point = self.get_basis_point(event, settings)
 
 
         if (event.type, event.detail) == (X.ButtonPress, X.Button1):
-            self.on_mousebutton_down(event_window, basis_point)
+            self.on_mousebutton_down(self.drag_session, basis_point)
 
         if event.type == X.MotionNotify and self.active_window != None:
-            self.on_mouse_move(event_window, basis_point)
+            self.on_mouse_move(basis_point, settings)
 
         if (event.type, event.detail) == (X.ButtonRelease, X.Button1):
-            self.on_mousebutton_up(event_window, basis_point)
+            self.on_mousebutton_up(basis_point, settings)
 
         if event.type in (X.KeyPress, X.KeyRelease):
             self.on_key_updown(event)
 
 
         active_mode = self.mouse_button_down and self.active_keys_down
-        if SETTINGS.wait_for_window_movement and not self.active_window_has_moved:
+        if settings.wait_for_window_movement and not self.active_window_has_moved:
             active_mode = False
 
         if not self.zones_shown and active_mode:
-            GLib.idle_add(self.zone_window.show)
+            self.zone_window.show()
             self.zones_shown = True
         elif self.zones_shown and not active_mode:
-            GLib.idle_add(self.zone_window.hide)
+            self.zone_window.hide()
             self.zones_shown = False
 
 
-    def event_handler(self, reply):
-        data = reply.data
-
+    def decode_events(self, data) -> list:
+        events = []
         while len(data):
             event, data = rq.EventField(None).parse_binary_value(
                 data, self.ewmh.display.display, None, None
             )
-            self.process_event(event)
-
-
-    def listen(self):
-        # Not sure why this needs its own Display but display-referencing behavior
-        # becomes somewhat unpredictable without it
-        self.record_display = Display()
-        self.context = self.record_display.record_create_context(
-            0,
-            [record.AllClients],
-            [
-                {
-                    "core_requests": (0, 0),
-                    "core_replies": (0, 0),
-                    "ext_requests": (0, 0, 0, 0),
-                    "ext_replies": (0, 0, 0, 0),
-                    "delivered_events": (0, 0),
-                    "device_events": (X.KeyReleaseMask, X.ButtonReleaseMask),
-                    "errors": (0, 0),
-                    "client_started": False,
-                    "client_died": False,
-                }
-            ],
-        )
-        self.record_display.record_enable_context(self.context, self.event_handler)
-        self.record_display.record_free_context(self.context)
+            events.append(event)
+        return events
+
+
+    def event_handler(self, reply):
+        if reply.category == record.StartOfData:
+            self.on_record_ready()
+            return
+
+        # Anything else (client started/died, end of data) carries no events
+        if reply.category != record.FromServer:
+            return
+
+        if self.trace_writer:
+            self.trace_writer.write(reply.data)
+
+        # A single reply can carry a burst of events under fast mouse movement,
+        # so decode all of it first and only dispatch what is still relevant
+        start = time.perf_counter()
+        events = self.decode_events(reply.data)
+        EVENT_DECODE_TIME.record(time.perf_counter() - start)
+
+        coalesced = coalesce_motion_events(events)
+        COALESCED_EVENTS.increment(len(events) - len(coalesced))
+        for event in coalesced:
+            EVENTS.increment(event.__class__.__name__)
+            start = time.perf_counter()
+            if ROUND_TRIPS.enabled:
+                with ROUND_TRIPS.scope(event.__class__.__name__):
+                    self.process_event(event)
+            else:
+                self.process_event(event)
+            PROCESS_EVENT_TIME.record(time.perf_counter() - start)
+        self.update_record_capture()
+
+
+    def update_record_capture(self):
+        # Motion only matters once the activation chord is held or a drag has
+        # started, outside of that only key and button transitions are recorded
+        if self.capture:
+            self.capture.set_motion_capture(self.active_keys_down or self.mouse_button_down)
+
+
+    def on_record_ready(self):
+        # The first reply of an enabled context, from here on events are coming in
+        STARTUP.mark("RECORD enable")
+        STARTUP.report()
+        self.zone_window.prewarm()
+        if self.ready_callback:
+            self.ready_callback()
+
+
+    def listen(self, ready_callback=None, trace_file=None):
+        self.ready_callback = ready_callback
+        if trace_file:
+            from .trace import TraceWriter
+            zone_state = self.zone_state
+            self.trace_writer = TraceWriter(
+                trace_file, self.ewmh.display, zone_state.zone_profile, zone_state.current_desktop
+            )
+
+        self.capture = RecordCapture()
+        self.capture.enable(self.event_handler)
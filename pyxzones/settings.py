@@ -1,20 +1,212 @@
 import json
+import logging
 from pathlib import Path
 
+from . import layout
+
+
+class InvalidSettings(ValueError):
+    pass
+
+
+def validate_zones(value):
+    if not isinstance(value, dict) or not isinstance(value.get('displays'), list):
+        raise InvalidSettings("expected an object with a list of 'displays'")
+    for index, display in enumerate(value['displays']):
+        if not isinstance(display, dict):
+            raise InvalidSettings("expected each display to be an object")
+        if layout.is_layout_spec(display):
+            try:
+                layout.validate_layout_spec(display)
+            except layout.LayoutError as exception:
+                raise InvalidSettings(f"display {index}: {exception}")
+        else:
+            validate_legacy_display(display, index)
+    return value
+
+
+def validate_legacy_display(display: dict, index: int):
+    # A single row of "columns" (landscape) or column of "rows" (portrait)
+    sizes_key = { 'landscape': 'columns', 'portrait': 'rows' }.get(display.get('orientation'))
+    if sizes_key is None:
+        raise InvalidSettings(f"display {index}: expected an 'orientation' of 'landscape' or 'portrait', or a 'layout'")
+    sizes = display.get(sizes_key)
+    if not isinstance(sizes, list) or not sizes or not all(layout.is_number(size) and size > 0 for size in sizes):
+        raise InvalidSettings(f"display {index}: expected '{sizes_key}' to be a non-empty list of positive sizes")
+
+
+def validate_keybindings(value):
+    if not isinstance(value, list) or not all(isinstance(key, str) for key in value):
+        raise InvalidSettings("expected a list of key names")
+    return tuple(value)
+
+
+def validate_bool(value):
+    if not isinstance(value, bool):
+        raise InvalidSettings("expected true or false")
+    return value
+
+
+def validate_number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise InvalidSettings("expected a number")
+    return value
+
+
+def validate_color(value):
+    if not isinstance(value, (list, tuple)) or len(value) != 4:
+        raise InvalidSettings("expected a color of [r, g, b, a]")
+    return tuple(float(validate_number(channel)) for channel in value)
+
+
+def validate_snap_basis_point(value):
+    if value not in ('cursor', 'window'):
+        raise InvalidSettings("expected 'cursor' or 'window'")
+    return value
+
+
+def validate_overlay_mode(value):
+    if value not in ('screen', 'monitor'):
+        raise InvalidSettings("expected 'screen' or 'monitor'")
+    return value
+
+
+# Every setting with the validator that converts it to its snapshot type
+SETTINGS_FIELDS = {
+    'zones':                               validate_zones,
+    'keybindings':                         validate_keybindings,
+    'maximize_perpendicular_axis_on_snap': validate_bool,
+    'wait_for_window_movement':            validate_bool,
+    'snap_basis_point':                    validate_snap_basis_point,
+    'zone_border_inset':                   validate_number,
+    'zone_border_color':                   validate_color,
+    'zone_border_thickness':               validate_number,
+    'zone_background_color':               validate_color,
+    'zone_background_inset':               validate_number,
+    'highlight_hover_zone':                validate_bool,
+    'hover_zone_border_inset':             validate_number,
+    'hover_zone_border_color':             validate_color,
+    'hover_zone_border_thickness':         validate_number,
+    'hover_zone_background_color':         validate_color,
+    'hover_zone_background_inset':         validate_number,
+    'merge_zone_size_preference':          validate_number,
+    'overlay_mode':                        validate_overlay_mode,
+}
+
+
+# Settings the zones are derived from, see ZoneProfile
+ZONE_FIELDS = frozenset({ 'zones', 'merge_zone_size_preference' })
+
+# Settings which only change how the overlay is drawn (see ZoneDisplayWindow.set_settings)
+RENDER_FIELDS = frozenset({
+    'zone_border_inset',
+    'zone_border_color',
+    'zone_border_thickness',
+    'zone_background_color',
+    'zone_background_inset',
+    'highlight_hover_zone',
+    'hover_zone_border_inset',
+    'hover_zone_border_color',
+    'hover_zone_border_thickness',
+    'hover_zone_background_color',
+    'hover_zone_background_inset',
+})
+
+
+class SettingsSnapshot:
+    # Validated and immutable configuration, read as plain slot attributes by
+    # the hot paths (event processing and drawing)
+    #
+    # A snapshot is never modified, configuration changes replace the whole
+    # snapshot so readers holding one always see a consistent configuration
+    __slots__ = tuple(SETTINGS_FIELDS)
+
+    zones:                               dict
+    keybindings:                         tuple[str, ...]
+    maximize_perpendicular_axis_on_snap: bool
+    wait_for_window_movement:            bool
+    snap_basis_point:                    str
+    zone_border_inset:                   int
+    zone_border_color:                   tuple[float, float, float, float]
+    zone_border_thickness:               int
+    zone_background_color:               tuple[float, float, float, float]
+    zone_background_inset:               int
+    highlight_hover_zone:                bool
+    hover_zone_border_inset:             int
+    hover_zone_border_color:             tuple[float, float, float, float]
+    hover_zone_border_thickness:         int
+    hover_zone_background_color:         tuple[float, float, float, float]
+    hover_zone_background_inset:         int
+    merge_zone_size_preference:          float
+    overlay_mode:                        str
+
+    def __init__(self, configuration: dict):
+        for name, validate in SETTINGS_FIELDS.items():
+            try:
+                object.__setattr__(self, name, validate(configuration[name]))
+            except InvalidSettings as exception:
+                raise InvalidSettings(f"Invalid value for setting '{name}': {exception}")
+
+    def get_changed_fields(self, other: 'SettingsSnapshot') -> set[str]:
+        return { name for name in SETTINGS_FIELDS if getattr(self, name) != getattr(other, name) }
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+
+# Set on Settings instances rather than the class
+INSTANCE_ATTRIBUTES = frozenset({ 'user_configuration', 'snapshot' })
+
+
 class Settings:
 
     def __init__(self):
         self.user_configuration = None
+        self.snapshot = self.compile(None)
 
-    # This lookup mechanism is not particularly slow, but frequently accessed
-    # fields could be cached by the accessor if concerned
+    # This lookup mechanism is not particularly slow, but it isn't meant for hot
+    # paths either, those should read from a SettingsSnapshot (see `snapshot`)
     def __getattribute__(self, name):
         if name != 'user_configuration' and self.user_configuration and name in self.user_configuration:
             return self.user_configuration[name]
         return super().__getattribute__(name)
 
+    def compile(self, user_configuration: dict | None) -> SettingsSnapshot:
+        # Defaults are read from the class properties directly, bypassing the
+        # user configuration lookup of __getattribute__
+        configuration = { name: getattr(Settings, name).fget(self) for name in SETTINGS_FIELDS }
+
+        for name, value in (user_configuration or {}).items():
+            if name not in SETTINGS_FIELDS:
+                # Every name of the user configuration is looked up first (see
+                # __getattribute__), so these would replace the Settings API
+                if name in INSTANCE_ATTRIBUTES or hasattr(Settings, name):
+                    raise InvalidSettings(f"'{name}' is not a setting and can't be used as one")
+                logging.warning(f"Ignoring unknown setting '{name}'")
+                continue
+            configuration[name] = value
+
+        return SettingsSnapshot(configuration)
+
     def load_from_file(self, file: Path):
-        self.user_configuration = json.load(file)
+        self.load(json.load(file))
+
+    def load(self, user_configuration: dict):
+        self.publish(user_configuration, self.prepare(user_configuration))
+
+    def prepare(self, user_configuration: dict) -> SettingsSnapshot:
+        # Validates without replacing anything, see publish()
+        if not isinstance(user_configuration, dict):
+            raise InvalidSettings("Expected the configuration to be a json object")
+        return self.compile(user_configuration)
+
+    def publish(self, user_configuration: dict, snapshot: SettingsSnapshot):
+        # Swapped in one assignment, readers hold on to the snapshot they read
+        self.user_configuration = user_configuration
+        self.snapshot = snapshot
 
     @property
     def zones(self):
@@ -120,6 +312,15 @@ class Settings:
     def merge_zone_size_preference(self) -> float:
         return 7
 
+    @property
+    def overlay_mode(self) -> str:
+        # Valid values: 'screen' or 'monitor'
+        #
+        # 'screen': a single overlay window covering the whole X screen
+        # 'monitor': an overlay window per monitor, only shown for the monitor
+        #            the window is being dragged on
+        return 'screen'
+
 
 """
 
@@ -1,22 +1,32 @@
 import logging
-from Xlib.error import BadDrawable
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+from Xlib.error import BadDrawable, BadWindow
 
-from .settings import SETTINGS
-from .types import MergeZone
+from .metrics import METRICS
+from .roundtrips import ROUND_TRIPS
+from .settings import SettingsSnapshot
+from .types import MergeZone, Zone
+from .xewmh import XEWMH
 
 
-def snap_window(self, window, x, y):
-    logging.debug(f"  snap_window({x=}, {y=})")
-    try:
-        zone = self.zone_profile.find_zone(self.current_virtual_desktop, x, y)
+def find_snap_zone(zone_profile, virtual_desktop, x, y) -> Zone | None:
+    zone = zone_profile.find_zone(virtual_desktop, x, y)
+
+    if type(zone) is MergeZone:
+        zone = zone.surface
 
-        if type(zone) is MergeZone:
-            zone = zone.surface
+    logging.debug(f"  find_snap_zone({x=}, {y=})")
+    logging.debug(f"\tlanding zone: {zone}")
+    return zone
 
-        logging.debug(f"\tlanding zone: {zone}")
 
+def snap_window(ewmh, window, zone: Zone, settings: SettingsSnapshot) -> bool:
+    try:
         if window and zone:
-            extents = self.ewmh.getWindowFrameExtents(window)
+            extents = ewmh.getWindowFrameExtents(window)
             # Chrome, System Monitor, Software Manager, etc. don't have extents
             # seemingly because they manage/render their own title bars
             # (tabs, search field, etc.)
@@ -31,7 +41,7 @@ def snap_window(self, window, x, y):
             el, er, et, eb = extents
 
             # ewmh method is much more reliable than window.configure
-            self.ewmh.setMoveResizeWindow(
+            ewmh.setMoveResizeWindow(
                 window,
                 x=zone.x,
                 y=zone.y,
@@ -41,11 +51,11 @@ def snap_window(self, window, x, y):
 
             # these window hints provide better movement of windows rather than arbitrary dimensions
             # (without this, WM magic may cause windows to clip out of the usable work area)
-            if SETTINGS.maximize_perpendicular_axis_on_snap:
+            if settings.maximize_perpendicular_axis_on_snap:
                 if zone.orientation == 'landscape':
-                    self.ewmh.setWmState(window, 1, '_NET_WM_STATE_MAXIMIZED_VERT')
+                    ewmh.setWmState(window, 1, '_NET_WM_STATE_MAXIMIZED_VERT')
                 else:
-                    self.ewmh.setWmState(window, 1, '_NET_WM_STATE_MAXIMIZED_HORZ')
+                    ewmh.setWmState(window, 1, '_NET_WM_STATE_MAXIMIZED_HORZ')
 
             # Certain application windows, for example:
             #    https://github.com/linuxmint/sticky
@@ -70,7 +80,97 @@ def snap_window(self, window, x, y):
             # https://web.archive.org/web/20220520000107/https://elementaryos.stackexchange.com/questions/23972/gtk-3-22-migration-of-older-gtk-css-black-margin-on-elementaryos-apps
             # https://web.archive.org/web/20220817014757/https://unix.stackexchange.com/questions/168835/how-can-i-remove-the-window-padding-on-gtk3-apps-in-awesome-wm
 
-            self.ewmh.display.flush()
+            ewmh.display.flush()
+            return True
+
+    except (BadDrawable, BadWindow) as exception:
+        logging.debug(f"  snap_window failed with {type(exception).__name__}")
+
+    return False
+
+
+@dataclass(frozen=True)
+class SnapRequest:
+    window_id:    int
+    zone:         Zone
+    settings:     SettingsSnapshot
+    requested_at: float  # time.perf_counter() of the ButtonRelease
+
+
+@dataclass(frozen=True)
+class SnapResult:
+    request:      SnapRequest
+    started_at:   float
+    completed_at: float
+    succeeded:    bool
+
+    @property
+    def latency(self) -> float:
+        return self.completed_at - self.request.requested_at
+
+    @property
+    def queue_delay(self) -> float:
+        return self.started_at - self.request.requested_at
+
+
+class SnapExecutor:
+    # Runs snaps on a dedicated thread with its own X connection, so that the
+    # RECORD callback thread never blocks on requests to the window manager
+    # (blocking there leaves RECORD data queueing up in the X server)
+    #
+    # The queue holds a single request per window: a snap of a window still
+    # waiting when a newer one for the same window arrives is outdated anyway,
+    # so the latest request for each window wins, snaps of other windows run in
+    # the order they were submitted
+    def __init__(self, ewmh=None):
+        # ewmh is anything with the surface of XEWMH (see fakewm.py), only
+        # touched from the executor thread
+        if ewmh is None:
+            ewmh = XEWMH()
+            ewmh.preloadAtoms()
+        self.ewmh = ewmh
+
+        self.condition = threading.Condition()
+        self.pending: dict[int, SnapRequest] = {}  # window id -> request
+        self.dropped = 0
+        self.completion_callbacks: list[Callable[[SnapResult], None]] = []
+
+        thread = threading.Thread(target=self.run)
+        thread.daemon=True
+        thread.start()
+
+    def add_completion_callback(self, callback: Callable[[SnapResult], None]):
+        self.completion_callbacks.append(callback)
+
+    def submit(self, window, zone: Zone, settings: SettingsSnapshot):
+        request = SnapRequest(window.id, zone, settings, time.perf_counter())
+        with self.condition:
+            if self.pending.pop(request.window_id, None) is not None:
+                self.dropped += 1
+                METRICS.labeled_counter("snaps").increment("dropped")
+                logging.debug(f"Dropping outdated snap request for window {request.window_id}")
+            self.pending[request.window_id] = request
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                request = self.pending.pop(next(iter(self.pending)))
+
+            started_at = time.perf_counter()
+            window = self.ewmh.display.create_resource_object('window', request.window_id)
+            if ROUND_TRIPS.enabled:
+                with ROUND_TRIPS.scope("snap"):
+                    succeeded = snap_window(self.ewmh, window, request.zone, request.settings)
+            else:
+                succeeded = snap_window(self.ewmh, window, request.zone, request.settings)
+            result = SnapResult(request, started_at, time.perf_counter(), succeeded)
+            logging.debug(f"Snapped window {request.window_id} in {result.latency * 1000:.2f}ms")
 
-    except BadDrawable:
-        logging.debug("  snap_window failed with X.BadDrawable")
+            for callback in self.completion_callbacks:
+                try:
+                    callback(result)
+                except Exception as exception:
+                    logging.warning(f"Snap completion callback failed: {exception}")
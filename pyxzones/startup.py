@@ -0,0 +1,25 @@
+import logging
+import time
+
+
+class StartupTimer:
+    # Breakdown of where daemon startup time goes, each phase runs from the end
+    # of the previous one
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.phases = []
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self):
+        breakdown = ', '.join(f"{phase} {elapsed * 1000:.1f}ms" for phase, elapsed in self.phases)
+        logging.info(f"Started in {(self.last - self.start) * 1000:.1f}ms ({breakdown})")
+
+
+# Created on first import, which __main__ does before anything else, so the
+# "imports" phase covers (almost) everything imported by the daemon
+STARTUP = StartupTimer()
@@ -0,0 +1,263 @@
+import logging
+import struct
+import time
+from dataclasses import dataclass
+from Xlib.ext import record
+from Xlib.protocol import event
+
+from . import profile_cache
+from .types import Zone
+
+"""
+
+Capture and replay of the raw RECORD stream the service handles, so the event
+path (decode, coalescing and process_event) can be profiled without an X server
+
+A trace file holds what is needed to replay it without a display:
+
+    header     magic, version, current desktop
+    keymap     min keycode, count, then one keysym per keycode (first column)
+    profile    length, then the zone profile as written by profile_cache
+    records    timestamp (seconds since capture started), length, reply data
+
+"""
+
+MAGIC = b'PXZT'
+VERSION = 1
+
+HEADER = struct.Struct('<4sHI')
+KEYMAP = struct.Struct('<BI')
+KEYSYM = struct.Struct('<I')
+LENGTH = struct.Struct('<I')
+RECORD = struct.Struct('<dI')
+
+# Every replayed drag is of a window of this size, placed at the origin
+REPLAY_WINDOW_SIZE = (800, 600)
+
+
+class TraceWriter:
+    def __init__(self, path, display, zone_profile, current_desktop: int):
+        setup = display.display.info
+        min_keycode = setup.min_keycode
+        keysyms = [keysyms[0] for keysyms in display.get_keyboard_mapping(min_keycode, setup.max_keycode - min_keycode + 1)]
+        profile = profile_cache.encode(zone_profile)
+
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, current_desktop))
+        self.file.write(KEYMAP.pack(min_keycode, len(keysyms)))
+        self.file.write(b''.join(KEYSYM.pack(keysym) for keysym in keysyms))
+        self.file.write(LENGTH.pack(len(profile)) + profile)
+        self.file.flush()
+        self.start = time.perf_counter()
+        logging.info(f"Recording RECORD trace to {path}")
+
+    def write(self, data: bytes):
+        # Flushed every time, the daemon is usually stopped with SIGTERM
+        self.file.write(RECORD.pack(time.perf_counter() - self.start, len(data)) + data)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+@dataclass(frozen=True)
+class Trace:
+    current_desktop: int
+    min_keycode:     int
+    keysyms:         tuple[int, ...]
+    zone_profile:    object
+    records:         tuple[tuple[float, bytes], ...]
+
+    @staticmethod
+    def load(path) -> 'Trace':
+        with open(path, 'rb') as file:
+            data = file.read()
+
+        magic, version, current_desktop = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Unsupported trace file {path} ({magic=}, {version=})")
+        offset = HEADER.size
+
+        min_keycode, count = KEYMAP.unpack_from(data, offset)
+        offset += KEYMAP.size
+        keysyms = struct.unpack_from(f'<{count}I', data, offset)
+        offset += count * KEYSYM.size
+
+        length, = LENGTH.unpack_from(data, offset)
+        offset += LENGTH.size
+        _, _, zone_profile = profile_cache.decode(data[offset:offset + length])
+        offset += length
+
+        records = []
+        while offset < len(data):
+            timestamp, length = RECORD.unpack_from(data, offset)
+            offset += RECORD.size
+            records.append((timestamp, data[offset:offset + length]))
+            offset += length
+
+        return Trace(current_desktop, min_keycode, keysyms, zone_profile, tuple(records))
+
+
+class TraceReply:
+    # The parts of a RECORD reply the service looks at
+    category = record.FromServer
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+
+"""
+
+Stubs standing in for the X facing parts of the service during replay
+
+"""
+
+class ReplayProtocolDisplay:
+    # Enough of Xlib.protocol.display.Display to decode events, resource ids are
+    # left as plain ints
+    def __init__(self):
+        self.event_classes = dict(event.event_class)
+
+    def get_resource_class(self, class_name, default=None):
+        return default
+
+
+class ReplayDisplay:
+    def __init__(self, trace: Trace):
+        self.display = ReplayProtocolDisplay()
+        self.min_keycode = trace.min_keycode
+        self.keysyms = trace.keysyms
+
+    def keycode_to_keysym(self, keycode, index):
+        position = keycode - self.min_keycode
+        return self.keysyms[position] if 0 <= position < len(self.keysyms) else 0
+
+
+class ReplayGeometry:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+
+class ReplayWindow:
+    def __init__(self, id: int):
+        self.id = id
+
+    def get_geometry(self):
+        return ReplayGeometry(*REPLAY_WINDOW_SIZE)
+
+
+class ReplayEWMH:
+    def __init__(self, trace: Trace):
+        self.display = ReplayDisplay(trace)
+        self.current_desktop = trace.current_desktop
+        self.window = ReplayWindow(1)
+
+    def getCurrentDesktop(self):
+        return self.current_desktop
+
+    def getActiveWindow(self):
+        return self.window
+
+    def getWindowCoordinates(self, window):
+        return (0, 0)
+
+    def getWindowFrameExtents(self, window):
+        return [0, 0, 0, 0]
+
+
+class NullZoneDisplay:
+    def set_settings(self, settings): pass
+    def set_zones(self, zones): pass
+    def set_monitors(self, monitors): pass
+    def prerender(self, zones_per_desktop): pass
+    def prewarm(self): pass
+    def track_point(self, x, y): pass
+    def update_hover_zone(self, zone): pass
+    def reset_position(self): pass
+    def show(self): pass
+    def hide(self): pass
+
+
+class CountingSnapExecutor:
+    def __init__(self):
+        self.snaps = []
+
+    def submit(self, window, zone: Zone, settings):
+        self.snaps.append((window.id, zone))
+
+
+def create_replay_service(trace: Trace):
+    from .service import Service
+
+    return Service(
+        ewmh=ReplayEWMH(trace),
+        zone_profile=trace.zone_profile,
+        zone_window=NullZoneDisplay(),
+        snap_executor=CountingSnapExecutor(),
+    )
+
+
+def replay(trace: Trace, service=None):
+    # Feeds every recorded reply through the service's event handler, as fast
+    # as possible
+    service = service or create_replay_service(trace)
+    for _, data in trace.records:
+        service.event_handler(TraceReply(data))
+    return service
+
+
+def get_percentile(sorted_values: list[float], percentile: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * percentile / 100))]
+
+
+def benchmark(path, iterations: int = 10) -> dict:
+    from .service import Service
+
+    if iterations < 1:
+        raise ValueError(f"expected at least one iteration, got {iterations}")
+    trace = Trace.load(path)
+
+    # process_event is timed per event, event throughput is the whole handler
+    # (decoding and coalescing included)
+    latencies = []
+
+    class TimedService(Service):
+        def process_event(self, event):
+            start = time.perf_counter()
+            super().process_event(event)
+            latencies.append(time.perf_counter() - start)
+
+    events = 0
+    snaps = 0
+    elapsed = 0.0
+    for _ in range(iterations):
+        service = TimedService(
+            ewmh=ReplayEWMH(trace),
+            zone_profile=trace.zone_profile,
+            zone_window=NullZoneDisplay(),
+            snap_executor=CountingSnapExecutor(),
+        )
+        dispatched = len(latencies)
+        start = time.perf_counter()
+        replay(trace, service)
+        elapsed += time.perf_counter() - start
+        events += len(latencies) - dispatched
+        snaps += len(service.snap_executor.snaps)
+
+    recorded_events = sum(len(data) // 32 for _, data in trace.records)
+    latencies.sort()
+    return {
+        "replies": len(trace.records),
+        "recorded_events": recorded_events,
+        "dispatched_events": events // iterations,
+        "snaps": snaps // iterations,
+        "iterations": iterations,
+        "events_per_second": recorded_events * iterations / elapsed if elapsed else 0.0,
+        "latency_us": {
+            f"p{percentile}": get_percentile(latencies, percentile) * 1e6
+            for percentile in (50, 90, 99, 99.9)
+        } | { "max": (latencies[-1] if latencies else 0.0) * 1e6 },
+    }
@@ -0,0 +1,145 @@
+import ctypes
+import ctypes.util
+import hashlib
+import logging
+import os
+import struct
+import threading
+import time
+from json.decoder import JSONDecodeError
+from pathlib import Path
+
+from . import config
+from .settings import InvalidSettings
+
+"""
+
+Hot reload of pyxzones.json
+
+Rather than the configuration file itself, the directories of every candidate
+path (see config.get_config_file_candidates) are watched, which also catches
+editors saving through a rename, and a configuration file appearing in (or
+disappearing from) a location of higher precedence
+
+inotify is used through libc directly, with polling of the candidates as the
+fallback wherever it isn't available
+
+"""
+
+DEBOUNCE_DELAY = 0.3  # seconds
+POLL_INTERVAL = 1.0   # seconds
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM  = 0x00000040
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_DELETE      = 0x00000200
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+INOTIFY_EVENT = struct.Struct('iIII')  # wd, mask, cookie, len (followed by the name)
+
+
+class InotifyWatcher:
+    def __init__(self, directories: list[Path], filenames: set[str], callback):
+        self.filenames = filenames
+        self.callback = callback
+
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self.watches = {}  # watch descriptor -> directory
+        for directory in directories:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if wd >= 0:
+                self.watches[wd] = directory
+        if not self.watches:
+            os.close(self.fd)
+            raise OSError("No configuration directory could be watched")
+
+    def run(self):
+        while True:
+            data = os.read(self.fd, 4096)
+            offset = 0
+            changed = False
+            while offset < len(data):
+                _, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size
+                name = data[offset:offset + length].rstrip(b'\0').decode(errors='replace')
+                offset += length
+                changed = changed or name in self.filenames
+            if changed:
+                self.callback()
+
+
+class PollingWatcher:
+    def __init__(self, candidates: list[Path], callback):
+        self.candidates = candidates
+        self.callback = callback
+
+    def get_state(self):
+        state = []
+        for candidate in self.candidates:
+            try:
+                stat = candidate.stat()
+                state.append((stat.st_mtime_ns, stat.st_size, stat.st_ino))
+            except OSError:
+                state.append(None)
+        return state
+
+    def run(self):
+        state = self.get_state()
+        while True:
+            time.sleep(POLL_INTERVAL)
+            current_state = self.get_state()
+            if current_state != state:
+                state = current_state
+                self.callback()
+
+
+class ConfigWatcher:
+    def __init__(self, service, filename: str = config.SETTINGS_FILE):
+        self.service = service
+        self.filename = filename
+        self.fingerprint = self.get_fingerprint()
+
+    def get_fingerprint(self):
+        # Which file is in effect and what it holds, saving without changes (or
+        # touching the file) doesn't reload anything
+        config_file = config.get_config_file_path(self.filename)
+        try:
+            return config_file, hashlib.sha256(config_file.read_bytes()).digest() if config_file else None
+        except OSError:
+            return config_file, None
+
+    def start(self):
+        candidates = config.get_config_file_candidates(self.filename)
+        try:
+            directories = list(dict.fromkeys(candidate.parent for candidate in candidates if candidate.parent.is_dir()))
+            watcher = InotifyWatcher(directories, { candidate.name for candidate in candidates }, self.schedule_reload)
+            logging.debug(f"Watching {[str(directory) for directory in directories]} for configuration changes")
+        except (OSError, AttributeError) as exception:
+            # AttributeError: no inotify in the C library
+            logging.info(f"inotify unavailable ({exception}), polling for configuration changes")
+            watcher = PollingWatcher(candidates, self.schedule_reload)
+
+        thread = threading.Thread(target=watcher.run)
+        thread.daemon=True
+        thread.start()
+
+    def schedule_reload(self):
+        # Editors tend to write a file in several steps (truncate, write, rename)
+        self.service.scheduler.schedule("config", DEBOUNCE_DELAY, self.reload)
+
+    def reload(self):
+        fingerprint = self.get_fingerprint()
+        if fingerprint == self.fingerprint:
+            return
+        self.fingerprint = fingerprint
+
+        logging.info(f"Configuration changed, reloading {fingerprint[0] or 'defaults'}")
+        try:
+            self.service.reload_settings()
+        except (InvalidSettings, JSONDecodeError, OSError) as exception:
+            logging.warning(f"Keeping the current configuration, failed to reload: {exception}")
@@ -1,5 +1,6 @@
 from ewmh import EWMH
 from . import xq
+from .roundtrips import ROUND_TRIPS
 
 """
 
@@ -14,12 +15,43 @@ This extension is just for fun, for now.
 
 class XEWMH(EWMH):
 
+    def __init__(self, _display=None, root=None):
+        super().__init__(_display, root)
+        self.atoms = {}       # name -> atom
+        self.atom_names = {}  # atom -> name
+
+        if ROUND_TRIPS.enabled:
+            ROUND_TRIPS.install(self.display)
+
+    def preloadAtoms(self):
+        # Desktop specific atoms depend on the number of desktops, which needs
+        # the static atoms first to be queried
+        self.registerAtoms(xq.intern_atoms(self.display, xq.DAEMON_ATOMS))
+        self.registerAtoms(xq.intern_atoms(
+            self.display, xq.get_desktop_atom_names(self.getNumberOfDesktops())
+        ))
+
+    def registerAtoms(self, atoms):
+        self.atoms.update(atoms)
+        self.atom_names.update({ atom: name for name, atom in atoms.items() })
+
+    def getAtom(self, name):
+        if name not in self.atoms:
+            self.registerAtoms({ name: self.display.get_atom(name) })
+        return self.atoms[name]
+
     def getMonitors(self):
         return xq.get_monitors(self.display, self.root)
 
     def getWorkAreasForVirtualDesktop(self, desktop_index: int):
         return xq.get_work_areas(self.display, desktop_index)
 
+    def getWorkAreasForVirtualDesktops(self, desktops):
+        return xq.get_work_areas_for_desktops(self.display, desktops)
+
+    def discoverLayout(self):
+        return xq.discover_layout(self.display, self.root)
+
     def getWorkAreasForAllVirtualDesktops(self):
         return xq.get_work_areas_for_all_desktops(self.display, self.getNumberOfDesktops())
 
@@ -27,4 +59,4 @@ class XEWMH(EWMH):
         return xq.get_window_frame_extents(self.display, window)
 
     def getWindowCoordinates(self, window):
-        return xq.get_window_coordinates(window)
+        return xq.get_window_coordinates(window, self.root)
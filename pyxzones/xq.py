@@ -1,21 +1,162 @@
 import logging
+import threading
+import time
+from dataclasses import dataclass
 from Xlib import Xatom, threaded # type: ignore
+from Xlib.error import XError
 from Xlib.ext import randr
+from Xlib.protocol import request
 
 from .types import WorkArea
 
 
-def get_monitors(display, root_window):
-    screen_resources = randr.get_screen_resources(root_window)
+# Atoms used by the daemon regardless of the number of virtual desktops
+DAEMON_ATOMS = (
+    '_NET_ACTIVE_WINDOW',
+    '_NET_CURRENT_DESKTOP',
+    '_NET_FRAME_EXTENTS',
+    '_NET_MOVERESIZE_WINDOW',
+    '_NET_NUMBER_OF_DESKTOPS',
+    '_NET_SHOWING_DESKTOP',
+    '_NET_WM_STATE',
+    '_NET_WM_STATE_MAXIMIZED_HORZ',
+    '_NET_WM_STATE_MAXIMIZED_VERT',
+    '_NET_WORKAREA',
+)
 
-    monitors = []
-    for output in screen_resources.outputs:
-        output_info = randr.get_output_info(display, output, screen_resources.config_timestamp)
-        if output_info.crtc == 0:
-            continue
 
-        crtc_info = randr.get_crtc_info(display, output_info.crtc, screen_resources.config_timestamp)
+def get_desktop_atom_names(number_of_virtual_desktops: int) -> list[str]:
+    names = []
+    for desktop in range(0, number_of_virtual_desktops):
+        names.append(f"_GTK_WORKAREAS_D{desktop}")
+        names.append(f"_NET_WORKAREAS_D{desktop}")
+    return names
+
+
+def intern_atoms(display, names) -> dict[str, int]:
+    # Every InternAtom request is sent before waiting on the first reply, so the
+    # whole batch costs a single round trip rather than one per atom
+    requests = [
+        (name, request.InternAtom(display=display.display, name=name, only_if_exists=0, defer=True))
+        for name in names
+    ]
+
+    atoms = {}
+    for name, atom_request in requests:
+        atom_request.reply()
+        atoms[name] = atom_request.atom
+
+    # Seed the display's own atom cache, which display.get_atom() (and the ewmh
+    # library) consult before going to the X server
+    display.display._atom_cache.update(atoms)
+    return atoms
+
+
+# Long (32 bit) units requested for each property, comfortably more than the
+# work areas of any realistic number of monitors or desktops
+PROPERTY_LENGTH = 4096
+
+
+@dataclass(frozen=True)
+class DiscoveryStats:
+    round_trips: int
+    elapsed:     float  # seconds
+
+
+class PipelinedQuery:
+    # Requests are sent deferred and their replies collected as a batch, so each
+    # batch costs one round trip no matter how many requests are in it
+    def __init__(self, display):
+        self.display = display
+        self.round_trips = 0
+        self.started_at = time.perf_counter()
+
+    def collect(self, requests):
+        if requests:
+            self.round_trips += 1
+        for pending_request in requests:
+            pending_request.reply()
+        return requests
+
+    def request_screen_resources(self, root_window):
+        return randr.GetScreenResources(
+            display=self.display.display,
+            opcode=self.display.display.get_extension_major(randr.extname),
+            window=root_window,
+            defer=True,
+        )
+
+    def request_output_info(self, output, config_timestamp):
+        return randr.GetOutputInfo(
+            display=self.display.display,
+            opcode=self.display.display.get_extension_major(randr.extname),
+            output=output,
+            config_timestamp=config_timestamp,
+            defer=True,
+        )
+
+    def request_crtc_info(self, crtc, config_timestamp):
+        return randr.GetCrtcInfo(
+            display=self.display.display,
+            opcode=self.display.display.get_extension_major(randr.extname),
+            crtc=crtc,
+            config_timestamp=config_timestamp,
+            defer=True,
+        )
+
+    def request_property(self, window, name, property_type=Xatom.CARDINAL):
+        return request.GetProperty(
+            display=self.display.display,
+            delete=0,
+            window=window,
+            property=self.display.get_atom(name),
+            type=property_type,
+            long_offset=0,
+            long_length=PROPERTY_LENGTH,
+            defer=True,
+        )
+
+    def request_work_area_properties(self, root_window, desktops) -> dict:
+        # Desktop atoms which weren't preloaded are interned as a batch of their
+        # own, rather than one synchronous InternAtom per property below
+        names = get_desktop_atom_names(max(desktops, default=-1) + 1)
+        missing = [name for name in names if name not in self.display.display._atom_cache]
+        if missing:
+            intern_atoms(self.display, missing)
+            self.round_trips += 1
+
+        requests = { '_NET_WORKAREA': self.request_property(root_window, '_NET_WORKAREA') }
+        for desktop in desktops:
+            for name in (f"_GTK_WORKAREAS_D{desktop}", f"_NET_WORKAREAS_D{desktop}"):
+                requests[name] = self.request_property(root_window, name)
+        return requests
+
+    def stats(self) -> DiscoveryStats:
+        return DiscoveryStats(self.round_trips, time.perf_counter() - self.started_at)
+
+
+def get_property_value(property_request):
+    if not property_request.property_type:
+        return None
+    if property_request.bytes_after:
+        # Shouldn't realistically happen, see PROPERTY_LENGTH
+        logging.warning(f"Property larger than {PROPERTY_LENGTH * 4} bytes, value is truncated")
+    return property_request.value[1]
+
+
+def get_mode_map(screen_resources) -> dict[int, tuple[int, int]]:
+    return { mode.id: (mode.width, mode.height) for mode in screen_resources.modes }
+
+
+# crtc_infos is a list of (output, crtc, info), where info is anything carrying
+# the crtc mode, rotation, x, y, width and height (GetCrtcInfo replies as well
+# as RandR CrtcChangeNotify events)
+def build_monitors(screen_mode_map, crtc_infos):
+    monitors = []
+    for output, crtc, crtc_info in crtc_infos:
         monitors.append({
+            "output": output,
+            "crtc": crtc,
             "mode": crtc_info.mode,
             "rotation": crtc_info.rotation,
             "virtual_x": crtc_info.x,
@@ -27,10 +168,6 @@ def get_monitors(display, root_window):
     # sort monitors from left to right, top to bottom (as configuration is expected to be done)
     monitors.sort(key = lambda m: (m['virtual_x'], m['virtual_y']))
 
-    screen_mode_map = {}
-    for mode in screen_resources.modes:
-        screen_mode_map[mode.id] = (mode.width, mode.height)
-
     for monitor in monitors:
         monitor['width'] = screen_mode_map[monitor['mode']][0 if monitor['rotation'] in (1, 4) else 1]
         monitor['height'] = screen_mode_map[monitor['mode']][1 if monitor['rotation'] in (1, 4) else 0]
@@ -45,8 +182,56 @@ def get_monitors(display, root_window):
     return monitors
 
 
+# The root window spans the bounding box of the monitors, which RandR resizes
+# it to whenever the monitor layout changes
+def get_root_size(monitors) -> tuple[int, int]:
+    return (
+        max(monitor['virtual_x'] + monitor['virtual_width'] for monitor in monitors),
+        max(monitor['virtual_y'] + monitor['virtual_height'] for monitor in monitors),
+    )
+
+
+# One batch for every output, then one for every crtc in use, rather than a
+# round trip per output and per crtc
+def request_output_infos(query, screen_resources) -> list:
+    return [
+        (output, query.request_output_info(output, screen_resources.config_timestamp))
+        for output in screen_resources.outputs
+    ]
+
+
+def request_crtc_infos(query, screen_resources, output_requests) -> list:
+    return [
+        (output, output_info.crtc, query.request_crtc_info(output_info.crtc, screen_resources.config_timestamp))
+        for output, output_info in output_requests if output_info.crtc != 0
+    ]
+
+
+def get_monitors(display, root_window):
+    return get_monitors_and_modes(display, root_window)[0]
+
+
+def get_monitors_and_modes(display, root_window):
+    query = PipelinedQuery(display)
+    screen_resources = query.collect([query.request_screen_resources(root_window)])[0]
+
+    output_requests = request_output_infos(query, screen_resources)
+    query.collect([output_request for _, output_request in output_requests])
+
+    crtc_requests = request_crtc_infos(query, screen_resources, output_requests)
+    query.collect([crtc_request for _, _, crtc_request in crtc_requests])
+
+    mode_map = get_mode_map(screen_resources)
+    return build_monitors(mode_map, crtc_requests), mode_map
+
+
+def to_work_areas(value) -> list[WorkArea]:
+    work_areas = [value[l:l+4] for l in range(0, len(value), 4)]
+    return [WorkArea(*work_areas[i]) for i in range(0, len(work_areas))]
+
+
 # Find available space (no panels)
-def get_work_areas(display, desktop):
+def build_work_areas(display, desktop, properties: dict):
     # Fallback from best data to worst
     #
     #   _GTK_WORKAREAS_D<desktop>
@@ -54,40 +239,32 @@ def get_work_areas(display, desktop):
     #   _NET_WORKAREA
     #   RootWindow.get_geometry()
     #
-    gtk_work_area_d = display.screen().root.get_full_property(
-        display.intern_atom(f"_GTK_WORKAREAS_D{desktop}"), Xatom.CARDINAL
-    )
+    gtk_work_area_d = properties.get(f"_GTK_WORKAREAS_D{desktop}")
     if gtk_work_area_d != None:
-        logging.debug(f"gtk_work_area_d{desktop}: {gtk_work_area_d.value}")
-        work_areas = [gtk_work_area_d.value[l:l+4] for l in range(0, len(gtk_work_area_d.value), 4)]
-        return [WorkArea(*work_areas[i]) for i in range(0, len(work_areas))]
+        logging.debug(f"gtk_work_area_d{desktop}: {gtk_work_area_d}")
+        return to_work_areas(gtk_work_area_d)
 
 
     # don't think any WM implements the _NET_WORKAREAS_D# variant at the moment
-    net_work_area_d = display.screen().root.get_full_property(
-        display.intern_atom(f"_NET_WORKAREAS_D{desktop}"), Xatom.CARDINAL
-    )
+    net_work_area_d = properties.get(f"_NET_WORKAREAS_D{desktop}")
     if net_work_area_d != None:
         logging.debug(f"{net_work_area_d=}")
-        work_areas = [net_work_area_d.value[l:l+4] for l in range(0, len(net_work_area_d.value), 4)]
-        return [WorkArea(*work_areas[i]) for i in range(0, len(work_areas))]
+        return to_work_areas(net_work_area_d)
 
 
     logging.warning("_GTK_WORKAREAS is not supported, fallback to _NET_WORKAREA. "
             "Work areas may be incorrect on multi-monitor systems.\n")
 
 
-    work_area_property = display.screen().root.get_full_property(
-        display.intern_atom('_NET_WORKAREA'), Xatom.CARDINAL
-    )
-    # work_area_property.value is a list of desktops of repeating x,y,w,h specs
+    work_area_property = properties.get('_NET_WORKAREA')
+    # work_area_property is a list of desktops of repeating x,y,w,h specs
     # this includes virtual desktops, tbd on what this means for multi-monitor
-    
+
     # TODO: this returns a large virtual-desktop without slicing monitors or unusable space
     # the caller needs to know that a result of length 1 on multi-monitor setup is a large virtual screen
-    if work_area_property != None:
+    if work_area_property != None and len(work_area_property) >= desktop * 4 + 4:
         logging.debug(f"{work_area_property=}")
-        work_area = WorkArea(*work_area_property.value[desktop * 4:4])
+        work_area = WorkArea(*work_area_property[desktop * 4:desktop * 4 + 4])
         return [work_area]
 
     logging.warning("_NET_WORKAREA is not supported, Work areas may be incorrect.\n")
@@ -100,30 +277,141 @@ def get_work_areas(display, desktop):
     return [WorkArea(*[geometry.x, geometry.y, geometry.width, geometry.height])]
 
 
+def read_work_areas(display, desktops, property_requests: dict) -> list[list[WorkArea]]:
+    properties = { name: get_property_value(property_request) for name, property_request in property_requests.items() }
+    return [build_work_areas(display, desktop, properties) for desktop in desktops]
+
+
+def get_work_areas(display, desktop):
+    return get_work_areas_for_desktops(display, [desktop])[0]
+
+
+def get_work_areas_for_desktops(display, desktops) -> list[list[WorkArea]]:
+    query = PipelinedQuery(display)
+    property_requests = query.request_work_area_properties(display.screen().root, desktops)
+    query.collect(list(property_requests.values()))
+    return read_work_areas(display, desktops, property_requests)
+
+
 def get_work_areas_for_all_desktops(display, number_of_virtual_desktops):
-    work_areas = []
-    for desktop in range(0, number_of_virtual_desktops):
-        work_areas.append(get_work_areas(display, desktop))
-    return work_areas
+    return get_work_areas_for_desktops(display, range(0, number_of_virtual_desktops))
+
+
+def discover_layout(display, root_window):
+    # Everything needed to build a zone profile in three batches of requests:
+    #
+    #   1. screen resources and the number of desktops
+    #   2. every output and every work area property of every desktop
+    #   3. every crtc in use
+    #
+    # (plus one more if the number of desktops grew beyond the preloaded atoms)
+    #
+    query = PipelinedQuery(display)
+
+    screen_resources, desktops_request = query.collect([
+        query.request_screen_resources(root_window),
+        query.request_property(root_window, '_NET_NUMBER_OF_DESKTOPS'),
+    ])
+
+    number_of_desktops = get_property_value(desktops_request)
+    desktops = range(0, number_of_desktops[0] if number_of_desktops else 1)
+
+    # Any desktop atoms still needing to be interned are resolved before the
+    # output requests are sent, so they don't end up waiting on those
+    property_requests = query.request_work_area_properties(root_window, desktops)
+    output_requests = request_output_infos(query, screen_resources)
+    query.collect([output_request for _, output_request in output_requests] + list(property_requests.values()))
+
+    crtc_requests = request_crtc_infos(query, screen_resources, output_requests)
+    query.collect([crtc_request for _, _, crtc_request in crtc_requests])
+
+    monitors = build_monitors(get_mode_map(screen_resources), crtc_requests)
+    work_areas = read_work_areas(display, desktops, property_requests)
+
+    stats = query.stats()
+    logging.info(f"Discovered {len(monitors)} monitors and {len(desktops)} desktops "
+                 f"in {stats.round_trips} round trips ({stats.elapsed * 1000:.1f}ms)")
+    return monitors, work_areas, stats
 
 
 def get_window_frame_extents(display, window) -> list[int] | None:
     extents = window.get_full_property(
-        display.intern_atom("_NET_FRAME_EXTENTS"), Xatom.CARDINAL
+        display.get_atom("_NET_FRAME_EXTENTS"), Xatom.CARDINAL
     )
     return extents.value if extents != None else (0, 0, 0, 0)
 
 
-def get_window_coordinates(window) -> tuple[int, int] | None:
+# Parent chains only change when a window is reparented, so the tree walk
+# fallback below only confirms the immediate parent of a known window rather
+# than querying every level of frames again, and walks the tree anew when the
+# parent differs or a cached ancestor is gone
+#
+# Keyed by connection as well as window, as the cached ancestors are Window
+# objects of the display they were looked up on and mustn't be used on another.
+# Bounded rather than tracking DestroyNotify, as client windows within frames
+# won't deliver their destruction to the root window
+PARENT_CHAIN_CACHE_SIZE = 256
+parent_chain_cache: dict[tuple, tuple] = {}
+parent_chain_cache_lock = threading.Lock()
+
+
+def get_parent_chain(window) -> tuple:
+    key = (window.display, window.id)
+    parent = window.query_tree().parent
+    with parent_chain_cache_lock:
+        chain = parent_chain_cache.get(key)
+    if chain is not None and (chain[0].id if chain else 0) == (parent.id if parent else 0):
+        return chain
+
+    ancestors = []
+    while parent:
+        ancestors.append(parent)
+        parent = parent.query_tree().parent
+    chain = tuple(ancestors)
+
+    with parent_chain_cache_lock:
+        if len(parent_chain_cache) >= PARENT_CHAIN_CACHE_SIZE:
+            parent_chain_cache.clear()
+        parent_chain_cache[key] = chain
+    return chain
+
+
+def invalidate_parent_chain(window):
+    with parent_chain_cache_lock:
+        parent_chain_cache.pop((window.display, window.id), None)
+
+
+def get_window_coordinates_by_tree(window) -> tuple[int, int]:
+    for attempt in range(2):
+        (x, y) = (0, 0)
+        try:
+            for ancestor in (window,) + get_parent_chain(window):
+                geometry = ancestor.get_geometry()
+                x += geometry.x
+                y += geometry.y
+            return (x, y)
+        except XError:
+            # A cached ancestor may have been destroyed since, walk the tree once more
+            invalidate_parent_chain(window)
+            if attempt:
+                raise
+
+
+def get_window_coordinates(window, root_window=None) -> tuple[int, int] | None:
     if window is None:
         return None
 
-    (x, y) = (0, 0)
-
-    while window:
-        geometry = window.get_geometry()
-        x += geometry.x
-        y += geometry.y
-        window = window.query_tree().parent
+    # A single TranslateCoords request resolves the window origin relative to the
+    # root, rather than two requests per ancestor for however many levels of
+    # frames the WM reparents the window into
+    #
+    # Reparented client windows generally have no border, so the inside origin
+    # given here matches the outer origin the tree walk would produce
+    if root_window is not None:
+        try:
+            translated = root_window.translate_coords(window, 0, 0)
+            return (translated.x, translated.y)
+        except XError as exception:
+            logging.debug(f"translate_coords failed, falling back to tree walk: {exception}")
 
-    return (x, y)
+    return get_window_coordinates_by_tree(window)
@@ -1,15 +1,19 @@
+import cairo
 import gi
-import threading
+import math
 
 gi.require_version("Gtk", "3.0")
-from gi.repository import Gtk
+from gi.repository import GLib, Gtk
 
-from .settings import SETTINGS
+from .settings import SETTINGS, SettingsSnapshot
 from .types import MergeZone, Zone
+from .xq import get_root_size
 
 
 class ZoneDisplayWindow(Gtk.Window):
-    def __init__(self, screen_width, screen_height, zones):
+    # x, y, width and height are the area of the root window covered, which is
+    # either the whole root window or a single monitor (crtc)
+    def __init__(self, x, y, width, height, zones):
         super(ZoneDisplayWindow, self).__init__()
         self.screen = self.get_screen()
         self.visual = self.screen.get_rgba_visual()
@@ -18,10 +22,10 @@ class ZoneDisplayWindow(Gtk.Window):
         self.set_decorated(False)
         self.set_skip_taskbar_hint(True)
         self.set_position(Gtk.WindowPosition.NONE)
-        self.set_default_size(screen_width, screen_height)
-        self.set_size_request(screen_width, screen_height) # only way to force the larger size, classic hack
-        self.move(0, 0)
-        self.resize(screen_width, screen_height)
+        self.set_default_size(width, height)
+        self.set_size_request(width, height) # only way to force the larger size, classic hack
+        self.move(x, y)
+        self.resize(width, height)
 
         if self.visual != None and self.screen.is_composited():
             self.set_visual(self.visual)
@@ -29,40 +33,128 @@ class ZoneDisplayWindow(Gtk.Window):
         self.set_app_paintable(True)
         self.connect("draw", self.area_draw)
 
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
         self.zones = zones
+        self.layers: dict[tuple[Zone, ...], ZoneLayer] = {}
         self.hover_zone: Zone | MergeZone = None
 
+        self.set_settings(SETTINGS.snapshot)
+
+    def set_settings(self, settings: SettingsSnapshot):
+        # Everything pre-rendered is stale with new colors or sizes
+        zone_sets = list(self.layers)
+        self.layers = {}
+        self.settings = settings
+
         # NOTE: Order matters here, expanded as function parameters below
         self.normal_zone_config = (
-            SETTINGS.zone_background_color,
-            SETTINGS.zone_background_inset,
-            SETTINGS.zone_border_color,
-            SETTINGS.zone_border_thickness,
-            SETTINGS.zone_border_inset
+            settings.zone_background_color,
+            settings.zone_background_inset,
+            settings.zone_border_color,
+            settings.zone_border_thickness,
+            settings.zone_border_inset
         )
         self.hover_zone_config = (
-            SETTINGS.hover_zone_background_color,
-            SETTINGS.hover_zone_background_inset,
-            SETTINGS.hover_zone_border_color,
-            SETTINGS.hover_zone_border_thickness,
-            SETTINGS.hover_zone_border_inset
+            settings.hover_zone_background_color,
+            settings.hover_zone_background_inset,
+            settings.hover_zone_border_color,
+            settings.hover_zone_border_thickness,
+            settings.hover_zone_border_inset
         )
+        self.prerender(zone_sets)
 
     def set_hover_zone(self, zone):
         self.hover_zone = zone
 
+    def update_hover_zone(self, zone) -> bool:
+        # Called for every pointer movement from the RECORD thread, nothing is
+        # redrawn unless the pointer actually crossed into a different zone
+        previous_zone = self.hover_zone
+        if zone == previous_zone:
+            return False
+
+        self.hover_zone = zone
+        GLib.idle_add(self.queue_hover_damage, previous_zone, zone)
+        return True
+
+    def queue_hover_damage(self, *hover_zones):
+        # Only the areas of the previous and new hover zones need redrawing, the
+        # rest of the window is unchanged
+        layer = self.get_layer(self.zones)
+        window_coordinates = self.get_position()
+        for hover_zone in hover_zones:
+            if not hover_zone:
+                continue
+            zones = hover_zone.zones if type(hover_zone) is MergeZone else (hover_zone,)
+            x, y, width, height = layer.get_hover_rectangle(zones)
+            self.queue_draw_area(x - window_coordinates.root_x, y - window_coordinates.root_y, width, height)
+
+        # Returning a truthy value from an idle callback would have it run again
+        return False
+
     def set_zones(self, zones):
         self.zones = zones
+        self.get_layer(zones)
+
+    def prerender(self, zones_per_desktop):
+        # Layers are keyed by their zones, so desktops sharing the same work
+        # areas (the usual case) share one layer as well
+        layers = {}
+        for zones in zones_per_desktop:
+            key = tuple(zones)
+            layers[key] = self.layers.get(key) or ZoneLayer(
+                key, self.x, self.y, self.width, self.height, self.normal_zone_config, self.hover_zone_config
+            )
+        self.layers = layers
+
+    def get_layer(self, zones) -> 'ZoneLayer':
+        key = tuple(zones)
+        layer = self.layers.get(key)
+        if layer is None:
+            layer = ZoneLayer(
+                key, self.x, self.y, self.width, self.height, self.normal_zone_config, self.hover_zone_config
+            )
+            self.layers = { **self.layers, key: layer }
+        return layer
 
     def reset_position(self):
-        self.move(0, 0)
+        self.move(self.x, self.y)
+
+    def track_point(self, x, y):
+        # A single window covers everything, nothing to follow
+        pass
+
+    def set_monitors(self, monitors):
+        # Covers the whole root window, which follows the monitor layout
+        if not monitors:
+            return
+        width, height = get_root_size(monitors)
+        if (width, height) == (self.width, self.height):
+            return
 
-    def draw_zone(self, cr, zone: Zone, background_color, background_inset, border_color, border_thickness, border_inset):
-        # The WM can decide to respect or not the position request of 0, 0 and
+        # Layers are the size of the window, prerendered again at the new size
+        zone_sets = list(self.layers)
+        self.layers = {}
+        self.width = width
+        self.height = height
+        self.prerender(zone_sets)
+        GLib.idle_add(self.apply_size, width, height)
+
+    def apply_size(self, width, height):
+        self.set_default_size(width, height)
+        self.set_size_request(width, height)
+        self.resize(width, height)
+        return False
+
+    def area_draw(self, widget, cr):
+        # The WM can decide to respect or not the position request of x, y and
         # may adjust the position of the window based on panels present (some,
         # none, or all panels...)
         #
-        # While repeated calls to move(0, 0) may result in the display moving
+        # While repeated calls to move(x, y) may result in the display moving
         # to the appropriate point, it may not be immediate and the user
         # may see the window moving (can see this on current development env)
         #
@@ -72,42 +164,255 @@ class ZoneDisplayWindow(Gtk.Window):
         # The zones should already be adjusted for the appropriate workarea,
         # just tweak relative positioning used here
         window_coordinates = self.get_position()
+        x_offset, y_offset = -window_coordinates.root_x, -window_coordinates.root_y
 
-        cr.set_source_rgba(*background_color)
-        cr.rectangle(
-            zone.x + background_inset - window_coordinates.root_x,
-            zone.y + background_inset - window_coordinates.root_y,
-            zone.width - background_inset * 2,
-            zone.height - background_inset * 2
-        )
-        cr.fill()
-
-        cr.set_source_rgba(*border_color)
-        cr.set_line_width(border_thickness)
-        cr.rectangle(
-            zone.x + border_inset - window_coordinates.root_x,
-            zone.y + border_inset - window_coordinates.root_y,
-            zone.width - border_inset * 2,
-            zone.height - border_inset * 2
-        )
-        cr.stroke()
+        layer = self.get_layer(self.zones)
 
+        # SOURCE rather than OVER, the layers already contain the final pixels
+        cr.set_operator(cairo.OPERATOR_SOURCE)
+        cr.set_source_surface(layer.surface, layer.x + x_offset, layer.y + y_offset)
+        cr.paint()
 
-    def area_draw(self, widget, cr):
-        hover_zones = ()
-        if self.hover_zone:
+        if self.hover_zone and self.settings.highlight_hover_zone:
             hover_zones = self.hover_zone.zones if type(self.hover_zone) is MergeZone else (self.hover_zone,)
+            patch_x, patch_y, patch = layer.get_hover_patch(hover_zones)
+            cr.set_source_surface(patch, patch_x + x_offset, patch_y + y_offset)
+            cr.rectangle(patch_x + x_offset, patch_y + y_offset, patch.get_width(), patch.get_height())
+            cr.fill()
+
+
+def draw_zone(cr, zone: Zone, background_color, background_inset, border_color, border_thickness, border_inset):
+    cr.set_source_rgba(*background_color)
+    cr.rectangle(
+        zone.x + background_inset,
+        zone.y + background_inset,
+        zone.width - background_inset * 2,
+        zone.height - background_inset * 2
+    )
+    cr.fill()
+
+    cr.set_source_rgba(*border_color)
+    cr.set_line_width(border_thickness)
+    cr.rectangle(
+        zone.x + border_inset,
+        zone.y + border_inset,
+        zone.width - border_inset * 2,
+        zone.height - border_inset * 2
+    )
+    cr.stroke()
+
+
+class ZoneLayer:
+    # Pre-rendered zones of a virtual desktop, covering the x, y, width and height
+    # area of the root window (zones and patch positions are root coordinates)
+    #
+    # The normal state of every zone is rendered once into `surface`, and each
+    # hover state gets a patch covering just the hovered zones (and whatever
+    # borders of neighbouring zones overlap them), so drawing a frame is a blit
+    # of the layer plus a blit of one patch rather than a fill and stroke for
+    # every zone
+    def __init__(self, zones: tuple[Zone, ...], x, y, width, height, normal_zone_config, hover_zone_config):
+        self.zones = zones
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.normal_zone_config = normal_zone_config
+        self.hover_zone_config = hover_zone_config
 
+        # Borders are stroked centered on their rectangle, so half of the line
+        # lands outside of the zone itself
+        self.padding = math.ceil(max(normal_zone_config[3], hover_zone_config[3]) / 2) + 1
+
+        self.surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+        cr = cairo.Context(self.surface)
+        cr.translate(-x, -y)
+        for zone in zones:
+            draw_zone(cr, zone, *normal_zone_config)
+        self.surface.flush()
+
+        self.hover_patches = {}
+        for zone in zones:
+            self.get_hover_patch((zone,))
+
+    def get_hover_rectangle(self, hover_zones) -> tuple[int, int, int, int]:
+        x = max(min(zone.x for zone in hover_zones) - self.padding, self.x)
+        y = max(min(zone.y for zone in hover_zones) - self.padding, self.y)
+        right = min(max(zone.x + zone.width for zone in hover_zones) + self.padding, self.x + self.width)
+        bottom = min(max(zone.y + zone.height for zone in hover_zones) + self.padding, self.y + self.height)
+        return (x, y, max(right - x, 1), max(bottom - y, 1))
+
+    def get_hover_patch(self, hover_zones) -> tuple[int, int, 'cairo.ImageSurface']:
+        # Merge zone pairs are rendered the first time they are hovered
+        patch = self.hover_patches.get(hover_zones)
+        if patch is not None:
+            return patch
+
+        x, y, width, height = self.get_hover_rectangle(hover_zones)
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+        cr = cairo.Context(surface)
+        cr.translate(-x, -y)
+
+        # Every zone is drawn in its original order so overlapping borders end up
+        # exactly as they would when drawing the full desktop, cairo clips the
+        # zones that fall outside of the patch
         for zone in self.zones:
-            hover_zone = SETTINGS.highlight_hover_zone and zone in hover_zones
-            self.draw_zone(cr, zone, *(self.normal_zone_config if not hover_zone else self.hover_zone_config))
+            draw_zone(cr, zone, *(self.hover_zone_config if zone in hover_zones else self.normal_zone_config))
+        surface.flush()
+
+        patch = (x, y, surface)
+        self.hover_patches[hover_zones] = patch
+        return patch
+
+
+def get_monitor_rectangle(monitor) -> tuple[int, int, int, int]:
+    return (monitor['virtual_x'], monitor['virtual_y'], monitor['virtual_width'], monitor['virtual_height'])
+
+
+def contains_point(rectangle, x, y) -> bool:
+    rectangle_x, rectangle_y, width, height = rectangle
+    return rectangle_x <= x < rectangle_x + width and rectangle_y <= y < rectangle_y + height
+
+
+def contains_zone(rectangle, zone: Zone) -> bool:
+    return contains_point(rectangle, zone.x + zone.width // 2, zone.y + zone.height // 2)
+
+
+class MonitorZoneDisplay:
+    # One overlay window per monitor (crtc) rather than a single window the size
+    # of the root window, which for mixed monitor arrangements is mostly dead
+    # space between monitors, but still a full ARGB buffer to allocate and
+    # composite
+    #
+    # Only the window of the monitor the drag is currently on is shown, the
+    # others are neither mapped nor redrawn
+    #
+    # The windows are kept as (rectangle, window) pairs in a single list, which
+    # is replaced rather than changed in place when monitors change, and the
+    # active pair is tracked as such rather than as an index into it, so the
+    # RECORD thread never sees a rectangle paired with another monitor's window
+    #
+    # Monitors, zones, prerendered desktops and settings are set from whichever
+    # thread publishes them, but only ever applied from the GTK main loop, where
+    # windows can be created and destroyed. Idle callbacks run in the order they
+    # were added, so zones published right after new monitors always reach the
+    # windows of the new monitors
+    def __init__(self, monitors, zones):
+        self.zones = zones
+        self.zones_per_desktop = []
+        self.monitor_windows = [
+            (rectangle, ZoneDisplayWindow(*rectangle, self.get_zones_for_rectangle(rectangle, zones)))
+            for rectangle in (get_monitor_rectangle(monitor) for monitor in monitors)
+        ]
+        self.active = self.monitor_windows[0]
+        self.shown = False
+
+    def set_monitors(self, monitors):
+        GLib.idle_add(self.replace_windows, [get_monitor_rectangle(monitor) for monitor in monitors])
+
+    def replace_windows(self, rectangles):
+        # Windows of monitors which kept their geometry are kept as they are
+        if not rectangles or rectangles == [rectangle for rectangle, _ in self.monitor_windows]:
+            return False
+
+        previous_windows = dict(self.monitor_windows)
+        monitor_windows = []
+        for rectangle in rectangles:
+            window = previous_windows.get(rectangle)
+            if window is None:
+                window = ZoneDisplayWindow(*rectangle, self.get_zones_for_rectangle(rectangle, self.zones))
+                window.prerender([self.get_zones_for_rectangle(rectangle, zones) for zones in self.zones_per_desktop])
+            monitor_windows.append((rectangle, window))
+
+        self.monitor_windows = monitor_windows
+        self.active = monitor_windows[0]
+        for rectangle, window in previous_windows.items():
+            if rectangle not in rectangles:
+                window.destroy()
+
+        # A drag in progress continues on whichever window is now active
+        if self.shown:
+            active_window = self.active[1]
+            for _, window in monitor_windows:
+                if window is active_window:
+                    window.show()
+                else:
+                    window.hide()
+        return False
+
+    def get_zones_for_rectangle(self, rectangle, zones):
+        return [zone for zone in zones if contains_zone(rectangle, zone)]
+
+    def set_settings(self, settings: SettingsSnapshot):
+        GLib.idle_add(self.apply_settings, settings)
+
+    def apply_settings(self, settings: SettingsSnapshot):
+        for _, window in self.monitor_windows:
+            window.set_settings(settings)
+        return False
+
+    def set_zones(self, zones):
+        GLib.idle_add(self.apply_zones, zones)
+
+    def apply_zones(self, zones):
+        self.zones = zones
+        for rectangle, window in self.monitor_windows:
+            window.set_zones(self.get_zones_for_rectangle(rectangle, zones))
+        return False
+
+    def prerender(self, zones_per_desktop):
+        GLib.idle_add(self.apply_prerender, zones_per_desktop)
+
+    def apply_prerender(self, zones_per_desktop):
+        self.zones_per_desktop = zones_per_desktop
+        for rectangle, window in self.monitor_windows:
+            window.prerender([self.get_zones_for_rectangle(rectangle, zones) for zones in zones_per_desktop])
+        return False
+
+    def set_hover_zone(self, zone):
+        self.update_hover_zone(zone)
+
+    def update_hover_zone(self, zone) -> bool:
+        # Each window only ever hovers its own zones, so only the windows the
+        # previous or new hover zone belong to see any change
+        changed = False
+        for rectangle, window in self.monitor_windows:
+            changed |= window.update_hover_zone(zone if zone and contains_zone(rectangle, zone) else None)
+        return changed
+
+    def reset_position(self):
+        for _, window in self.monitor_windows:
+            window.reset_position()
+
+    def track_point(self, x, y):
+        # Called from the RECORD thread for every drag movement
+        rectangle, previous_window = self.active
+        if contains_point(rectangle, x, y):
+            return
+
+        for monitor_window in self.monitor_windows:
+            if contains_point(monitor_window[0], x, y):
+                self.active = monitor_window
+                if self.shown:
+                    GLib.idle_add(previous_window.hide)
+                    GLib.idle_add(monitor_window[1].show)
+                return
+
+    def show(self):
+        self.shown = True
+        self.active[1].show()
 
+    def hide(self):
+        self.shown = False
+        for _, window in self.monitor_windows:
+            window.hide()
 
-def setup_zone_display(x_screen_width, x_screen_height, zones):
-    zone_window = ZoneDisplayWindow(x_screen_width, x_screen_height, zones)
 
-    thread = threading.Thread(target=Gtk.main)
-    thread.daemon=True
-    thread.start()
+def setup_zone_display(x_screen_width, x_screen_height, zones, monitors=None):
+    # Called from within the GTK main loop, which DeferredZoneDisplay runs
+    if SETTINGS.snapshot.overlay_mode == 'monitor' and monitors:
+        zone_window = MonitorZoneDisplay(monitors, zones)
+    else:
+        zone_window = ZoneDisplayWindow(0, 0, x_screen_width, x_screen_height, zones)
 
     return zone_window
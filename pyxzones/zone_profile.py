@@ -1,35 +1,130 @@
+import json
 import logging
+import time
+from array import array
+from bisect import bisect_right
 
-from .settings import SETTINGS
+from . import layout
+from .metrics import METRICS
+from .settings import SETTINGS, InvalidSettings, SettingsSnapshot
 from .types import MergeZone, Zone, WorkArea
+from .zone_table import NO_ROW, ZoneTable
+
+
+FIND_ZONE_TIME = METRICS.histogram("find_zone")
+
+
+class ZoneIndex:
+    """
+    Compressed grid over the zone boundaries of a single virtual desktop
+
+    Every distinct zone edge becomes a grid line, so each cell of the grid is
+    covered by exactly the same set of zones and can be resolved ahead of time.
+    Lookups are then two bisects, and a point landing in the same cell as the
+    previous lookup (the common case while dragging) skips even those.
+    """
+
+    def __init__(self, table: ZoneTable):
+        rows = range(len(table))
+
+        # Zone.check() is inclusive on both edges, so a zone covers the half-open
+        # integer range [x, x + width + 1)
+        self.xs = sorted({edge for row in rows for edge in (table.x[row], table.x[row] + table.width[row] + 1)})
+        self.ys = sorted({edge for row in rows for edge in (table.y[row], table.y[row] + table.height[row] + 1)})
+
+        x_lines = { edge: index for index, edge in enumerate(self.xs) }
+        y_lines = { edge: index for index, edge in enumerate(self.ys) }
+
+        columns = max(len(self.xs) - 1, 0)
+        # Table row covering each cell, NO_ROW where there is no zone
+        self.cells = array('i', [NO_ROW]) * (columns * max(len(self.ys) - 1, 0))
+        self.columns = columns
+
+        # Paint lowest priority first so that merge zones (and earlier zones)
+        # win any overlap, matching the original linear scan order
+        merge_rows = range(table.zone_count, len(table))
+        zone_rows = range(table.zone_count)
+        for row in [*reversed(zone_rows), *reversed(merge_rows)]:
+            x_start, x_end = x_lines[table.x[row]], x_lines[table.x[row] + table.width[row] + 1]
+            y_start, y_end = y_lines[table.y[row]], y_lines[table.y[row] + table.height[row] + 1]
+            for grid_row in range(y_start, y_end):
+                offset = grid_row * columns
+                self.cells[offset + x_start:offset + x_end] = array('i', [row]) * (x_end - x_start)
+
+        # (x_min, x_max, y_min, y_max, row) of the last resolved cell
+        self.last_hit = None
+
+    def find(self, x, y) -> int:
+        last_hit = self.last_hit
+        if last_hit and last_hit[0] <= x < last_hit[1] and last_hit[2] <= y < last_hit[3]:
+            return last_hit[4]
+
+        column = bisect_right(self.xs, x) - 1
+        grid_row = bisect_right(self.ys, y) - 1
+        if not (0 <= column < self.columns and 0 <= grid_row < len(self.ys) - 1):
+            return NO_ROW
+
+        row = self.cells[grid_row * self.columns + column]
+        self.last_hit = (self.xs[column], self.xs[column + 1], self.ys[grid_row], self.ys[grid_row + 1], row)
+        return row
 
 
 class ZoneProfile:
-    def __init__(self, zones, merge_zones):
-        self.zones = zones
-        self.merge_zones = merge_zones
+    # A profile is not modified once built, updates produce a new profile which
+    # shares everything (zone tables and indexes) of unchanged desktops, and
+    # desktops with the same work areas share a single table and index
+    def __init__(self, tables: list[ZoneTable], monitors=None, work_areas=None, indexes=None, monitor_zones=None):
+        self.tables = tables
+        self.monitors = monitors
+        self.work_areas = work_areas
+        # get_monitor_zones_key() -> (zones, merge zones) of a single monitor, so
+        # rebuilds can reuse the zones of monitors which didn't change
+        self.monitor_zones = monitor_zones or {}
+
+        indexes_by_table = {}
+        for table, index in zip(tables, indexes or []):
+            if index:
+                indexes_by_table[id(table)] = index
+        self.indexes = []
+        for table in tables:
+            if id(table) not in indexes_by_table:
+                indexes_by_table[id(table)] = ZoneIndex(table)
+            self.indexes.append(indexes_by_table[id(table)])
+
+    @property
+    def zones(self) -> list[list[Zone]]:
+        return [table.zones for table in self.tables]
+
+    @property
+    def merge_zones(self) -> list[list[MergeZone]]:
+        return [table.merge_zones for table in self.tables]
 
     def find_zone(self, virtual_desktop, x, y) -> MergeZone | Zone | None:
-        for zone in self.merge_zones[virtual_desktop]:
-            if zone.check(x, y):
-                return zone
-        for zone in self.zones[virtual_desktop]:
-            if zone.check(x, y):
-                return zone
-        return None
+        if virtual_desktop >= len(self.indexes):
+            # A desktop added since the profile was built has no zones (yet)
+            return None
+        start = time.perf_counter()
+        row = self.indexes[virtual_desktop].find(x, y)
+        zone = self.tables[virtual_desktop].get_zone(row) if row != NO_ROW else None
+        FIND_ZONE_TIME.record(time.perf_counter() - start)
+        return zone
 
     @staticmethod
-    def get_zones_for_monitor_work_area(monitor, work_area, zone_spec) -> list[Zone]:
-        zones = []
-
+    def get_monitor_orientation(monitor) -> str:
         # the crtc_info rotation is set differently in some environments than others
         # whilst it should represent monitor rotations, it may not always (for example,
         # a virtual machine may represent monitors with portrait resolutions but a
         # landscape 'rotation' value)
         #
         # so this will infer orientation by resoluion rather than relying on 'rotation'
-        monitor_orientation = 'landscape' if monitor['width'] >= monitor['height'] else 'portrait'
-        #monitor_orientation = 'landscape' if monitor['rotation'] in (1, 4) else 'portrait'
+        return 'landscape' if monitor['width'] >= monitor['height'] else 'portrait'
+        #return 'landscape' if monitor['rotation'] in (1, 4) else 'portrait'
+
+    @staticmethod
+    def get_zones_for_monitor_work_area(monitor, work_area, zone_spec) -> list[Zone]:
+        # Legacy single row or column displays, see layout.py for nested layouts
+        zones = []
+        monitor_orientation = ZoneProfile.get_monitor_orientation(monitor)
 
 
         # TODO: `monitor_orientation` and provided `orientation` below may mismatch
@@ -79,14 +174,16 @@ class ZoneProfile:
 
 
     @staticmethod
-    def get_merge_zones_for_zones_work_area(zones: list[Zone], work_area: WorkArea) -> list[MergeZone]:
+    def get_merge_zones_for_zones_work_area(zones: list[Zone], work_area: WorkArea,
+                                            settings: SettingsSnapshot | None = None) -> list[MergeZone]:
         merge_zones = []
         num_zones = len(zones)
 
-        if not SETTINGS.merge_zone_size_preference or num_zones == 0:
+        merge_zone_size_preference = (settings or SETTINGS.snapshot).merge_zone_size_preference
+        if not merge_zone_size_preference or num_zones == 0:
             return merge_zones
 
-        merge_zone_size_multiplier = max(2, min(SETTINGS.merge_zone_size_preference, 25)) / 100
+        merge_zone_size_multiplier = max(2, min(merge_zone_size_preference, 25)) / 100
 
         for index, zone in enumerate(zones):
             if index == num_zones - 1:
@@ -120,45 +217,170 @@ class ZoneProfile:
 
 
     @staticmethod
-    def get_zones_per_virtual_desktop(monitors, work_areas):
-        zones = []         # [array of virtual desktops [of arrays of monitors [of array of zones]]]
-        merge_zones = []
-        zone_specification = SETTINGS.zones
+    def get_monitor_zones_key(monitor, work_area, zone_spec, settings: SettingsSnapshot | None = None) -> tuple:
+        # Everything the zones of a single monitor are derived from, the monitor
+        # itself only contributes its orientation
+        return (
+            monitor['width'] >= monitor['height'],
+            work_area,
+            json.dumps(zone_spec, sort_keys=True),
+            (settings or SETTINGS.snapshot).merge_zone_size_preference,
+        )
 
-        for desktop in range(len(work_areas)):
-            desktop_zones = []
-            desktop_merge_zones = []
-            single_workarea = len(work_areas[desktop]) == 1
+
+    @staticmethod
+    def get_used_monitor_zones(monitors, work_areas: list[list[WorkArea]], monitor_zones: dict,
+                               settings: SettingsSnapshot) -> dict:
+        # The entries of monitor_zones some desktop is still built from, the same
+        # entries get_zones_per_virtual_desktop() would have carried over
+        displays = settings.zones['displays']
+        used_keys = set()
+        for desktop_work_areas in set(map(tuple, work_areas)):
+            single_workarea = len(desktop_work_areas) == 1
             for monitor in range(len(monitors)):
-                work_area = work_areas[desktop][0] if single_workarea else work_areas[desktop][monitor]
-                monitor_zones = ZoneProfile.get_zones_for_monitor_work_area(
-                    monitors[monitor],
-                    work_area,
-                    zone_specification['displays'][monitor]
+                work_area = desktop_work_areas[0] if single_workarea else desktop_work_areas[monitor]
+                used_keys.add(ZoneProfile.get_monitor_zones_key(monitors[monitor], work_area, displays[monitor], settings))
+        return { key: value for key, value in monitor_zones.items() if key in used_keys }
+
+
+    @staticmethod
+    def get_zones_for_desktop(monitors, desktop_work_areas, settings: SettingsSnapshot,
+                              monitor_zones=None, previous_monitor_zones=None) -> tuple[list[Zone], list[MergeZone]]:
+        # monitor_zones is filled in with the zones of every monitor (see
+        # ZoneProfile.monitor_zones), reusing previous_monitor_zones where possible
+        if monitor_zones is None:
+            monitor_zones = {}
+        if previous_monitor_zones is None:
+            previous_monitor_zones = {}
+
+        zone_specification = settings.zones
+        if len(zone_specification['displays']) < len(monitors):
+            raise InvalidSettings(
+                f"Invalid value for setting 'zones': {len(zone_specification['displays'])} displays "
+                f"configured for {len(monitors)} monitors"
+            )
+
+        desktop_zones = []
+        desktop_merge_zones = []
+        single_workarea = len(desktop_work_areas) == 1
+        for monitor in range(len(monitors)):
+            work_area = desktop_work_areas[0] if single_workarea else desktop_work_areas[monitor]
+            zone_spec = zone_specification['displays'][monitor]
+
+            key = ZoneProfile.get_monitor_zones_key(monitors[monitor], work_area, zone_spec, settings)
+            if key not in monitor_zones and key in previous_monitor_zones:
+                monitor_zones[key] = previous_monitor_zones[key]
+            elif key not in monitor_zones and layout.is_layout_spec(zone_spec):
+                compiled = layout.compile_layout(
+                    work_area, zone_spec, ZoneProfile.get_monitor_orientation(monitors[monitor]),
+                    settings.merge_zone_size_preference
                 )
-                desktop_zones += monitor_zones
-                desktop_merge_zones += ZoneProfile.get_merge_zones_for_zones_work_area(monitor_zones, work_area)
+                monitor_zones[key] = (list(compiled.zones), list(compiled.merge_zones))
+            elif key not in monitor_zones:
+                zones = ZoneProfile.get_zones_for_monitor_work_area(monitors[monitor], work_area, zone_spec)
+                monitor_zones[key] = (zones, ZoneProfile.get_merge_zones_for_zones_work_area(zones, work_area, settings))
+
+            zones, merge_zones = monitor_zones[key]
+            desktop_zones += zones
+            desktop_merge_zones += merge_zones
+
+        return desktop_zones, desktop_merge_zones
+
+
+    def with_work_areas(self, changed_work_areas: dict[int, list[WorkArea]]) -> 'ZoneProfile':
+        # Only desktops whose work areas actually differ are rebuilt, everything
+        # else (including the spatial index) is carried over as is
+        tables = list(self.tables)
+        work_areas = list(self.work_areas)
+        indexes = list(self.indexes)
+        monitor_zones = dict(self.monitor_zones)
+        settings = SETTINGS.snapshot
+        rebuilt = False
+
+        for desktop, desktop_work_areas in sorted(changed_work_areas.items()):
+            if desktop < len(work_areas) and work_areas[desktop] == desktop_work_areas:
+                continue
+            if desktop > len(work_areas):
+                logging.warning(f"Ignoring work areas of unknown desktop {desktop}")
+                continue
 
-            zones.append(desktop_zones)
-            merge_zones.append(desktop_merge_zones)
+            logging.info(f"Rebuilding zones of desktop {desktop}")
+            rebuilt = True
+            shared = next((other for other in range(len(work_areas)) if work_areas[other] == desktop_work_areas), None)
+            if shared is not None:
+                table, index = tables[shared], indexes[shared]
+            else:
+                table, index = ZoneTable.from_zones(*ZoneProfile.get_zones_for_desktop(
+                    self.monitors, desktop_work_areas, settings, monitor_zones
+                )), None
+
+            if desktop == len(work_areas):
+                tables.append(table)
+                work_areas.append(desktop_work_areas)
+                indexes.append(index)
+            else:
+                tables[desktop] = table
+                work_areas[desktop] = desktop_work_areas
+                indexes[desktop] = index
+
+        # Work areas which changed leave the zones built for them behind
+        if rebuilt:
+            monitor_zones = ZoneProfile.get_used_monitor_zones(self.monitors, work_areas, monitor_zones, settings)
+        return ZoneProfile(tables, self.monitors, work_areas, indexes, monitor_zones)
+
+
+    def with_layout(self, monitors, work_areas: list[list[WorkArea]]) -> 'ZoneProfile':
+        if monitors != self.monitors:
+            # Monitors which kept their geometry (and so their work areas) reuse
+            # their previous zones, only changed monitors are recomputed
+            return ZoneProfile.get_zones_per_virtual_desktop(monitors, work_areas, self.monitor_zones)
+
+        profile = self.with_work_areas(dict(enumerate(work_areas)))
+        if len(work_areas) < len(profile.tables):
+            # Desktops were removed
+            count = len(work_areas)
+            profile = ZoneProfile(
+                profile.tables[:count], monitors, profile.work_areas[:count], profile.indexes[:count],
+                ZoneProfile.get_used_monitor_zones(monitors, work_areas, profile.monitor_zones, SETTINGS.snapshot)
+            )
+        return profile
+
+
+    @staticmethod
+    def get_zones_per_virtual_desktop(monitors, work_areas, previous_monitor_zones=None,
+                                      settings: SettingsSnapshot | None = None):
+        # settings defaults to the current snapshot, a candidate snapshot can be
+        # passed to build (and so validate) zones before the snapshot is swapped
+        tables = []  # [array of virtual desktops [of zone tables]]
+        settings = settings or SETTINGS.snapshot
+
+        # Only entries of previous_monitor_zones which are actually used are carried over
+        monitor_zones = {}
+        tables_by_work_areas = {}
+        for desktop in range(len(work_areas)):
+            key = tuple(work_areas[desktop])
+            if key not in tables_by_work_areas:
+                tables_by_work_areas[key] = ZoneTable.from_zones(*ZoneProfile.get_zones_for_desktop(
+                    monitors, work_areas[desktop], settings, monitor_zones, previous_monitor_zones
+                ))
+            tables.append(tables_by_work_areas[key])
 
 
         logging.info("************************************************************")
         logging.info("  zones:")
-        for desktop in range(0, len(zones)):
+        for desktop in range(0, len(tables)):
             logging.info(f"  desktop {desktop}:")
-            for zone in zones[desktop]:
+            for zone in tables[desktop].zones:
                 logging.info(f"\t{zone=}")
         logging.info("************************************************************")
         """
         logging.info("************************************************************")
         logging.info("  merge_zones:")
-        for desktop in range(0, len(merge_zones)):
+        for desktop in range(0, len(tables)):
             logging.info(f"  desktop {desktop}:")
-            for merge_zone in merge_zones[desktop]:
+            for merge_zone in tables[desktop].merge_zones:
                 logging.info(f"\t{merge_zone=}")
         logging.info("************************************************************")
         """
 
-        return ZoneProfile(zones, merge_zones)
-
+        return ZoneProfile(tables, monitors, work_areas, monitor_zones=monitor_zones)
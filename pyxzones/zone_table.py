@@ -0,0 +1,144 @@
+from array import array
+
+from .types import MergeZone, Zone
+
+"""
+
+Zones and merge zones of a single virtual desktop, stored as one array per
+column rather than as a list of Zone objects
+
+Rows [0, zone_count) are zones, the rest are merge zones, which reference the
+two zones they merge by row (first, second) and carry the surface snapped to.
+The Zone and MergeZone objects the overlay and snapping work with are only
+materialized when first asked for, once per table, and desktops with the same
+work areas share a table (see ZoneProfile)
+
+"""
+
+ORIENTATIONS = ('landscape', 'portrait')
+
+KIND_ZONE = 0
+KIND_MERGE_ZONE = 1
+
+NO_ROW = -1
+
+# name -> array typecode, in the order the columns are stored (see profile_cache)
+COLUMNS = {
+    'x':              'i',
+    'y':              'i',
+    'width':          'i',
+    'height':         'i',
+    'kind':           'b',
+    'orientation':    'b',
+    'first':          'i',  # zone rows of a merge zone, NO_ROW for zones
+    'second':         'i',
+    'surface_x':      'i',  # surface of a merge zone, 0 for zones
+    'surface_y':      'i',
+    'surface_width':  'i',
+    'surface_height': 'i',
+}
+
+
+class ZoneTable:
+    # Not modified once built, updates produce a new table
+    __slots__ = tuple(COLUMNS) + ('zone_count', '_zones', '_merge_zones')
+
+    def __init__(self, columns: dict[str, array], zone_count: int):
+        for name in COLUMNS:
+            setattr(self, name, columns[name])
+        self.zone_count = zone_count
+        self._zones = None
+        self._merge_zones = None
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def get_columns(self) -> dict[str, array]:
+        return { name: getattr(self, name) for name in COLUMNS }
+
+    def validate(self):
+        # For tables read back from elsewhere (see profile_cache), which are
+        # otherwise only indexed into once zones are materialized
+        rows = len(self)
+        if any(len(column) != rows for column in self.get_columns().values()):
+            raise ValueError("Zone table columns differ in length")
+        if not 0 <= self.zone_count <= rows:
+            raise ValueError(f"Zone table has {self.zone_count} zones in {rows} rows")
+        if any(not 0 <= orientation < len(ORIENTATIONS) for orientation in self.orientation):
+            raise ValueError("Zone table has an unknown orientation")
+        for row in range(rows):
+            if row < self.zone_count:
+                if self.kind[row] != KIND_ZONE:
+                    raise ValueError(f"Zone table row {row} should be a zone")
+            elif self.kind[row] != KIND_MERGE_ZONE:
+                raise ValueError(f"Zone table row {row} should be a merge zone")
+            elif not (0 <= self.first[row] < self.zone_count and 0 <= self.second[row] < self.zone_count):
+                raise ValueError(f"Merge zone in row {row} references zones outside of the table")
+
+    @staticmethod
+    def from_zones(zones: list[Zone], merge_zones: list[MergeZone]) -> 'ZoneTable':
+        columns = { name: array(typecode) for name, typecode in COLUMNS.items() }
+        rows = {}
+        for row, zone in enumerate(zones):
+            rows.setdefault(zone, row)
+            ZoneTable.append_row(
+                columns, zone, KIND_ZONE, NO_ROW, NO_ROW, Zone(0, 0, 0, 0, zone.orientation)
+            )
+        for merge_zone in merge_zones:
+            ZoneTable.append_row(
+                columns, merge_zone, KIND_MERGE_ZONE,
+                rows[merge_zone.zones[0]], rows[merge_zone.zones[1]], merge_zone.surface
+            )
+        return ZoneTable(columns, len(zones))
+
+    @staticmethod
+    def append_row(columns: dict[str, array], zone: Zone, kind: int, first: int, second: int, surface: Zone):
+        for name, value in (
+            ('x', zone.x), ('y', zone.y), ('width', zone.width), ('height', zone.height),
+            ('kind', kind), ('orientation', ORIENTATIONS.index(zone.orientation)),
+            ('first', first), ('second', second),
+            ('surface_x', surface.x), ('surface_y', surface.y),
+            ('surface_width', surface.width), ('surface_height', surface.height),
+        ):
+            columns[name].append(value)
+
+    @property
+    def zones(self) -> list[Zone]:
+        # Materialized racily at worst, which only builds equal zones twice
+        if self._zones is None:
+            count = self.zone_count
+            self._zones = [
+                Zone(x, y, width, height, ORIENTATIONS[orientation])
+                for x, y, width, height, orientation in zip(
+                    self.x[:count], self.y[:count], self.width[:count], self.height[:count],
+                    self.orientation[:count]
+                )
+            ]
+        return self._zones
+
+    @property
+    def merge_zones(self) -> list[MergeZone]:
+        if self._merge_zones is None:
+            zones = self.zones
+            merge_zones = []
+            for row in range(self.zone_count, len(self)):
+                orientation = ORIENTATIONS[self.orientation[row]]
+                merge_zones.append(MergeZone(
+                    self.x[row], self.y[row], self.width[row], self.height[row], orientation,
+                    zones=(zones[self.first[row]], zones[self.second[row]]),
+                    surface=Zone(
+                        self.surface_x[row], self.surface_y[row],
+                        self.surface_width[row], self.surface_height[row], orientation
+                    ),
+                ))
+            self._merge_zones = merge_zones
+        return self._merge_zones
+
+    def get_zone(self, row: int) -> Zone | MergeZone:
+        if row < self.zone_count:
+            return self.zones[row]
+        return self.merge_zones[row - self.zone_count]
+
+
+# Zones of a desktop nothing is known about (yet), see Service.ZoneState
+EMPTY_ZONE_TABLE = ZoneTable.from_zones([], [])
@@ -0,0 +1,118 @@
+import pytest
+from Xlib import X, XK
+from Xlib.protocol import event
+
+from pyxzones.fakewm import FakeWindowManager
+from pyxzones.service import Service
+from pyxzones.settings import SETTINGS
+from pyxzones.trace import CountingSnapExecutor, NullZoneDisplay
+from pyxzones.zone_profile import ZoneProfile
+
+KEYCODE = 10  # bound to the first keybinding by the wm fixture
+
+
+def get_zone_configuration(monitors: int) -> dict:
+    return {
+        "zones": {
+            "displays": [{ "orientation": "landscape", "columns": [ 10, 80, 10 ] }] * monitors
+        }
+    }
+
+
+def get_pointer_event(event_class, root_x, root_y, detail=0):
+    return event_class(
+        time=0, root=0, window=0, same_screen=1, child=0, state=0, detail=detail,
+        root_x=root_x, root_y=root_y, event_x=root_x, event_y=root_y,
+    )
+
+
+@pytest.fixture
+def load_settings():
+    # Loads a user configuration for the test, the configuration in place
+    # before is restored afterwards
+    user_configuration = SETTINGS.user_configuration
+
+    def load(configuration: dict):
+        SETTINGS.load(configuration)
+        return SETTINGS.snapshot
+
+    yield load
+    SETTINGS.load(user_configuration or {})
+
+
+@pytest.fixture
+def load_zone_settings(load_settings):
+    # [10, 80, 10] columns on every one of the given number of monitors
+    return lambda monitors: load_settings(get_zone_configuration(monitors))
+
+
+@pytest.fixture
+def settings(load_zone_settings):
+    return load_zone_settings(2)
+
+
+@pytest.fixture
+def pointer_event():
+    return get_pointer_event
+
+
+@pytest.fixture
+def wm_options() -> dict:
+    # Overridden by tests running against other window managers
+    return {}
+
+
+@pytest.fixture
+def wm(settings, wm_options):
+    wm = FakeWindowManager(**({ "monitors": 2, "desktops": 2, "windows": 20 } | wm_options))
+    wm.keysyms = { KEYCODE: XK.string_to_keysym(settings.keybindings[0]) }
+    return wm
+
+
+class RecordingScheduler:
+    # Stands in for the DebounceScheduler, tasks are recorded rather than run
+    def __init__(self):
+        self.scheduled = []  # (key, callback, args)
+
+    def schedule(self, key, delay, callback, *args, **options):
+        self.scheduled.append((key, callback, args))
+
+    def cancel(self, key) -> bool:
+        pending = self.is_pending(key)
+        self.scheduled = [task for task in self.scheduled if task[0] != key]
+        return pending
+
+    def is_pending(self, key) -> bool:
+        return key in self.get_keys()
+
+    def get_keys(self) -> list:
+        return [key for key, _, _ in self.scheduled]
+
+
+@pytest.fixture
+def scheduler():
+    return RecordingScheduler()
+
+
+@pytest.fixture
+def service(wm, scheduler):
+    return Service(
+        ewmh=wm.create_ewmh(),
+        zone_profile=ZoneProfile.get_zones_per_virtual_desktop(wm.monitors, wm.work_areas),
+        zone_window=NullZoneDisplay(),
+        snap_executor=CountingSnapExecutor(),
+        scheduler=scheduler,
+    )
+
+
+@pytest.fixture
+def press_keybinding(service):
+    return lambda: service.process_event(get_pointer_event(event.KeyPress, 0, 0, KEYCODE))
+
+
+@pytest.fixture
+def start_drag(service, press_keybinding):
+    def start_drag(x=100, y=100):
+        press_keybinding()
+        service.process_event(get_pointer_event(event.ButtonPress, x, y, X.Button1))
+    return start_drag
@@ -0,0 +1,36 @@
+import pytest
+from Xlib import X
+from Xlib.protocol import event
+
+from pyxzones.service import coalesce_motion_events
+
+
+@pytest.fixture
+def motion(pointer_event):
+    return lambda x, y: pointer_event(event.MotionNotify, x, y)
+
+
+def test_run_of_motion_keeps_only_the_latest(motion):
+    events = [motion(step, step) for step in range(10)]
+    assert coalesce_motion_events(events) == [events[-1]]
+
+
+def test_transitions_break_runs_and_keep_their_order(motion, pointer_event):
+    press = pointer_event(event.ButtonPress, 5, 5, X.Button1)
+    key = pointer_event(event.KeyPress, 6, 6, 10)
+    release = pointer_event(event.ButtonRelease, 9, 9, X.Button1)
+    events = [
+        motion(0, 0), motion(1, 1), press,
+        motion(2, 2), key, motion(3, 3), motion(4, 4),
+        release, motion(5, 5),
+    ]
+    assert coalesce_motion_events(events) == [events[1], press, events[3], key, events[6], release, events[8]]
+
+
+def test_nothing_to_coalesce(motion, pointer_event):
+    press = pointer_event(event.ButtonPress, 5, 5, X.Button1)
+    release = pointer_event(event.ButtonRelease, 5, 5, X.Button1)
+    assert coalesce_motion_events([]) == []
+    assert coalesce_motion_events([press, release]) == [press, release]
+    single = motion(1, 1)
+    assert coalesce_motion_events([single]) == [single]
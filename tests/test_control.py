@@ -0,0 +1,39 @@
+import os
+import stat
+
+import pytest
+
+from pyxzones import control
+from pyxzones.control import ControlServer
+
+
+def get_umask() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+@pytest.fixture
+def socket_file(tmp_path, monkeypatch):
+    socket_file = tmp_path / control.SOCKET_FILE
+    monkeypatch.setattr(control, 'get_socket_file_path', lambda: socket_file)
+    return socket_file
+
+
+def test_socket_is_owner_only(service, socket_file):
+    umask = get_umask()
+    assert ControlServer(service).start()
+
+    assert stat.S_IMODE(socket_file.stat().st_mode) == 0o600
+    assert get_umask() == umask
+    response = control.send_command("status")
+    assert response["ok"] and response["desktops"] == 2
+
+
+def test_failed_bind_raises_and_restores_the_umask(service, tmp_path, monkeypatch):
+    monkeypatch.setattr(control, 'get_socket_file_path', lambda: tmp_path / 'missing' / control.SOCKET_FILE)
+    umask = get_umask()
+
+    with pytest.raises(OSError):
+        ControlServer(service).start()
+    assert get_umask() == umask
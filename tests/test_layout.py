@@ -0,0 +1,84 @@
+import random
+
+import pytest
+
+from pyxzones import layout
+from pyxzones.settings import SETTINGS
+from pyxzones.types import WorkArea
+from pyxzones.zone_profile import ZoneProfile
+
+MERGE_ZONE_SIZE_PREFERENCES = [0, 2, 10, 25]
+
+LANDSCAPE_MONITOR = { 'width': 1920, 'height': 1080 }
+PORTRAIT_MONITOR = { 'width': 1080, 'height': 1920 }
+
+
+def get_legacy_specs():
+    rng = random.Random(0)
+    specs = [
+        { 'orientation': 'landscape', 'columns': [1] },
+        { 'orientation': 'landscape', 'columns': [10, 80, 10] },
+        { 'orientation': 'landscape', 'columns': [1, 1, 1] },
+        { 'orientation': 'portrait', 'rows': [1, 2] },
+        { 'orientation': 'portrait', 'rows': [33.3, 33.3, 33.4] },
+    ]
+    for _ in range(10):
+        orientation = rng.choice(['landscape', 'portrait'])
+        weights = [rng.choice([rng.randint(1, 100), round(rng.uniform(0.1, 10), 2)]) for _ in range(rng.randint(1, 6))]
+        specs.append({ 'orientation': orientation, 'columns' if orientation == 'landscape' else 'rows': weights })
+    return specs
+
+
+def get_work_areas():
+    return [
+        WorkArea(0, 0, 1920, 1080),
+        WorkArea(0, 27, 1920, 1053),
+        WorkArea(1920, 0, 1080, 1920),
+        WorkArea(2560, 31, 2509, 1409),
+    ]
+
+
+def as_layout(legacy_spec: dict) -> dict:
+    key = 'columns' if legacy_spec['orientation'] == 'landscape' else 'rows'
+    return { 'layout': { key: list(legacy_spec[key]) } }
+
+
+@pytest.mark.parametrize("legacy_spec", get_legacy_specs(), ids=str)
+@pytest.mark.parametrize("work_area", get_work_areas(), ids=str)
+@pytest.mark.parametrize("monitor", [LANDSCAPE_MONITOR, PORTRAIT_MONITOR], ids=['landscape', 'portrait'])
+@pytest.mark.parametrize("merge_zone_size_preference", MERGE_ZONE_SIZE_PREFERENCES)
+def test_legacy_spec_as_layout_compiles_to_identical_zones(legacy_spec, work_area, monitor, merge_zone_size_preference):
+    settings = SETTINGS.prepare({ 'merge_zone_size_preference': merge_zone_size_preference })
+    zones = ZoneProfile.get_zones_for_monitor_work_area(monitor, work_area, legacy_spec)
+    merge_zones = ZoneProfile.get_merge_zones_for_zones_work_area(zones, work_area, settings)
+
+    layout.validate_layout_spec(as_layout(legacy_spec))
+    compiled = layout.compile_layout(
+        work_area, as_layout(legacy_spec), ZoneProfile.get_monitor_orientation(monitor), merge_zone_size_preference
+    )
+
+    assert list(compiled.zones) == zones
+    # Legacy merge zones follow the monitor orientation rather than the spec's,
+    # and only line up with the zones when both agree
+    if legacy_spec['orientation'] == ZoneProfile.get_monitor_orientation(monitor):
+        assert list(compiled.merge_zones) == merge_zones
+
+
+def test_adjacent_merge_zones_of_a_grid():
+    work_area = WorkArea(0, 0, 1000, 1000)
+    compiled = layout.compile_layout(work_area, { 'layout': { 'rows': [{ 'columns': [1, 1] }, 1] } }, 'landscape', 10)
+
+    top_left, top_right, bottom = compiled.zones
+    assert [merge_zone.zones for merge_zone in compiled.merge_zones] == [
+        (top_left, top_right), (top_left, bottom), (top_right, bottom)
+    ]
+    # Along the shared edge only, as wide as a legacy merge zone across the work area
+    assert [(merge_zone.x, merge_zone.y, merge_zone.width, merge_zone.height) for merge_zone in compiled.merge_zones] == [
+        (450, 0, 100, 500), (0, 450, 500, 100), (500, 450, 500, 100)
+    ]
+    assert compiled.merge_zones[0].surface == layout.get_bounding_zone(top_left, top_right)
+
+
+def test_invalid_layout_is_rejected():
+    with pytest.raises(layout.LayoutError):
+        layout.validate_layout_spec({ 'layout': { 'columns': [] } })
@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+from pyxzones.metrics import (
+    BUCKET_COUNT, MAX_VALUE, SUB_BUCKET_COUNT, SUB_BUCKET_HALF,
+    Histogram, LabeledCounter, get_bucket_index, get_bucket_value,
+)
+
+
+def get_values():
+    rng = random.Random(0)
+    values = list(range(0, 4 * SUB_BUCKET_COUNT))
+    for bits in range(8, 41):
+        values += [(1 << bits) - 1, 1 << bits, (1 << bits) + 1, rng.randrange(1 << (bits - 1), 1 << bits)]
+    return sorted(set(value for value in values if value <= MAX_VALUE))
+
+
+def test_exact_below_sub_bucket_count():
+    for value in range(SUB_BUCKET_COUNT):
+        assert get_bucket_index(value) == value
+        assert get_bucket_value(value) == value
+
+
+def test_indexes_are_monotonic_and_in_range():
+    indexes = [get_bucket_index(value) for value in get_values()]
+    assert indexes == sorted(indexes)
+    assert all(0 <= index < BUCKET_COUNT for index in indexes)
+    assert get_bucket_index(MAX_VALUE) == BUCKET_COUNT - 1
+
+
+def test_values_past_the_range_land_in_the_last_bucket():
+    assert get_bucket_index(MAX_VALUE + 1) == BUCKET_COUNT - 1
+    assert get_bucket_index(MAX_VALUE * 1000) == BUCKET_COUNT - 1
+
+
+def test_bucket_value_is_within_relative_error():
+    # Buckets above the exact range are 1/64 of their power of two wide, and
+    # report their middle
+    for value in get_values():
+        bucket_value = get_bucket_value(get_bucket_index(value))
+        assert abs(bucket_value - value) <= value / (2 * SUB_BUCKET_HALF), value
+
+
+def test_bucket_values_round_trip():
+    for index in range(BUCKET_COUNT):
+        assert get_bucket_index(get_bucket_value(index)) == index
+
+
+def test_adjacent_buckets_are_contiguous():
+    # The first value of every bucket is one past the last of the previous
+    previous = get_bucket_index(SUB_BUCKET_COUNT - 1)
+    for value in range(SUB_BUCKET_COUNT, 1 << 14):
+        index = get_bucket_index(value)
+        assert index in (previous, previous + 1)
+        previous = index
+
+
+@pytest.mark.parametrize("percentile", [50, 90, 99, 99.9])
+def test_percentiles(percentile):
+    histogram = Histogram()
+    values = [microseconds * 1000 for microseconds in range(1, 10001)]
+    random.Random(0).shuffle(values)
+    for value in values:
+        histogram.record(value / 1_000_000_000)
+
+    expected = sorted(values)[int(len(values) * percentile / 100) - 1]
+    assert histogram.get_percentile(percentile) == pytest.approx(expected, rel=1 / SUB_BUCKET_HALF)
+    assert histogram.count == len(values)
+    assert histogram.max == max(values)
+
+
+def test_percentile_never_exceeds_max():
+    histogram = Histogram()
+    histogram.record(0.000_001_000)
+    assert histogram.get_percentile(99.9) == histogram.max == 1000
+    assert Histogram().get_percentile(50) == 0
+    assert Histogram().to_dict()["mean_ns"] == 0
+
+
+def test_labeled_counter():
+    counter = LabeledCounter()
+    counter.increment("dropped")
+    counter.increment("dropped", 2)
+    counter.increment(3)
+    assert counter.to_dict() == { "dropped": 3, "3": 1 }
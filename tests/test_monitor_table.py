@@ -0,0 +1,130 @@
+import pytest
+from Xlib import X
+from Xlib.display import Display
+from Xlib.ext import randr
+from Xlib.protocol import event, rq
+
+from pyxzones.fakewm import FakeWindowManager
+from pyxzones.monitor_table import MonitorTable, get_randr_event_codes
+
+FIRST_EVENT = 89
+
+
+class ExtensionDisplay:
+    # Just enough of a Display for python-xlib's own extension_add_event() and
+    # extension_add_subevent() to register RandR events the way randr.init() does
+    class ProtocolDisplay:
+        def __init__(self):
+            self.event_classes = {}
+
+        def add_extension_event(self, code, event_class, subcode=None):
+            if subcode is None:
+                self.event_classes[code] = event_class
+            else:
+                self.event_classes.setdefault(code, {})[subcode] = event_class
+
+    def __init__(self):
+        self.display = ExtensionDisplay.ProtocolDisplay()
+        self.extension_event = rq.DictWrapper({})
+        Display.extension_add_event(self, FIRST_EVENT + randr.RRScreenChangeNotify, randr.ScreenChangeNotify)
+        for subcode, event_class in (
+            (randr.RRNotify_CrtcChange, randr.CrtcChangeNotify),
+            (randr.RRNotify_OutputChange, randr.OutputChangeNotify),
+            (randr.RRNotify_OutputProperty, randr.OutputPropertyNotify),
+        ):
+            Display.extension_add_subevent(self, FIRST_EVENT + randr.RRNotify, subcode, event_class)
+
+    def get_event_class(self, code, subcode=None):
+        event_class = self.display.event_classes[code]
+        return event_class if subcode is None else event_class[subcode]
+
+
+@pytest.fixture
+def display():
+    return ExtensionDisplay()
+
+
+@pytest.fixture
+def monitor_table():
+    wm = FakeWindowManager(monitors=2)
+    return MonitorTable(wm.monitors, { 1: (1920, 1080), 2: (2560, 1440) })
+
+
+def crtc_change(display, **fields):
+    code = FIRST_EVENT + randr.RRNotify
+    event_class = display.get_event_class(code, randr.RRNotify_CrtcChange)
+    values = dict(sequence_number=0, timestamp=0, window=1, rotation=1, x=0, y=0) | fields
+    return event_class(type=code, sub_code=randr.RRNotify_CrtcChange, **values)
+
+
+def output_change(display, **fields):
+    code = FIRST_EVENT + randr.RRNotify
+    event_class = display.get_event_class(code, randr.RRNotify_OutputChange)
+    values = dict(
+        sequence_number=0, timestamp=0, config_timestamp=0, window=1, mode=1, rotation=1,
+        connection=0, subpixel_order=0
+    ) | fields
+    return event_class(type=code, sub_code=randr.RRNotify_OutputChange, **values)
+
+
+def test_registered_events_are_clones(display):
+    # Why events are told apart by code: the classes python-xlib hands out are
+    # not those of Xlib.ext.randr
+    event_class = display.get_event_class(FIRST_EVENT + randr.RRNotify, randr.RRNotify_CrtcChange)
+    assert event_class is not randr.CrtcChangeNotify
+    assert not issubclass(event_class, randr.CrtcChangeNotify)
+
+
+def test_event_codes(display):
+    assert get_randr_event_codes(display) == {
+        (FIRST_EVENT + randr.RRScreenChangeNotify, None): 'ScreenChangeNotify',
+        (FIRST_EVENT + randr.RRNotify, randr.RRNotify_CrtcChange): 'CrtcChangeNotify',
+        (FIRST_EVENT + randr.RRNotify, randr.RRNotify_OutputChange): 'OutputChangeNotify',
+    }
+    # Servers before RandR 1.5 register none
+    display.extension_event = rq.DictWrapper({})
+    assert get_randr_event_codes(display) == {}
+
+
+def test_crtc_change_moves_a_monitor(display, monitor_table):
+    event_codes = get_randr_event_codes(display)
+    assert monitor_table.apply_event(crtc_change(display, crtc=201, mode=2, x=1920, width=2560, height=1440), event_codes)
+
+    monitor = monitor_table.get_monitors()[1]
+    assert (monitor['crtc'], monitor['virtual_width'], monitor['virtual_height']) == (201, 2560, 1440)
+    assert not monitor_table.stale
+
+    # The same geometry again changes nothing
+    assert not monitor_table.apply_event(crtc_change(display, crtc=201, mode=2, x=1920, width=2560, height=1440), event_codes)
+
+
+def test_crtc_disabled_and_output_disconnected(display, monitor_table):
+    event_codes = get_randr_event_codes(display)
+    assert monitor_table.apply_event(crtc_change(display, crtc=200, mode=0, width=0, height=0), event_codes)
+    assert [monitor['crtc'] for monitor in monitor_table.get_monitors()] == [201]
+
+    assert monitor_table.apply_event(output_change(display, output=101, crtc=0), event_codes)
+    assert monitor_table.get_monitors() == []
+
+
+def test_screen_change_marks_the_table_stale(display, monitor_table):
+    code = FIRST_EVENT + randr.RRScreenChangeNotify
+    screen_change = display.get_event_class(code)(
+        type=code, rotation=1, sequence_number=0, timestamp=0, config_timestamp=0, root=1, window=1,
+        size_id=0, subpixel_order=0, width_in_pixels=3840, height_in_pixels=1080,
+        width_in_millimeters=0, height_in_millimeters=0
+    )
+    assert monitor_table.apply_event(screen_change, get_randr_event_codes(display))
+    assert monitor_table.stale
+
+
+def test_other_events_are_not_applied(display, monitor_table):
+    property_notify = event.PropertyNotify(window=1, atom=1, time=0, state=X.PropertyNewValue)
+    assert monitor_table.apply_event(property_notify, get_randr_event_codes(display)) is None
+
+    code = FIRST_EVENT + randr.RRNotify
+    output_property = display.get_event_class(code, randr.RRNotify_OutputProperty)(
+        type=code, sub_code=randr.RRNotify_OutputProperty, sequence_number=0, window=1, output=100,
+        atom=1, timestamp=0, state=0
+    )
+    assert monitor_table.apply_event(output_property, get_randr_event_codes(display)) is None
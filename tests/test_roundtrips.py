@@ -0,0 +1,55 @@
+import pytest
+from Xlib import X
+from Xlib.protocol import event
+
+from pyxzones.roundtrips import ROUND_TRIPS
+from pyxzones.snap import snap_window
+from pyxzones.zone_profile import ZoneProfile
+
+# Round trips per event (or snap) the event path is allowed, anything above
+# is a regression of the work done to keep the RECORD thread from blocking
+BUTTON_PRESS_ROUND_TRIPS = 4  # active window, its coordinates, geometry and extents
+SNAP_ROUND_TRIPS = 1          # frame extents, the move itself is a client message
+SNAP_REQUESTS = 3
+
+
+@pytest.fixture(params=[1, 4], ids=lambda depth: f"reparent_depth={depth}")
+def wm_options(request):
+    # However many frames the WM reparents clients into mustn't show in the budgets
+    return { "reparent_depth": request.param }
+
+
+def test_button_press_round_trips(service, press_keybinding, pointer_event):
+    press_keybinding()
+    with ROUND_TRIPS.expect(round_trips=BUTTON_PRESS_ROUND_TRIPS):
+        service.process_event(pointer_event(event.ButtonPress, 100, 100, X.Button1))
+    assert service.drag_session is not None
+
+
+def test_motion_during_drag_makes_no_round_trips(service, start_drag, pointer_event):
+    start_drag()
+    with ROUND_TRIPS.expect(round_trips=0, requests=0):
+        for step in range(200):
+            service.process_event(pointer_event(event.MotionNotify, 100 + step * 15, 100 + step * 3))
+
+
+def test_button_release_hands_the_snap_off_without_round_trips(service, start_drag, pointer_event):
+    start_drag()
+    service.process_event(pointer_event(event.MotionNotify, 900, 500))
+    with ROUND_TRIPS.expect(round_trips=0, requests=0):
+        service.process_event(pointer_event(event.ButtonRelease, 900, 500, X.Button1))
+    assert len(service.snap_executor.snaps) == 1
+
+
+def test_snap_round_trips(wm, settings):
+    zone = ZoneProfile.get_zones_per_virtual_desktop(wm.monitors, wm.work_areas).zones[0][1]
+    ewmh = wm.create_ewmh()
+    for window in wm.clients:
+        with ROUND_TRIPS.expect(round_trips=SNAP_ROUND_TRIPS, requests=SNAP_REQUESTS):
+            assert snap_window(ewmh, window, zone, settings)
+
+
+def test_expect_fails_over_budget(wm):
+    with pytest.raises(AssertionError, match="round trips"):
+        with ROUND_TRIPS.expect(round_trips=0):
+            wm.create_ewmh().getActiveWindow()
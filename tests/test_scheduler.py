@@ -0,0 +1,55 @@
+import threading
+import time
+
+from pyxzones.scheduler import DebounceScheduler
+
+TIMEOUT = 5.0  # seconds
+SLACK = 0.15   # seconds, of scheduling jitter allowed for
+
+
+def test_burst_runs_once_with_the_latest_arguments():
+    scheduler = DebounceScheduler()
+    runs = []
+    done = threading.Event()
+    def task(value):
+        runs.append(value)
+        done.set()
+
+    for value in range(5):
+        scheduler.schedule("key", 0.05, task, value)
+    assert scheduler.is_pending("key")
+    assert done.wait(TIMEOUT)
+
+    time.sleep(0.1)
+    assert runs == [4]
+    assert not scheduler.is_pending("key")
+
+
+def test_cancelled_task_does_not_run():
+    scheduler = DebounceScheduler()
+    runs = []
+    scheduler.schedule("key", 0.05, runs.append, 1)
+    assert scheduler.cancel("key")
+    assert not scheduler.cancel("key")
+
+    time.sleep(0.15)
+    assert runs == []
+
+
+def test_rescheduling_faster_than_the_delay_runs_by_max_wait():
+    scheduler = DebounceScheduler()
+    delay, max_wait = 0.1, 0.4
+    runs = []
+    done = threading.Event()
+    def task():
+        runs.append(time.monotonic())
+        done.set()
+
+    # A steady stream of events, each well within the delay of the previous one
+    start = time.monotonic()
+    while not done.is_set() and time.monotonic() - start < max_wait + SLACK:
+        scheduler.schedule("key", delay, task, max_wait=max_wait)
+        time.sleep(delay / 4)
+
+    assert done.wait(TIMEOUT)
+    assert max_wait - SLACK <= runs[0] - start <= max_wait + SLACK
@@ -0,0 +1,87 @@
+from Xlib import X
+from Xlib.protocol import event
+
+from pyxzones.zone_profile import ZoneProfile
+from pyxzones.zone_table import EMPTY_ZONE_TABLE
+
+
+def drag_across(service, start_drag, pointer_event):
+    start_drag()
+    for x in range(100, 3800, 100):
+        service.process_event(pointer_event(event.MotionNotify, x, 500))
+    service.process_event(pointer_event(event.ButtonRelease, 3700, 500, X.Button1))
+
+
+def test_switching_to_an_unknown_desktop(service, scheduler, start_drag, pointer_event):
+    # Desktop 2 was added after the last refresh, the profile only has 0 and 1
+    service.set_current_desktop(2)
+
+    state = service.zone_state
+    assert not state.known_desktop
+    assert state.zone_table is EMPTY_ZONE_TABLE
+    assert state.find_zone(500, 500) is None
+    assert ("zones", None) in scheduler.get_keys()
+
+    # Nothing to hover or snap to, but the event path keeps going
+    drag_across(service, start_drag, pointer_event)
+    assert service.snap_executor.snaps == []
+
+
+def test_publishing_a_profile_with_fewer_desktops(service, scheduler, wm, start_drag, pointer_event):
+    service.set_current_desktop(1)
+    assert scheduler.get_keys() == []
+
+    with service.zone_state_lock:
+        service.publish_zone_profile(ZoneProfile.get_zones_per_virtual_desktop(wm.monitors, wm.work_areas[:1]))
+    assert not service.zone_state.known_desktop
+    assert ("zones", None) in scheduler.get_keys()
+    drag_across(service, start_drag, pointer_event)
+    assert service.snap_executor.snaps == []
+
+    # Zones are back once the refresh publishes the desktop again
+    service.update_zone_profile(lambda _: ZoneProfile.get_zones_per_virtual_desktop(wm.monitors, wm.work_areas))
+    assert service.zone_state.known_desktop
+    drag_across(service, start_drag, pointer_event)
+    assert len(service.snap_executor.snaps) == 1
+
+
+def test_publishing_defers_the_profile_cache_save(service, scheduler, wm, monkeypatch):
+    saved = []
+    monkeypatch.setattr("pyxzones.service.profile_cache.save", saved.append)
+
+    for _ in range(3):
+        service.update_zone_profile(lambda _: ZoneProfile.get_zones_per_virtual_desktop(wm.monitors, wm.work_areas))
+    assert saved == []
+    assert scheduler.get_keys() == ["profile_cache"] * 3
+
+    # Run later by the scheduler, saving whatever profile is current by then
+    _, callback, args = scheduler.scheduled[-1]
+    callback(*args)
+    assert saved == [service.zone_state.zone_profile]
+
+
+WORK_AREA_DESKTOPS = [None, 0, 1]  # _NET_WORKAREA, then _GTK_WORKAREAS_D0 and D1
+
+
+def test_per_desktop_refresh_absorbs_net_workarea(service, scheduler):
+    service.monitor_events_supported = True
+    service.schedule_work_area_refresh(1, WORK_AREA_DESKTOPS)
+    service.schedule_work_area_refresh(None, WORK_AREA_DESKTOPS)
+    assert scheduler.get_keys() == [("zones", 1)]
+
+
+def test_net_workarea_refreshes_every_desktop_without_randr_events(service, scheduler):
+    service.monitor_events_supported = False
+    service.schedule_work_area_refresh(1, WORK_AREA_DESKTOPS)
+    service.schedule_work_area_refresh(None, WORK_AREA_DESKTOPS)
+    assert scheduler.get_keys() == [("zones", None)]
+
+    # Covered by the pending refresh of every desktop
+    service.schedule_work_area_refresh(0, WORK_AREA_DESKTOPS)
+    assert scheduler.get_keys() == [("zones", None)]
+
+
+def test_net_workarea_refreshes_every_desktop_without_per_desktop_atoms(service, scheduler):
+    service.monitor_events_supported = True
+    service.schedule_work_area_refresh(None, [None])
+    assert scheduler.get_keys() == [("zones", None)]
@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+from pyxzones import config
+from pyxzones.settings import SETTINGS, InvalidSettings
+
+
+@pytest.mark.parametrize("user_configuration", [
+    [],
+    { 'zones': { 'displays': {} } },
+    { 'zones': { 'displays': [{ 'orientation': 'diagonal', 'columns': [50, 50] }] } },
+    { 'zones': { 'displays': [{ 'orientation': 'landscape', 'columns': [] }] } },
+    { 'zones': { 'displays': [{ 'orientation': 'portrait', 'rows': [50, -50] }] } },
+    { 'keybindings': 'Alt_L' },
+    { 'keybindings': ['Alt_L', 1] },
+    { 'highlight_hover_zone': 1 },
+    { 'zone_border_thickness': '5' },
+    { 'zone_border_inset': True },
+    { 'zone_border_color': [0.4, 0.4, 0.8] },
+    { 'hover_zone_background_color': [0.8, 0.0, 0.6, 'opaque'] },
+    { 'snap_basis_point': 'center' },
+    { 'overlay_mode': 'window' },
+], ids=repr)
+def test_invalid_values_are_rejected(settings, user_configuration):
+    with pytest.raises(InvalidSettings):
+        SETTINGS.prepare(user_configuration)
+    assert SETTINGS.snapshot is settings
+
+
+@pytest.mark.parametrize("name", ['snapshot', 'user_configuration', 'load', 'prepare', 'publish', 'compile'])
+def test_names_of_the_settings_api_are_rejected(settings, name):
+    with pytest.raises(InvalidSettings):
+        SETTINGS.prepare({ name: {} })
+    assert SETTINGS.snapshot is settings
+
+
+def test_unknown_settings_are_ignored(settings):
+    assert SETTINGS.prepare({ 'zone_border_thicknes': 10 }).zone_border_thickness == settings.zone_border_thickness
+
+
+@pytest.fixture
+def write_config_file(tmp_path, monkeypatch):
+    config_file = tmp_path / config.SETTINGS_FILE
+    monkeypatch.setattr(config, 'get_config_file_path', lambda filename: config_file)
+
+    def write(changes: dict):
+        config_file.write_text(json.dumps({ **SETTINGS.user_configuration, **changes }))
+    return write
+
+
+def test_render_only_reload_keeps_the_zones(service, write_config_file):
+    zone_profile = service.zone_state.zone_profile
+    write_config_file({ 'zone_border_thickness': 2, 'hover_zone_border_color': [0.0, 0.0, 0.0, 1.0] })
+
+    assert service.reload_settings() == { 'zone_border_thickness', 'hover_zone_border_color' }
+    assert SETTINGS.snapshot.zone_border_thickness == 2
+    assert service.zone_state.zone_profile is zone_profile
+
+
+def test_zone_reload_rebuilds_the_zones(service, write_config_file):
+    zone_profile = service.zone_state.zone_profile
+    write_config_file({ 'merge_zone_size_preference': 10 })
+
+    assert service.reload_settings() == { 'merge_zone_size_preference' }
+    assert service.zone_state.zone_profile is not zone_profile
+    assert service.zone_state.zone_profile.merge_zones != zone_profile.merge_zones
+
+
+def test_invalid_reload_keeps_the_running_settings(service, settings, write_config_file):
+    zone_profile = service.zone_state.zone_profile
+    write_config_file({ 'zone_border_thickness': 'thick' })
+
+    with pytest.raises(InvalidSettings):
+        service.reload_settings()
+    assert SETTINGS.snapshot is settings
+    assert service.zone_state.zone_profile is zone_profile
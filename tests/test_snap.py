@@ -0,0 +1,45 @@
+import threading
+
+from pyxzones.snap import SnapExecutor
+from pyxzones.types import Zone
+
+TIMEOUT = 5.0  # seconds
+
+
+def get_frame(window):
+    while window.parent is not window.wm.root:
+        window = window.parent
+    return window
+
+
+def test_latest_snap_of_a_window_wins(wm, settings):
+    executor = SnapExecutor(wm.create_ewmh())
+    blocker, window = wm.clients[0], wm.clients[1]
+
+    started, release, snapped = threading.Event(), threading.Event(), threading.Event()
+    results = []
+    def on_completion(result):
+        results.append(result)
+        if result.request.window_id == blocker.id:
+            # Hold the executor thread until every snap of window is queued
+            started.set()
+            release.wait(TIMEOUT)
+        else:
+            snapped.set()
+    executor.add_completion_callback(on_completion)
+
+    executor.submit(blocker, Zone(0, 0, 960, 1050, 'portrait'), settings)
+    assert started.wait(TIMEOUT)
+
+    zones = [Zone(x, 0, 960, 1050, 'portrait') for x in (0, 960, 1920)]
+    for zone in zones:
+        executor.submit(window, zone, settings)
+    release.set()
+    assert snapped.wait(TIMEOUT)
+
+    assert executor.dropped == len(zones) - 1
+    assert [result.request.window_id for result in results] == [blocker.id, window.id]
+    result = results[-1]
+    assert result.succeeded
+    assert result.request.zone == zones[-1]
+    assert (get_frame(window).geometry.x, get_frame(window).geometry.y) == (zones[-1].x, zones[-1].y)
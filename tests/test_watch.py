@@ -0,0 +1,109 @@
+import threading
+
+import pytest
+
+from pyxzones import config, watch
+from pyxzones.watch import ConfigWatcher, InotifyWatcher, PollingWatcher
+
+TIMEOUT = 5.0  # seconds
+QUIET = 0.2    # seconds, without an expected callback
+
+
+class ReloadingService:
+    def __init__(self):
+        self.reloads = 0
+        self.scheduler = None
+
+    def reload_settings(self):
+        self.reloads += 1
+
+
+@pytest.fixture
+def candidates(tmp_path, monkeypatch):
+    # A user and a system configuration file, the user one takes precedence
+    directories = [tmp_path / 'user', tmp_path / 'system']
+    for directory in directories:
+        directory.mkdir()
+    candidates = [directory / config.SETTINGS_FILE for directory in directories]
+    monkeypatch.setattr(config, 'get_config_file_candidates', lambda filename: candidates)
+    return candidates
+
+
+def start(watcher):
+    thread = threading.Thread(target=watcher.run)
+    thread.daemon=True
+    thread.start()
+
+
+def test_polling_state_follows_every_candidate(candidates):
+    watcher = PollingWatcher(candidates, lambda: None)
+    assert watcher.get_state() == [None, None]
+
+    candidates[1].write_text('{}')
+    created = watcher.get_state()
+    assert created[0] is None and created[1] is not None
+
+    candidates[1].write_text('{ "zone_border_thickness": 2 }')
+    assert watcher.get_state() != created
+
+    candidates[1].unlink()
+    assert watcher.get_state() == [None, None]
+
+
+def test_polling_calls_back_on_changes(candidates, monkeypatch):
+    monkeypatch.setattr(watch, 'POLL_INTERVAL', 0.01)
+    changed = threading.Event()
+    watcher = PollingWatcher(candidates, changed.set)
+    start(watcher)
+
+    # Files next to the candidates aren't part of the state
+    (candidates[0].parent / 'other.json').write_text('{}')
+    assert not changed.wait(QUIET)
+
+    candidates[0].write_text('{}')
+    assert changed.wait(TIMEOUT)
+
+
+def test_inotify_only_calls_back_for_the_configured_filenames(candidates):
+    changed = threading.Event()
+    try:
+        watcher = InotifyWatcher([candidate.parent for candidate in candidates], { config.SETTINGS_FILE }, changed.set)
+    except (OSError, AttributeError):
+        pytest.skip("inotify unavailable")
+    start(watcher)
+
+    (candidates[0].parent / 'other.json').write_text('{}')
+    (candidates[1].parent / 'pyxzones.json.swp').write_text('{}')
+    assert not changed.wait(QUIET)
+
+    # Saved through a rename, as many editors do
+    saved = candidates[1].parent / 'pyxzones.json.tmp'
+    saved.write_text('{}')
+    saved.rename(candidates[1])
+    assert changed.wait(TIMEOUT)
+
+
+def test_reload_only_when_the_effective_configuration_changed(candidates):
+    service = ReloadingService()
+    candidates[1].write_text('{}')
+    watcher = ConfigWatcher(service)
+
+    # Saved without changes
+    candidates[1].write_text('{}')
+    watcher.reload()
+    assert service.reloads == 0
+
+    candidates[1].write_text('{ "zone_border_thickness": 2 }')
+    watcher.reload()
+    assert service.reloads == 1
+
+    # Same content, but now in a location of higher precedence
+    candidates[0].write_text('{ "zone_border_thickness": 2 }')
+    watcher.reload()
+    assert service.reloads == 2
+
+    candidates[0].unlink()
+    candidates[1].unlink()
+    watcher.reload()
+    assert service.reloads == 3
+    assert watcher.fingerprint == (None, None)
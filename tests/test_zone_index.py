@@ -0,0 +1,85 @@
+import random
+
+import pytest
+
+from pyxzones.fakewm import FakeWindowManager
+from pyxzones.types import MergeZone, Zone
+from pyxzones.zone_profile import ZoneIndex, ZoneProfile
+from pyxzones.zone_table import NO_ROW, ZoneTable
+
+
+def find_zone_linearly(zones, merge_zones, x, y):
+    # The scan ZoneIndex replaces: merge zones win over zones, earlier over later
+    for zone in [*merge_zones, *zones]:
+        if zone.check(x, y):
+            return zone
+    return None
+
+
+def get_random_table(rng: random.Random) -> ZoneTable:
+    zones = [
+        Zone(rng.randint(-50, 400), rng.randint(-50, 400), rng.randint(0, 200), rng.randint(0, 200), 'landscape')
+        for _ in range(rng.randint(1, 8))
+    ]
+    merge_zones = []
+    for _ in range(rng.randint(0, 4)):
+        first, second = rng.choice(zones), rng.choice(zones)
+        merge_zones.append(MergeZone(
+            rng.randint(-50, 400), rng.randint(-50, 400), rng.randint(0, 60), rng.randint(0, 60), 'landscape',
+            zones=(first, second), surface=first
+        ))
+    return ZoneTable.from_zones(zones, merge_zones)
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_find_matches_linear_scan(seed):
+    rng = random.Random(seed)
+    table = get_random_table(rng)
+    index = ZoneIndex(table)
+
+    points = [(rng.randint(-60, 660), rng.randint(-60, 660)) for _ in range(300)]
+    # Every edge and the pixels either side of it, where off by ones would show
+    for row in range(len(table)):
+        for x in (table.x[row], table.x[row] + table.width[row]):
+            for y in (table.y[row], table.y[row] + table.height[row]):
+                points += [(x + dx, y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+
+    for x, y in points:
+        row = index.find(x, y)
+        zone = table.get_zone(row) if row != NO_ROW else None
+        assert zone == find_zone_linearly(table.zones, table.merge_zones, x, y), (x, y)
+
+
+def test_find_reuses_the_last_cell():
+    table = ZoneTable.from_zones([Zone(0, 0, 100, 100, 'landscape'), Zone(101, 0, 100, 100, 'landscape')], [])
+    index = ZoneIndex(table)
+
+    assert index.find(10, 10) == 0
+    last_hit = index.last_hit
+    assert last_hit[0] <= 50 < last_hit[1] and last_hit[2] <= 50 < last_hit[3]
+    assert index.find(50, 50) == 0
+    assert index.last_hit is last_hit
+
+    assert index.find(150, 50) == 1
+    assert index.last_hit is not last_hit
+
+
+def test_find_outside_of_every_zone():
+    index = ZoneIndex(ZoneTable.from_zones([Zone(10, 10, 10, 10, 'landscape')], []))
+    assert index.find(0, 0) == NO_ROW
+    assert index.find(21, 15) == NO_ROW
+    assert index.find(15, 1000) == NO_ROW
+    assert ZoneIndex(ZoneTable.from_zones([], [])).find(0, 0) == NO_ROW
+
+
+def test_profile_find_zone_matches_linear_scan(load_zone_settings):
+    load_zone_settings(3)
+    wm = FakeWindowManager(monitors=3, desktops=2)
+    profile = ZoneProfile.get_zones_per_virtual_desktop(wm.monitors, wm.work_areas)
+    rng = random.Random(0)
+    for desktop in range(len(profile.tables)):
+        for _ in range(500):
+            x, y = rng.randrange(0, 1920 * 3), rng.randrange(0, 1080)
+            assert profile.find_zone(desktop, x, y) == find_zone_linearly(
+                profile.zones[desktop], profile.merge_zones[desktop], x, y
+            )
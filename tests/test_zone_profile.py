@@ -0,0 +1,81 @@
+import pytest
+
+from pyxzones.fakewm import FakeWindowManager
+from pyxzones.types import WorkArea
+from pyxzones.zone_profile import ZoneProfile
+
+
+def with_panel(desktop_work_areas, height=30) -> list[WorkArea]:
+    return [WorkArea(area.x, area.y + height, area.width, area.height - height) for area in desktop_work_areas]
+
+
+@pytest.fixture
+def layout(settings):
+    wm = FakeWindowManager(monitors=2, desktops=3)
+    return wm.monitors, [list(desktop_work_areas) for desktop_work_areas in wm.work_areas]
+
+
+@pytest.fixture
+def zone_profile(layout):
+    return ZoneProfile.get_zones_per_virtual_desktop(*layout)
+
+
+def test_changed_desktop_is_rebuilt(layout, zone_profile):
+    monitors, work_areas = layout
+    work_areas = [work_areas[0], with_panel(work_areas[1]), work_areas[2]]
+    updated = zone_profile.with_work_areas({ 1: work_areas[1] })
+
+    assert updated.work_areas == work_areas
+    assert updated.tables[0] is zone_profile.tables[0]
+    assert updated.tables[2] is zone_profile.tables[2]
+    assert updated.indexes[0] is zone_profile.indexes[0]
+    assert updated.tables[1] is not zone_profile.tables[1]
+    # Same zones as building the whole profile from scratch
+    assert updated.zones == ZoneProfile.get_zones_per_virtual_desktop(monitors, work_areas).zones
+    assert updated.find_zone(1, 100, 10) is None
+    assert updated.find_zone(0, 100, 10) is not None
+
+
+def test_unchanged_work_areas_keep_everything(layout, zone_profile):
+    _, work_areas = layout
+    updated = zone_profile.with_work_areas({ 0: work_areas[0], 2: work_areas[2] })
+    assert updated.tables == zone_profile.tables
+    assert all(a is b for a, b in zip(updated.tables, zone_profile.tables))
+    assert updated.monitor_zones == zone_profile.monitor_zones
+
+
+def test_desktop_with_the_same_work_areas_shares_its_table(layout, zone_profile):
+    _, work_areas = layout
+    panel = zone_profile.with_work_areas({ 0: with_panel(work_areas[0]) })
+    updated = panel.with_work_areas({ 2: with_panel(work_areas[2]) })
+    assert updated.tables[2] is updated.tables[0]
+    assert updated.indexes[2] is updated.indexes[0]
+
+
+def test_next_desktop_is_appended(layout, zone_profile):
+    monitors, work_areas = layout
+    updated = zone_profile.with_work_areas({ 3: with_panel(work_areas[0]) })
+
+    assert len(updated.tables) == len(updated.work_areas) == len(updated.indexes) == 4
+    assert updated.work_areas[3] == with_panel(work_areas[0])
+    assert updated.tables[:3] == zone_profile.tables
+    assert updated.zones[3] == ZoneProfile.get_zones_per_virtual_desktop(monitors, [with_panel(work_areas[0])]).zones[0]
+    assert updated.find_zone(3, 100, 100) is not None
+
+
+def test_desktop_past_the_next_is_ignored(layout, zone_profile):
+    _, work_areas = layout
+    updated = zone_profile.with_work_areas({ 4: with_panel(work_areas[0]) })
+    assert updated.work_areas == zone_profile.work_areas
+    assert updated.tables == zone_profile.tables
+    assert updated.find_zone(4, 100, 100) is None
+
+
+def test_replaced_work_areas_leave_no_monitor_zones_behind(layout, zone_profile):
+    monitors, work_areas = layout
+    changed = { desktop: with_panel(work_areas[desktop]) for desktop in range(len(work_areas)) }
+    updated = zone_profile.with_work_areas(changed)
+
+    rebuilt = ZoneProfile.get_zones_per_virtual_desktop(monitors, list(changed.values()))
+    assert updated.monitor_zones.keys() == rebuilt.monitor_zones.keys()
+    assert not updated.monitor_zones.keys() & zone_profile.monitor_zones.keys()
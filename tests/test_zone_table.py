@@ -0,0 +1,155 @@
+from array import array
+
+import pytest
+
+from pyxzones import profile_cache
+from pyxzones.fakewm import FakeWindowManager
+from pyxzones.types import MergeZone, WorkArea, Zone
+from pyxzones.zone_profile import ZoneProfile
+from pyxzones.zone_table import COLUMNS, KIND_MERGE_ZONE, KIND_ZONE, NO_ROW, ZoneTable
+
+
+@pytest.fixture
+def zone_profile(settings):
+    wm = FakeWindowManager(monitors=2, desktops=4)
+    # Two desktops with a panel, which share a table as the other two do
+    work_areas = [list(desktop_work_areas) for desktop_work_areas in wm.work_areas]
+    for desktop in (1, 3):
+        work_areas[desktop] = [WorkArea(area.x, area.y + 30, area.width, area.height - 30) for area in work_areas[desktop]]
+    return ZoneProfile.get_zones_per_virtual_desktop(wm.monitors, work_areas)
+
+
+def get_zones():
+    left = Zone(0, 0, 100, 200, 'landscape')
+    middle = Zone(100, 0, 100, 200, 'landscape')
+    right = Zone(200, 0, 100, 200, 'portrait')
+    merge_zones = [
+        MergeZone(90, 0, 20, 200, 'landscape', zones=(left, middle), surface=Zone(0, 0, 200, 200, 'landscape')),
+        MergeZone(190, 0, 20, 200, 'landscape', zones=(middle, right), surface=Zone(100, 0, 200, 200, 'landscape')),
+    ]
+    return [left, middle, right], merge_zones
+
+
+def test_from_zones_round_trips():
+    zones, merge_zones = get_zones()
+    table = ZoneTable.from_zones(zones, merge_zones)
+
+    assert len(table) == 5
+    assert table.zone_count == 3
+    assert list(table.kind) == [KIND_ZONE] * 3 + [KIND_MERGE_ZONE] * 2
+    assert list(table.first) == [NO_ROW] * 3 + [0, 1]
+    assert list(table.second) == [NO_ROW] * 3 + [1, 2]
+    assert table.zones == zones
+    assert table.merge_zones == merge_zones
+    assert [table.get_zone(row) for row in range(len(table))] == zones + merge_zones
+    table.validate()
+
+
+def test_materialized_zones_are_built_once():
+    table = ZoneTable.from_zones(*get_zones())
+    assert table.zones is table.zones
+    assert table.merge_zones is table.merge_zones
+    # Merge zones reference the very zones of the table
+    assert table.merge_zones[0].zones[1] is table.zones[1]
+
+
+def get_columns(table: ZoneTable) -> dict[str, array]:
+    return { name: array(column.typecode, column) for name, column in table.get_columns().items() }
+
+
+@pytest.mark.parametrize("name, row, value, zone_count", [
+    ('first', 3, 3, None),          # merge zone referencing a merge zone
+    ('second', 4, -1, None),
+    ('second', 4, 7, None),
+    ('kind', 0, KIND_MERGE_ZONE, None),
+    ('kind', 4, KIND_ZONE, None),
+    ('orientation', 1, 2, None),
+    (None, None, None, 6),          # more zones than rows
+    (None, None, None, -1),
+])
+def test_validate_rejects_inconsistent_tables(name, row, value, zone_count):
+    table = ZoneTable.from_zones(*get_zones())
+    columns = get_columns(table)
+    if name is not None:
+        columns[name][row] = value
+    with pytest.raises(ValueError):
+        ZoneTable(columns, table.zone_count if zone_count is None else zone_count).validate()
+
+
+def test_validate_rejects_columns_of_different_lengths():
+    table = ZoneTable.from_zones(*get_zones())
+    columns = get_columns(table)
+    columns['surface_height'].pop()
+    with pytest.raises(ValueError):
+        ZoneTable(columns, table.zone_count).validate()
+
+
+def test_cache_round_trip(zone_profile):
+    layout_fingerprint, configuration_fingerprint, decoded = profile_cache.decode(profile_cache.encode(zone_profile))
+
+    assert layout_fingerprint == profile_cache.get_layout_fingerprint(zone_profile.monitors, zone_profile.work_areas)
+    assert configuration_fingerprint == profile_cache.get_configuration_fingerprint()
+    assert decoded.monitors == zone_profile.monitors
+    assert decoded.work_areas == zone_profile.work_areas
+    assert decoded.zones == zone_profile.zones
+    assert decoded.merge_zones == zone_profile.merge_zones
+    for name in COLUMNS:
+        assert [list(getattr(table, name)) for table in decoded.tables] == \
+               [list(getattr(table, name)) for table in zone_profile.tables]
+
+    # Desktops with the same work areas still share a table
+    assert decoded.tables[0] is decoded.tables[2]
+    assert decoded.tables[1] is decoded.tables[3]
+    assert decoded.tables[0] is not decoded.tables[1]
+
+    for desktop in range(len(zone_profile.tables)):
+        for x, y in ((50, 50), (960, 540), (1919, 100), (2500, 700)):
+            assert decoded.find_zone(desktop, x, y) == zone_profile.find_zone(desktop, x, y)
+
+
+def get_table_offsets(zone_profile: ZoneProfile) -> tuple[int, dict[str, int]]:
+    # Offsets of the TABLE record and of every column of the last (here, only)
+    # table, which ends the cache
+    table = zone_profile.tables[-1]
+    column_sizes = { name: len(column) * column.itemsize for name, column in table.get_columns().items() }
+    table_offset = len(profile_cache.encode(zone_profile)) - sum(column_sizes.values()) - profile_cache.TABLE.size
+    column_offsets = {}
+    offset = table_offset + profile_cache.TABLE.size
+    for name, size in column_sizes.items():
+        column_offsets[name] = offset
+        offset += size
+    return table_offset, column_offsets
+
+
+def test_decode_rejects_corrupt_tables(zone_profile):
+    single = ZoneProfile(zone_profile.tables[:1], zone_profile.monitors, zone_profile.work_areas[:1])
+    table = single.tables[0]
+    table_offset, column_offsets = get_table_offsets(single)
+    data = profile_cache.encode(single)
+
+    # Sanity check of the offsets, an untouched copy decodes fine
+    assert len(table) > table.zone_count
+    assert profile_cache.TABLE.unpack_from(data, table_offset) == (len(table), table.zone_count)
+    profile_cache.decode(data)
+
+    corrupt = bytearray(data)
+    profile_cache.TABLE.pack_into(corrupt, table_offset, len(table), len(table) + 1)
+    with pytest.raises(ValueError):
+        profile_cache.decode(bytes(corrupt))
+
+    for name in ('first', 'second'):
+        for value in (-1, table.zone_count, len(table)):
+            corrupt = bytearray(data)
+            # The first merge zone, right after the zones
+            itemsize = table.first.itemsize
+            offset = column_offsets[name] + table.zone_count * itemsize
+            corrupt[offset:offset + itemsize] = value.to_bytes(itemsize, 'little', signed=True)
+            with pytest.raises(ValueError):
+                profile_cache.decode(bytes(corrupt))
+
+
+def test_decode_rejects_other_versions(zone_profile):
+    data = bytearray(profile_cache.encode(zone_profile))
+    data[4] += 1
+    with pytest.raises(ValueError):
+        profile_cache.decode(bytes(data))